@@ -1,9 +1,15 @@
-import winreg
 import os
 from app.logging import log_error, log_debug
 from app.config import UNINSTALL_KEY, UWP_APPS_KEY
 
 def get_installed_apps():
+    # Imported here so the CLI and service load on platforms without a registry
+    try:
+        import winreg
+    except ImportError:
+        log_debug("Installed app discovery needs the Windows registry")
+        return []
+
     installed_apps = []
     
     # Check traditional app registry
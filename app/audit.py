@@ -0,0 +1,257 @@
+"""
+Audit event store for AppLocker
+Append-only JSONL segments (one per day) with a manifest recording which
+apps and event types each segment holds, so queries skip whole days
+without opening them. The GUI and the service append to the same
+segments, so each entry remembers how many bytes it has indexed and
+reads only what other processes appended since.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from app.logging import log_error
+from app.config import AUDIT_DIR
+
+# Event types written by AppLocker
+EVENT_BLOCK = "block"
+EVENT_LOCK = "lock"
+EVENT_LOCK_REMOVED = "lock_removed"
+EVENT_UNLOCK = "unlock"
+EVENT_RELOCK = "relock"
+EVENT_RESUME = "resume"
+EVENT_ESCALATE = "escalate"
+EVENT_AUTH_SUCCESS = "auth_success"
+EVENT_AUTH_FAILED = "auth_failed"
+EVENT_MASTER_KEY_USED = "master_key_used"
+EVENT_OTP_ISSUED = "otp_issued"
+EVENT_OTP_VERIFIED = "otp_verified"
+EVENT_OTP_FAILED = "otp_failed"
+
+EVENT_TYPES = [
+    EVENT_BLOCK, EVENT_LOCK, EVENT_LOCK_REMOVED, EVENT_UNLOCK, EVENT_RELOCK, EVENT_RESUME, EVENT_ESCALATE,
+    EVENT_AUTH_SUCCESS, EVENT_AUTH_FAILED, EVENT_MASTER_KEY_USED,
+    EVENT_OTP_ISSUED, EVENT_OTP_VERIFIED, EVENT_OTP_FAILED
+]
+
+MANIFEST_NAME = "index.json"
+MANIFEST_SAVE_INTERVAL = 5  # Seconds between manifest writes while events are recorded
+
+class AuditStore:
+    def __init__(self, root=AUDIT_DIR):
+        self.root = str(root)
+        self._lock = threading.Lock()
+        self._manifest = {}  # segment name -> {"count", "bytes", "first", "last", "apps", "types"}
+        self._segment = None
+        self._handle = None
+        self._dirty = False
+        self._last_save = 0.0
+        self._loaded = False
+
+    def _segment_name(self, timestamp):
+        return time.strftime("%Y-%m-%d", time.localtime(timestamp)) + ".jsonl"
+
+    def _ensure_loaded(self):
+        """Load the persisted manifest once; caller holds the lock"""
+        if self._loaded:
+            return
+        self._loaded = True
+        os.makedirs(self.root, exist_ok=True)
+
+        try:
+            with open(os.path.join(self.root, MANIFEST_NAME), "r", encoding="utf-8") as file:
+                self._manifest = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._manifest = {}
+
+    def _sync(self):
+        """Bring the manifest up to date with every segment on disk; caller holds the lock"""
+        self._ensure_loaded()
+        segments = {name for name in os.listdir(self.root) if name.endswith(".jsonl")}
+        for name in list(self._manifest):
+            if name not in segments:
+                del self._manifest[name]
+                self._dirty = True
+        for name in segments:
+            self._catch_up(name)
+
+    def _catch_up(self, name):
+        """Index events appended to a segment since the manifest last saw it; caller holds the lock"""
+        path = os.path.join(self.root, name)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        entry = self._manifest.get(name)
+        if entry is not None and entry["bytes"] == size:
+            return
+        if entry is None or entry["bytes"] > size:
+            # New, or replaced by something shorter: index from the start
+            entry = self._manifest[name] = {"count": 0, "bytes": 0, "first": None, "last": None,
+                                            "apps": {}, "types": {}}
+        with open(path, "rb") as file:
+            file.seek(entry["bytes"])
+            data = file.read(size - entry["bytes"])
+        data = data[:data.rfind(b"\n") + 1]  # Another process may be mid-line
+        for line in data.splitlines():
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            self._add_to_entry(entry, event)
+        entry["bytes"] += len(data)
+        self._dirty = True
+
+    def _add_to_entry(self, entry, event):
+        entry["count"] += 1
+        if entry["first"] is None or event["ts"] < entry["first"]:
+            entry["first"] = event["ts"]
+        if entry["last"] is None or event["ts"] > entry["last"]:
+            entry["last"] = event["ts"]
+        app = event.get("app")
+        if app is not None:
+            entry["apps"][app] = entry["apps"].get(app, 0) + 1
+        entry["types"][event["type"]] = entry["types"].get(event["type"], 0) + 1
+
+    def _save_manifest(self):
+        """Persist the manifest; caller holds the lock"""
+        if self._handle is not None:
+            self._handle.flush()
+        path = os.path.join(self.root, MANIFEST_NAME)
+        try:
+            with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+                json.dump(self._manifest, file, separators=(",", ":"))
+            os.replace(f"{path}.tmp", path)
+            self._dirty = False
+            self._last_save = time.monotonic()
+        except OSError as e:
+            log_error(f"Failed to save audit index: {e}")
+
+    def record(self, event_type, app=None, timestamp=None, **details):
+        """Append one event to the current day's segment"""
+        event = {"ts": round(timestamp if timestamp is not None else time.time(), 3), "type": event_type}
+        if app is not None:
+            event["app"] = app
+        event.update(details)
+        line = json.dumps(event, separators=(",", ":"), default=str) + "\n"
+
+        with self._lock:
+            self._ensure_loaded()
+            name = self._segment_name(event["ts"])
+            if name != self._segment:
+                if self._handle is not None:
+                    self._handle.close()
+                self._handle = open(os.path.join(self.root, name), "a", encoding="utf-8", newline="")
+                self._segment = name
+
+            self._handle.write(line)
+            self._handle.flush()
+            # Also indexes whatever other processes appended meanwhile
+            self._catch_up(name)
+
+            if time.monotonic() - self._last_save >= MANIFEST_SAVE_INTERVAL:
+                self._save_manifest()
+
+    def query(self, app=None, event_type=None, start=None, end=None, limit=500):
+        """Return matching events, newest first"""
+        with self._lock:
+            self._sync()
+            candidates = []
+            for name, entry in self._manifest.items():
+                if not entry["count"]:
+                    continue
+                if start is not None and entry["last"] < start:
+                    continue
+                if end is not None and entry["first"] > end:
+                    continue
+                if app is not None and app not in entry["apps"]:
+                    continue
+                if event_type is not None and event_type not in entry["types"]:
+                    continue
+                candidates.append(name)
+
+        # Cheap substring test before parsing each line
+        needles = []
+        if app is not None:
+            needles.append(json.dumps({"app": app}, separators=(",", ":"))[1:-1])
+        if event_type is not None:
+            needles.append(json.dumps({"type": event_type}, separators=(",", ":"))[1:-1])
+
+        results = []
+        for name in sorted(candidates, reverse=True):
+            matches = []
+            try:
+                with open(os.path.join(self.root, name), "r", encoding="utf-8") as file:
+                    for line in file:
+                        if any(needle not in line for needle in needles):
+                            continue
+                        try:
+                            event = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        if start is not None and event["ts"] < start:
+                            continue
+                        if end is not None and event["ts"] > end:
+                            continue
+                        if app is not None and event.get("app") != app:
+                            continue
+                        if event_type is not None and event["type"] != event_type:
+                            continue
+                        matches.append(event)
+            except FileNotFoundError:
+                continue
+
+            matches.reverse()
+            results.extend(matches)
+            if limit is not None and len(results) >= limit:
+                return results[:limit]
+        return results
+
+    def known_apps(self):
+        """Apps that appear anywhere in the audit history"""
+        with self._lock:
+            self._sync()
+            apps = set()
+            for entry in self._manifest.values():
+                apps.update(entry["apps"])
+            return sorted(apps)
+
+    def count(self, app=None, event_type=None):
+        """Count events from the manifest without reading segments"""
+        if app is not None and event_type is not None:
+            # The manifest does not cross-index apps and types
+            return len(self.query(app=app, event_type=event_type, limit=None))
+
+        with self._lock:
+            self._sync()
+            total = 0
+            for entry in self._manifest.values():
+                if app is not None:
+                    total += entry["apps"].get(app, 0)
+                elif event_type is not None:
+                    total += entry["types"].get(event_type, 0)
+                else:
+                    total += entry["count"]
+            return total
+
+    def close(self):
+        with self._lock:
+            if self._dirty:
+                self._save_manifest()
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+                self._segment = None
+
+# Global audit store instance
+audit_log = AuditStore()
+atexit.register(audit_log.close)
+
+def record_audit_event(event_type, app=None, **details):
+    """Record an audit event, never raising into the caller"""
+    try:
+        audit_log.record(event_type, app, **details)
+    except Exception as e:
+        log_error(f"Failed to record audit event: {e}")
@@ -1,71 +1,35 @@
-import json
-import pyotp
-from tkinter import simpledialog, messagebox
 from app.logging import log_event, log_error
-from app.config import USER_DATA_FILE, LOCKED_APPS_FILE, TOTP_WINDOW
-import bcrypt
+from app.config import TOTP_WINDOW
+from app.lock_store import lock_store
+from app.credentials import credential_store
+from app.audit import record_audit_event, EVENT_AUTH_SUCCESS, EVENT_AUTH_FAILED
+from app.user_data import verify_pin  # One implementation for both modules
 
 # Function to save secret key with user info to a file
 def save_secret_to_db(secret_key, user_email="user@applocker.com"):
-    # Validate secret key is proper base32
-    try:
-        import base64
-        base64.b32decode(secret_key, casefold=True)
-    except Exception as e:
-        log_error(f"Invalid secret key format: {e}")
-        raise ValueError("Invalid secret key format")
-        
-    with open(USER_DATA_FILE, "w", encoding="utf-8") as f:
-        f.write(f"{secret_key}\n")  # Save the secret key
-        f.write(f"{user_email}\n")  # Save user email
-    log_event(f"Secret key saved successfully for user: {user_email}")
+    credential_store.save(secret_key, user_email)
 
-# Function to load user data from file
+# Function to load user data from file (cached until the file changes)
 def load_user_data():
-    try:
-        with open(USER_DATA_FILE, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-            if len(lines) >= 1:
-                secret_key = lines[0].strip()
-                user_email = lines[1].strip() if len(lines) >= 2 else "unknown"
-                
-                # Validate secret key format
-                try:
-                    import base64
-                    base64.b32decode(secret_key, casefold=True)
-                    return secret_key, user_email
-                except Exception as e:
-                    log_error(f"Invalid secret key in storage: {e}")
-                    return None, None
-                    
-    except FileNotFoundError:
-        log_error("User data file not found")
-    except Exception as e:
-        log_error(f"Error loading user data: {e}")
-    return None, None
+    return credential_store.load()
 
 # Function to get app status from locked apps file
 def get_app_status(app_name):
-    try:
-        with open(LOCKED_APPS_FILE, "r", encoding="utf-8") as file:
-            locked_apps = json.load(file)
-            return locked_apps.get(app_name, False)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return False
+    return lock_store.is_locked(app_name)
 
 # Function to verify TOTP code entered by the user
 def verify_totp(secret, entered_code):
+    import pyotp
     totp = pyotp.TOTP(secret)
     # Use a wider window for more flexibility
     is_valid = totp.verify(entered_code, valid_window=TOTP_WINDOW)
     log_event(f"TOTP verification - Valid: {is_valid}")
     return is_valid
 
-# Function to verify the entered PIN against the stored hashed PIN
-def verify_pin(stored_hashed_pin, entered_pin):
-    return bcrypt.checkpw(entered_pin.encode('utf-8'), stored_hashed_pin)
-
 def unlock_app(app_name=None):
+    # Tk is only needed when a dialog is actually shown
+    from tkinter import simpledialog, messagebox
+    
     if app_name is None:
         # If no app name provided, show a simple unlock interface
         try:
@@ -97,11 +61,21 @@ def unlock_app(app_name=None):
         return
         
     if verify_totp(secret_key, entered_code):
+        record_audit_event(EVENT_AUTH_SUCCESS, app_name, method="totp")
+        # Temporarily unlock the app for 1 hour (done by the service, which checks the code again)
+        from app import client
+        from app.ipc import ServiceUnavailable
+        try:
+            client.unlock(app_name, 60, code=entered_code)
+        except ServiceUnavailable:
+            messagebox.showerror("Service Not Running",
+                                 f"{app_name} was not unlocked: the AppLocker service is not running.\n"
+                                 f"Restart AppLocker and try again.")
+            log_error(f"Unlock of {app_name} failed: service not running")
+            return
         messagebox.showinfo("Success", f"{app_name} unlocked successfully!\nUnlocked for 1 hour.")
         log_event(f"App {app_name} unlocked successfully for user {user_email}")
-        # Temporarily unlock the app for 1 hour
-        from app.process_manager import unlock_app_temporarily
-        unlock_app_temporarily(app_name, 60)
     else:
         messagebox.showerror("Invalid 2FA Code", "The 2FA code you entered is incorrect.\nPlease try again.")
         log_error(f"Invalid 2FA code for app {app_name} by user {user_email}")
+        record_audit_event(EVENT_AUTH_FAILED, app_name, method="totp")
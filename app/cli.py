@@ -0,0 +1,246 @@
+"""
+Command line interface for AppLocker
+Scriptable front end to the service: applocker lock|unlock|status|metrics|list-apps|events.
+Imports only the stores and the IPC client so it starts in well under 100 ms;
+Tk, PIL, qrcode and psutil are never loaded here.
+"""
+
+import argparse
+import json
+import sys
+import time
+from app.lock_store import lock_store
+from app.schedule import parse_schedule_text, format_schedule, ScheduleError
+from app.policy import RULE_FIELDS
+from app.config import ENFORCEMENT_ACTIONS
+from app.metrics import format_monitor_metrics
+from app.ipc import request, ServiceUnavailable, ServiceError
+from app import client
+
+def _print_json(data):
+    print(json.dumps(data, indent=2, default=str))
+
+def _format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+def _read_code(args):
+    """2FA code from --code, prompted for on a terminal"""
+    code = args.code
+    if code is None and sys.stdin.isatty():
+        import getpass
+        code = getpass.getpass("2FA code: ")
+    return code.strip() if code else None
+
+def cmd_lock(args):
+    schedule = [] if args.always else None
+    if args.schedule:
+        try:
+            schedule = parse_schedule_text(args.schedule)
+        except ScheduleError as e:
+            print(f"Invalid schedule: {e}", file=sys.stderr)
+            return 1
+
+    rules = None
+    if args.match:
+        rules = []
+        for condition in args.match:
+            field, _, pattern = condition.partition("=")
+            if field not in RULE_FIELDS or not pattern:
+                print(f"Invalid --match '{condition}'; use one of {', '.join(RULE_FIELDS)}=PATTERN", file=sys.stderr)
+                return 1
+            rules.append({field: pattern})
+    for path in args.hash_of or ():
+        from app.exe_identity import exe_hashes
+        digest = exe_hashes.digest(path)
+        if not digest:
+            print(f"Cannot read executable '{path}'", file=sys.stderr)
+            return 1
+        rules = (rules or []) + [{"hash": digest}]
+
+    # Loosening an existing lock is checked by the service like an unlock
+    code = None
+    if lock_store.would_weaken(args.app, schedule=schedule, rules=rules, action=args.action):
+        code = _read_code(args)
+        if not code:
+            print(f"'{args.app}' is already locked; changing it needs a 2FA code", file=sys.stderr)
+            return 1
+
+    client.lock(args.app, schedule=schedule, rules=rules, action=args.action, code=code)
+    schedule = lock_store.schedules().get(args.app)
+    if args.json:
+        _print_json({"app": args.app, "locked": True, "schedule": schedule, "rules": lock_store.rules().get(args.app),
+                     "action": lock_store.actions().get(args.app)})
+    elif schedule:
+        print(f"🔒 {args.app} is now locked during: {format_schedule(schedule)}")
+    else:
+        print(f"🔒 {args.app} is now locked")
+    return 0
+
+def cmd_unlock(args):
+    if not lock_store.contains(args.app):
+        print(f"'{args.app}' is not a locked app", file=sys.stderr)
+        return 1
+
+    code = _read_code(args)
+    if not code:
+        print("Invalid 2FA code", file=sys.stderr)
+        return 1
+
+    # The service checks the code; the re-lock timer must outlive this process
+    try:
+        request("unlock", app=args.app, minutes=args.minutes, code=code)
+    except ServiceUnavailable:
+        print("AppLocker service is not running; start it with 'python main.py --service'", file=sys.stderr)
+        return 2
+
+    if args.json:
+        _print_json({"app": args.app, "locked": False, "minutes": args.minutes})
+    else:
+        print(f"🔓 {args.app} unlocked for {args.minutes} minutes")
+    return 0
+
+def cmd_status(args):
+    try:
+        status = request("status", timeout=2)
+        status["service"] = "running"
+    except ServiceUnavailable:
+        schedules = {app: format_schedule(windows) for app, windows in lock_store.schedules().items()}
+        status = {"service": "stopped", "locked_apps": lock_store.locked_apps(), "unlocked": {}, "schedules": schedules}
+
+    if args.json:
+        _print_json(status)
+        return 0
+
+    if status["service"] == "running":
+        print(f"Service: running (pid {status['pid']}, monitoring {'on' if status['monitoring'] else 'off'})")
+    else:
+        print("Service: stopped - locked apps are NOT being blocked")
+    print(f"Locked apps: {len(status['locked_apps'])}")
+    for app in status["locked_apps"]:
+        print(f"  🔒 {app}")
+    for app, seconds in status["unlocked"].items():
+        print(f"  🔓 {app} (re-locks in {seconds // 60}m {seconds % 60}s)")
+    for app, count in status.get("suspended", {}).items():
+        print(f"  ⏸ {app} ({count} process{'es' if count != 1 else ''} paused until unlocked)")
+    for app, count in status.get("throttled", {}).items():
+        print(f"  🐢 {app} ({count} process{'es' if count != 1 else ''} throttled until unlocked)")
+    for app, schedule in status.get("schedules", {}).items():
+        print(f"  🕒 {app}: {schedule}")
+    if status.get("next_schedule_change"):
+        print(f"Next schedule change: {status['next_schedule_change']}")
+    if status["service"] == "running":
+        try:
+            for line in format_monitor_metrics(request("metrics", timeout=2)):
+                print(f"  {line}")
+        except (ServiceUnavailable, ServiceError):
+            pass  # Older service without metrics
+    return 0
+
+def cmd_metrics(args):
+    try:
+        snapshot = request("metrics", timeout=2)
+    except ServiceUnavailable:
+        print("AppLocker service is not running", file=sys.stderr)
+        return 2
+    if args.json:
+        _print_json(snapshot)
+    else:
+        for line in format_monitor_metrics(snapshot):
+            print(line)
+    return 0
+
+def cmd_list_apps(args):
+    locked = lock_store.all()
+    schedules = lock_store.schedules()
+    apps = set(locked)
+    if args.installed:
+        from app.app_lock import get_installed_apps
+        apps.update(get_installed_apps())
+    entries = [{"name": app, "locked": locked.get(app, False), "managed": app in locked,
+                "schedule": schedules.get(app)} for app in sorted(apps)]
+
+    if args.json:
+        _print_json(entries)
+        return 0
+
+    for entry in entries:
+        mark = "🔒" if entry["locked"] else ("🔓" if entry["managed"] else "  ")
+        when = f"  ({format_schedule(entry['schedule'])})" if entry["schedule"] else ""
+        print(f"{mark} {entry['name']}{when}")
+    return 0
+
+def cmd_events(args):
+    start = time.time() - args.since * 3600 if args.since else None
+    events = client.events(app=args.app, event_type=args.type, start=start, limit=args.limit)
+
+    if args.json:
+        _print_json(events)
+        return 0
+
+    for event in events:
+        details = " ".join(f"{key}={value}" for key, value in event.items() if key not in ("ts", "type", "app"))
+        print(f"{_format_time(event['ts'])}  {event['type']:<16} {event.get('app') or '-'}  {details}".rstrip())
+    return 0
+
+def build_parser():
+    """Argument parser for all subcommands"""
+    # --json is accepted before or after the subcommand
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", action="store_true", default=argparse.SUPPRESS, help="machine-readable output")
+
+    parser = argparse.ArgumentParser(prog="applocker", parents=[common],
+                                     description="Control the AppLocker service from the command line.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    lock = commands.add_parser("lock", parents=[common], help="lock an app")
+    lock.add_argument("app")
+    when = lock.add_mutually_exclusive_group()
+    when.add_argument("--schedule", metavar="WINDOWS",
+                      help='only lock during these windows, e.g. "mon-fri 09:00-17:00; sat 10:00-12:00"')
+    when.add_argument("--always", action="store_true", help="remove any schedule so the lock always applies")
+    lock.add_argument("--match", action="append", metavar="FIELD=PATTERN",
+                      help="match processes by name (regex), exe (path glob), cmdline (regex), script (glob of the "
+                           "script/jar an interpreter runs), hash (SHA-256 of the executable), parent or user; "
+                           "repeat for alternatives")
+    lock.add_argument("--action", choices=ENFORCEMENT_ACTIONS,
+                      help="what to do with the app's processes (default: ENFORCEMENT_MODE in app/config.py)")
+    lock.add_argument("--hash-of", action="append", metavar="EXE",
+                      help="match this executable by content, even if it is renamed or copied")
+    lock.add_argument("--code", help="2FA code, needed to loosen an existing lock (prompted if omitted)")
+    lock.set_defaults(handler=cmd_lock)
+
+    unlock = commands.add_parser("unlock", parents=[common], help="temporarily unlock an app (needs a 2FA code)")
+    unlock.add_argument("app")
+    unlock.add_argument("--minutes", type=int, default=60)
+    unlock.add_argument("--code", help="6-digit code from the authenticator app (prompted if omitted)")
+    unlock.set_defaults(handler=cmd_unlock)
+
+    status = commands.add_parser("status", parents=[common], help="show service and lock status")
+    status.set_defaults(handler=cmd_status)
+
+    metrics_parser = commands.add_parser("metrics", parents=[common], help="show monitor and enforcement metrics")
+    metrics_parser.set_defaults(handler=cmd_metrics)
+
+    list_apps = commands.add_parser("list-apps", parents=[common], help="list managed apps")
+    list_apps.add_argument("--installed", action="store_true", help="include installed apps (Windows)")
+    list_apps.set_defaults(handler=cmd_list_apps)
+
+    events = commands.add_parser("events", parents=[common], help="show recent audit events")
+    events.add_argument("--app")
+    events.add_argument("--type")
+    events.add_argument("--since", type=float, metavar="HOURS")
+    events.add_argument("--limit", type=int, default=50)
+    events.set_defaults(handler=cmd_events)
+
+    return parser
+
+def main(argv=None):
+    """Run one CLI command and return its exit code"""
+    args = build_parser().parse_args(argv)
+    args.json = getattr(args, "json", False)
+    try:
+        return args.handler(args)
+    except (ServiceError, OSError) as e:
+        # OSError: the local fallback could not read the lock store, ipc.key, ...
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
@@ -0,0 +1,90 @@
+"""
+Client module for AppLocker
+Thin front end used by the GUI and CLI. Commands go to the background
+service over IPC; the enforcement stack is only imported here as a
+fallback when no service can be reached.
+"""
+
+import os
+import subprocess
+import sys
+import time
+from app.logging import log_event, log_error
+from app.config import SERVICE_START_TIMEOUT
+from app.ipc import request, is_service_running, ServiceUnavailable
+
+def _service_command():
+    """Command line that starts the headless service"""
+    if getattr(sys, "frozen", False):
+        return [sys.executable, "--service"]
+    main_script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+    return [sys.executable, main_script, "--service"]
+
+def start_service():
+    """Spawn the service detached from this process"""
+    kwargs = {
+        "stdin": subprocess.DEVNULL,
+        "stdout": subprocess.DEVNULL,
+        "stderr": subprocess.DEVNULL,
+        "close_fds": True
+    }
+    if sys.platform.startswith("win"):
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NO_WINDOW
+    else:
+        kwargs["start_new_session"] = True  # Survives the GUI's terminal closing
+    subprocess.Popen(_service_command(), **kwargs)
+
+def ensure_service(timeout=SERVICE_START_TIMEOUT):
+    """Make sure the service is running, starting it if needed"""
+    if is_service_running():
+        return True
+
+    try:
+        start_service()
+    except Exception as e:
+        log_error(f"Failed to start AppLocker service: {e}")
+        return False
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if is_service_running():
+            log_event("AppLocker service started")
+            return True
+        time.sleep(0.1)
+
+    log_error(f"AppLocker service did not respond within {timeout}s")
+    return False
+
+# Commands whose effect must outlive the caller (the re-lock timer), so never run locally
+SERVICE_ONLY_COMMANDS = {"unlock"}
+
+def _call(command, **args):
+    """Run a command on the service, or in this process if it is down"""
+    try:
+        return request(command, **args)
+    except ServiceUnavailable:
+        if command in SERVICE_ONLY_COMMANDS:
+            raise ServiceUnavailable(f"AppLocker service is not running; '{command}' needs it")
+        from app.service import COMMANDS
+        log_event(f"Service unavailable, running '{command}' locally")
+        return COMMANDS[command](**args)
+
+def lock(app_name, schedule=None, rules=None, action=None, code=None):
+    """Lock an app, optionally only during schedule windows, by policy rules and/or with its own action ([] clears).
+    Loosening an existing lock needs a 2FA code."""
+    return _call("lock", app=app_name, schedule=schedule, rules=rules, action=action, code=code)
+
+def remove_lock(app_name, code=None):
+    return _call("remove_lock", app=app_name, code=code)
+
+def unlock(app_name, minutes=60, code=None):
+    return _call("unlock", app=app_name, minutes=minutes, code=code)
+
+def status():
+    return _call("status")
+
+def events(app=None, event_type=None, start=None, end=None, limit=100):
+    return _call("events", app=app, event_type=event_type, start=start, end=end, limit=limit)
+
+def metrics():
+    return _call("metrics")
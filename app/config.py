@@ -17,6 +17,7 @@ BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / "data"
 LOGS_DIR = BASE_DIR / "logs"
 ASSETS_DIR = BASE_DIR / "assets"
+AUDIT_DIR = DATA_DIR / "audit"
 
 # Ensure directories exist
 DATA_DIR.mkdir(exist_ok=True)
@@ -28,14 +29,60 @@ USER_DATA_FILE = DATA_DIR / "user_data.txt"
 LOCKED_APPS_FILE = DATA_DIR / "locked_apps.json"
 QR_CODE_FILE = ASSETS_DIR / "qr_code.png"
 LOG_FILE = LOGS_DIR / "app_logs.log"
+BCRYPT_SETTINGS_FILE = DATA_DIR / "bcrypt_settings.json"
+MAIL_QUEUE_FILE = DATA_DIR / "mail_queue.json"
+OTP_FILE = DATA_DIR / "reset_otps.jsonl"
+IPC_KEY_FILE = DATA_DIR / "ipc.key"
+EXE_HASH_FILE = DATA_DIR / "exe_hashes.jsonl"
 
 # Security Settings
 TOTP_WINDOW = 1  # Time window for TOTP validation (30 second intervals)
 UNLOCK_DURATION_MINUTES = 60  # How long apps stay unlocked after authentication
+BCRYPT_TARGET_MS = 250  # Target PIN verification time used to calibrate the bcrypt cost
+BCRYPT_MIN_ROUNDS = 10  # Never calibrate below this cost, even on slow machines
+BCRYPT_MAX_ROUNDS = 16  # Never calibrate above this cost, even on fast machines
 
 # Process Monitoring Settings
 MONITOR_INTERVAL = 2  # Seconds between process checks
+MONITOR_TICK_BUDGET = 1  # Seconds a process check may take before it counts as an overrun
+MONITOR_STALL_SECONDS = 30  # Seconds without a heartbeat before the watchdog restarts the monitor
+MONITOR_HASH_BUDGET = 0.5  # Seconds per check spent hashing unseen executables; the rest wait for the next check
+SERVICE_START_TIMEOUT = 5  # Seconds a client waits for a freshly spawned service to answer
 BLOCK_WARNING_TITLE = "AppLocker - Access Denied"
+ENFORCEMENT_ACTIONS = ("kill", "suspend", "throttle")
+ENFORCEMENT_MODE = "kill"  # Default action: "kill" terminates, "suspend" freezes until unlocked, "throttle" slows down
+KILL_GRACE_SECONDS = 3  # Seconds a terminated process gets to exit before SIGKILL
+SUSPEND_TIMEOUT = 300  # Seconds a suspended app may wait for an unlock before it is terminated
+THROTTLE_NICE = 19  # Niceness given to throttled processes (idle priority class on Windows)
+THROTTLE_CPU_COUNT = 1  # Throttled processes are pinned to this many CPUs
+THROTTLE_CPU_MAX = "20000 100000"  # cgroup v2 cpu.max for throttled processes: 20 ms per 100 ms
+THROTTLE_CGROUP = "/sys/fs/cgroup/applocker-throttle"  # Needs a writable cgroup v2 hierarchy
+RESPAWN_WINDOW = 60  # Seconds over which relaunches of one app count towards escalation
+RESPAWN_SUSPEND_PARENT_AFTER = 3  # Launches in the window before the parent launcher is suspended
+RESPAWN_KILL_TREE_AFTER = 5  # Launches in the window before the launcher and all children are killed
+RESPAWN_QUARANTINE_AFTER = 8  # Launches in the window before the executable path is quarantined
+QUARANTINE_SECONDS = 300  # How long a quarantined path is killed on sight
+ENFORCEMENT_RATE = 20  # Enforcement actions per second, across all apps
+ENFORCEMENT_BURST = 50  # Actions allowed at once before the rate applies
+METRICS_ADDRESS = None  # e.g. "127.0.0.1:9464" or "unix:/run/applocker-metrics.sock" to serve Prometheus metrics
+BLOCK_NOTIFY_INTERVAL = 30  # Seconds between block notifications for one app
+MONITOR_PROFILE_SECONDS = 0  # Profile the monitor loop for this long after it starts (0 = off)
+# Parents never suspended or killed when an app relaunches itself
+PROTECTED_PROCESS_NAMES = {
+    "explorer.exe", "services.exe", "svchost.exe", "winlogon.exe", "csrss.exe", "wininit.exe",
+    "cmd.exe", "powershell.exe", "pwsh.exe", "conhost.exe", "windowsterminal.exe",
+    "systemd", "init", "launchd", "loginwindow", "finder", "dock",
+    "bash", "sh", "zsh", "fish", "dash", "sshd", "tmux", "screen",
+    "gnome-shell", "plasmashell", "kwin_x11", "kwin_wayland", "xfce4-session"
+}
+# Process names that host other apps; only these have their command line read
+INTERPRETER_NAMES = {
+    "python", "python3", "python.exe", "pythonw.exe", "py.exe",
+    "java", "java.exe", "javaw.exe",
+    "node", "node.exe", "electron", "electron.exe",
+    "ruby", "ruby.exe", "perl", "perl.exe", "php", "php.exe",
+    "wscript.exe", "cscript.exe", "powershell.exe", "pwsh", "pwsh.exe"
+}
 
 # GUI Settings
 WINDOW_TITLE = f"{APP_NAME} v{APP_VERSION}"
@@ -51,3 +98,5 @@ LOG_FORMAT = '%(asctime)s - %(levelname)s - %(funcName)s - %(message)s'
 LOG_LEVEL = "INFO"
 MAX_LOG_SIZE = 10 * 1024 * 1024  # 10MB
 BACKUP_COUNT = 5
+LOG_DEDUP_WINDOW = 60  # Seconds over which repeated monitor events are collapsed into one line
+LOG_QUEUE_SIZE = 10000  # Records buffered for the log writer thread before new ones are dropped
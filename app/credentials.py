@@ -0,0 +1,118 @@
+"""
+Credential storage module for AppLocker
+The only reader of USER_DATA_FILE; keeps the validated secret in memory
+and re-reads the file only when it changes on disk
+"""
+
+import base64
+import os
+import threading
+from app.logging import log_event, log_error
+from app.config import USER_DATA_FILE, TOTP_WINDOW
+
+# Marker for "never loaded", distinct from "file missing" (None)
+_UNLOADED = object()
+
+class CredentialStore:
+    def __init__(self, path=USER_DATA_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = _UNLOADED
+        self._secret = None
+        self._email = None
+        self._totp = None
+
+    def _file_stamp(self):
+        """Return (mtime, size) of the credential file, or None if it is missing"""
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _read(self):
+        """Read and validate the credential file"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                lines = [line.strip() for line in file.read().strip().splitlines()]
+        except FileNotFoundError:
+            log_error("User data file not found")
+            return None, None
+        except Exception as e:
+            log_error(f"Error loading user data: {e}")
+            return None, None
+
+        if not lines or not lines[0]:
+            return None, None
+
+        # Older builds stored "secret|email" on a single line
+        if '|' in lines[0]:
+            secret_key, user_email = lines[0].split('|', 1)
+        else:
+            secret_key = lines[0]
+            user_email = lines[1] if len(lines) >= 2 else "unknown"
+
+        try:
+            base64.b32decode(secret_key, casefold=True)
+        except Exception as e:
+            log_error(f"Invalid secret key in storage: {e}")
+            return None, None
+
+        return secret_key, user_email
+
+    def load(self):
+        """Return (secret_key, user_email), or (None, None) if not set up"""
+        stamp = self._file_stamp()
+        with self._lock:
+            if stamp != self._stamp:
+                if stamp is None:
+                    if self._stamp is not None:
+                        log_error("User data file not found")
+                    self._secret, self._email = None, None
+                else:
+                    self._secret, self._email = self._read()
+                self._stamp = stamp
+                self._totp = None
+            return self._secret, self._email
+
+    def is_configured(self):
+        """Check if a valid secret key is stored"""
+        return self.load()[0] is not None
+
+    def get_email(self):
+        """Get the stored user email"""
+        return self.load()[1]
+
+    def save(self, secret_key, user_email):
+        """Validate and store a new secret key, updating the cache in place"""
+        try:
+            base64.b32decode(secret_key, casefold=True)
+        except Exception as e:
+            log_error(f"Invalid secret key format: {e}")
+            raise ValueError("Invalid secret key format")
+
+        with self._lock:
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write(f"{secret_key}\n")  # Save the secret key
+                f.write(f"{user_email}\n")  # Save user email
+            self._secret, self._email = secret_key, user_email
+            self._stamp = self._file_stamp()
+            self._totp = None
+        log_event(f"Secret key saved successfully for user: {user_email}")
+
+    def verify_totp(self, entered_code, valid_window=TOTP_WINDOW):
+        """Verify a TOTP code against the stored secret"""
+        secret_key, _ = self.load()
+        if not secret_key:
+            return False
+
+        with self._lock:
+            totp = self._totp
+            if totp is None or totp.secret != secret_key:
+                import pyotp
+                totp = self._totp = pyotp.TOTP(secret_key)
+
+        return totp.verify(entered_code, valid_window=valid_window)
+
+# Global credential store instance
+credential_store = CredentialStore()
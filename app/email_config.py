@@ -15,7 +15,13 @@ EMAIL_CONFIG = {
     "SMTP_PORT": 587,
     "EMAIL_FROM": "your-applocker-email@gmail.com",  # Your email address
     "EMAIL_PASSWORD": "your-app-password-here",      # Your app password (NOT regular password)
-    "EMAIL_ENABLED": False  # Set to True after configuring email
+    "EMAIL_ENABLED": False,  # Set to True after configuring email
+    "SMTP_USE_TLS": True,       # Upgrade the connection with STARTTLS
+    "SMTP_TIMEOUT": 30,         # Seconds to wait on the SMTP server
+    "SMTP_IDLE_TIMEOUT": 60,    # Close the pooled connection after this many idle seconds
+    "MAX_SEND_ATTEMPTS": 5,     # Give up on a message after this many failed deliveries
+    "RETRY_BASE_SECONDS": 5,    # First retry delay, doubled after every failure
+    "RETRY_MAX_SECONDS": 300    # Upper bound for the retry delay
 }
 
 # Email templates
@@ -0,0 +1,502 @@
+"""
+Enforcement module for AppLocker
+Decides what happens to a process that belongs to a locked app. "kill"
+terminates it; "suspend" freezes its whole process tree so an unlock can
+resume it in milliseconds with its state intact; "throttle" leaves it
+running but slow (lowest CPU/IO priority, fewer CPUs and, on Linux with
+cgroup v2, a cpu.max quota). Trees still suspended after SUSPEND_TIMEOUT
+seconds are terminated; throttled processes are restored on unlock.
+
+Apps that relaunch themselves as soon as they are killed escalate: after
+a few relaunches in RESPAWN_WINDOW the parent launcher is suspended, then
+the whole tree is killed, then the executable path is quarantined (killed
+on sight without a policy lookup or notification) for QUARANTINE_SECONDS.
+A relaunch is a monitor tick that finds the app running again in a
+process started after the previous kill, whose parent is not one of the
+processes already killed, so the helpers of one launch count once.
+A global token bucket caps enforcement actions per second, so the cost
+of a respawn storm stays bounded.
+"""
+
+import os
+import sys
+from collections import OrderedDict, deque
+import threading
+import time
+import psutil
+from app.logging import log_event, log_error, log_repeated_error
+from app.config import (ENFORCEMENT_MODE, ENFORCEMENT_ACTIONS, SUSPEND_TIMEOUT,
+                        THROTTLE_NICE, THROTTLE_CPU_COUNT, THROTTLE_CPU_MAX, THROTTLE_CGROUP,
+                        RESPAWN_WINDOW, RESPAWN_SUSPEND_PARENT_AFTER, RESPAWN_KILL_TREE_AFTER,
+                        RESPAWN_QUARANTINE_AFTER, QUARANTINE_SECONDS, ENFORCEMENT_RATE, ENFORCEMENT_BURST,
+                        BLOCK_NOTIFY_INTERVAL, PROTECTED_PROCESS_NAMES)
+from app.audit import record_audit_event, EVENT_RESUME, EVENT_ESCALATE
+from app.exit_watcher import exit_watcher
+from app.metrics import metrics
+
+ACTION_KILL, ACTION_SUSPEND, ACTION_THROTTLE = ENFORCEMENT_ACTIONS
+ACTIONS = ENFORCEMENT_ACTIONS
+
+# Escalation steps for apps that keep relaunching
+ESCALATE_SUSPEND_PARENT = "suspend_parent"
+ESCALATE_KILL_TREE = "kill_tree"
+ESCALATE_QUARANTINE = "quarantine"
+
+def _process_key(process):
+    return (process.pid, process.create_time())
+
+def _cgroup_of(pid):
+    """cgroup v2 path of a process relative to the hierarchy root, or None"""
+    try:
+        with open(f"/proc/{pid}/cgroup", "r", encoding="utf-8") as file:
+            for line in file:
+                if line.startswith("0::"):
+                    return line[3:].strip()
+    except OSError:
+        pass
+    return None
+
+RATE_LIMITED = metrics.counter("enforcement_rate_limited_total", "Enforcement actions deferred by the rate limit")
+ESCALATIONS = metrics.counter("enforcement_escalations_total", "Relaunch escalations, by step")
+QUARANTINE_KILLS = metrics.counter("enforcement_quarantine_kills_total", "Processes killed from quarantined paths")
+
+class TokenBucket:
+    """Allows `rate` actions per second with bursts of up to `burst`"""
+
+    def __init__(self, rate=ENFORCEMENT_RATE, burst=ENFORCEMENT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                RATE_LIMITED.inc()
+                return False
+            self._tokens -= 1
+            return True
+
+class _RespawnState:
+    """Kill and relaunch history of one app"""
+    __slots__ = ("kills", "launches", "launch_tick", "level", "last_notice", "unreported")
+
+    def __init__(self):
+        self.kills = OrderedDict()  # (pid, create_time) -> kill time, oldest first
+        self.launches = deque()  # Time of each launch killed in the window, oldest first
+        self.launch_tick = None  # Monitor tick of the last launch
+        self.level = 0  # Launches in the window when the last escalation fired
+        self.last_notice = 0.0
+        self.unreported = 0  # Blocks since the last notification
+
+    def record(self, key, parent_key, created, now, window, tick):
+        """Count a kill; returns the number of launches in the window"""
+        while self.kills:
+            oldest_key, killed_at = next(iter(self.kills.items()))
+            if now - killed_at <= window:
+                break
+            del self.kills[oldest_key]
+        while self.launches and now - self.launches[0] > window:
+            self.launches.popleft()
+
+        # Helpers of a launch (children of killed processes, or started before
+        # its kill) and further processes found in the same tick are not relaunches
+        if (tick != self.launch_tick and parent_key not in self.kills
+                and (not self.launches or created >= self.launches[-1])):
+            self.launches.append(now)
+            self.launch_tick = tick
+        self.kills.setdefault(key, now)
+        if len(self.launches) < self.level:
+            self.level = 0  # Calmed down; escalate from scratch next time
+        return len(self.launches)
+
+class Throttler:
+    """Slows processes down and remembers how to undo it, keyed by (pid, create_time)"""
+
+    def __init__(self, nice=THROTTLE_NICE, cpu_count=THROTTLE_CPU_COUNT,
+                 cpu_max=THROTTLE_CPU_MAX, cgroup=THROTTLE_CGROUP):
+        self.nice = nice
+        self.cpu_count = cpu_count
+        self.cpu_max = cpu_max
+        self.cgroup = cgroup
+        self._cgroup_ready = None  # None = not tried yet
+        self._lock = threading.Lock()
+        self._throttled = {}  # (pid, create_time) -> (app_name, process, saved settings)
+        self._by_app = {}  # app_name -> {(pid, create_time)}
+
+    def is_throttled(self, key):
+        return key in self._throttled
+
+    def counts(self):
+        with self._lock:
+            return {app: len(keys) for app, keys in self._by_app.items() if keys}
+
+    def _idle_priority(self):
+        if sys.platform.startswith("win"):
+            return psutil.IDLE_PRIORITY_CLASS
+        return self.nice
+
+    def _idle_io(self, process):
+        if sys.platform.startswith("win"):
+            process.ionice(psutil.IOPRIO_VERYLOW)
+        else:
+            process.ionice(psutil.IOPRIO_CLASS_IDLE)
+
+    def _ensure_cgroup(self):
+        """Create the throttle cgroup with its cpu.max quota once; False if unavailable"""
+        if self._cgroup_ready is None:
+            self._cgroup_ready = False
+            if self.cgroup and self.cpu_max and os.path.exists("/sys/fs/cgroup/cgroup.controllers"):
+                try:
+                    os.makedirs(self.cgroup, exist_ok=True)
+                    with open(os.path.join(self.cgroup, "cpu.max"), "w") as file:
+                        file.write(self.cpu_max)
+                    self._cgroup_ready = True
+                except OSError as e:
+                    log_event(f"cgroup throttling unavailable ({e}); using priority and affinity only")
+        return self._cgroup_ready
+
+    def throttle(self, process, app_name):
+        """Throttle one process; False if it already was"""
+        key = _process_key(process)
+        with self._lock:
+            if key in self._throttled:
+                return False
+            saved = {}
+            # Each knob is best effort; platforms and privileges differ
+            for name, get, apply in (
+                ("nice", process.nice, lambda: process.nice(self._idle_priority())),
+                ("ionice", process.ionice, lambda: self._idle_io(process)),
+                ("affinity", process.cpu_affinity, lambda: process.cpu_affinity(saved["affinity"][:self.cpu_count])),
+            ):
+                try:
+                    saved[name] = get()
+                    apply()
+                except (psutil.AccessDenied, AttributeError, OSError, ValueError):
+                    saved.pop(name, None)
+            if self._ensure_cgroup():
+                original = _cgroup_of(process.pid)
+                try:
+                    with open(os.path.join(self.cgroup, "cgroup.procs"), "w") as file:
+                        file.write(str(process.pid))
+                    saved["cgroup"] = original
+                except OSError as e:
+                    log_repeated_error("Failed to move process into throttle cgroup", app=app_name, error=e)
+            self._throttled[key] = (app_name, process, saved)
+            self._by_app.setdefault(app_name, set()).add(key)
+        return True
+
+    def _restore(self, process, saved):
+        if "nice" in saved:
+            process.nice(saved["nice"])
+        if "ionice" in saved:
+            ioclass = saved["ionice"]
+            if sys.platform.startswith("win"):
+                process.ionice(ioclass)
+            else:
+                process.ionice(ioclass.ioclass, ioclass.value)
+        if "affinity" in saved:
+            process.cpu_affinity(saved["affinity"])
+        if saved.get("cgroup"):
+            with open(os.path.join("/sys/fs/cgroup", saved["cgroup"].lstrip("/"), "cgroup.procs"), "w") as file:
+                file.write(str(process.pid))
+
+    def release(self, app_name):
+        """Restore every process throttled for app_name; returns how many"""
+        with self._lock:
+            entries = [self._throttled.pop(key) for key in self._by_app.pop(app_name, ())]
+        restored = 0
+        for _, process, saved in entries:
+            try:
+                self._restore(process, saved)
+                restored += 1
+            except psutil.NoSuchProcess:
+                continue
+            except (psutil.AccessDenied, OSError) as e:
+                # Unprivileged users may lower priority but not raise it back
+                log_repeated_error("Failed to restore throttled process", app=app_name, error=e)
+        return restored
+
+    def forget(self, live_keys):
+        """Drop bookkeeping for processes that exited"""
+        with self._lock:
+            for key in [key for key in self._throttled if key not in live_keys]:
+                app_name = self._throttled.pop(key)[0]
+                self._by_app[app_name].discard(key)
+                if not self._by_app[app_name]:
+                    del self._by_app[app_name]
+
+    def apps(self):
+        return list(self._by_app)
+
+class Enforcer:
+    def __init__(self, mode=ENFORCEMENT_MODE, suspend_timeout=SUSPEND_TIMEOUT, watcher=exit_watcher):
+        if mode not in ACTIONS:
+            log_error(f"Unknown enforcement mode '{mode}', using '{ACTION_KILL}'")
+            mode = ACTION_KILL
+        self.mode = mode
+        self.suspend_timeout = suspend_timeout
+        self._lock = threading.Lock()
+        self._suspended = {}  # app_name -> {(pid, create_time): psutil.Process}
+        self._deadlines = {}  # (pid, create_time) -> time that suspended process is terminated
+        self.throttler = Throttler()
+        self.watcher = watcher  # Confirms exits and SIGKILLs stragglers; None = fire and forget
+        self.bucket = TokenBucket()
+        self._respawns = {}  # app_name -> _RespawnState
+        self._quarantine = {}  # executable path -> (app_name, until)
+        self.tick = 0  # Monitor tick, so one scan counts as at most one relaunch
+
+    def begin_tick(self):
+        """Called by the monitor before each scan of the process table"""
+        self.tick += 1
+
+    def enforce(self, process, app_name, action=None):
+        """Apply action (default: the configured mode); returns the action taken or None"""
+        action = action or self.mode
+        if action == ACTION_SUSPEND:
+            key = _process_key(process)
+            if key in self._suspended.get(app_name, ()):
+                return None
+            if not self.bucket.take():
+                return None  # Over the rate limit; the monitor retries next tick
+            self._suspend_tree(process, app_name)
+            return ACTION_SUSPEND
+        if action == ACTION_THROTTLE:
+            if self.throttler.is_throttled(_process_key(process)) or not self.bucket.take():
+                return None
+            # Children are seen by the monitor on their own, so no tree walk here
+            return ACTION_THROTTLE if self.throttler.throttle(process, app_name) else None
+        if not self.bucket.take():
+            return None
+        self._kill(process, app_name)
+        return ACTION_KILL
+
+    def _kill(self, process, app_name):
+        """Terminate a process, escalating for apps that keep relaunching"""
+        now = time.time()
+        state = self._respawns.setdefault(app_name, _RespawnState())
+        try:
+            parent = process.parent()
+            parent_key = _process_key(parent) if parent is not None else None
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            parent_key = None
+        launches = state.record(_process_key(process), parent_key, process.create_time(),
+                                now, RESPAWN_WINDOW, self.tick)
+
+        step = None
+        if launches >= RESPAWN_QUARANTINE_AFTER > state.level:
+            step = ESCALATE_QUARANTINE
+        elif launches >= RESPAWN_KILL_TREE_AFTER > state.level:
+            step = ESCALATE_KILL_TREE
+        elif launches >= RESPAWN_SUSPEND_PARENT_AFTER > state.level:
+            step = ESCALATE_SUSPEND_PARENT
+        if step is None:
+            self._signal(process, app_name)
+            return
+        state.level = launches
+
+        parent = self._launcher(process)
+        if step == ESCALATE_SUSPEND_PARENT and parent is not None:
+            self._suspend_tree(parent, app_name)  # Resumed on unlock, terminated at the timeout
+        if step in (ESCALATE_KILL_TREE, ESCALATE_QUARANTINE):
+            tree = [parent] if parent is not None else []
+            try:
+                tree.extend(process.children(recursive=True))
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+            self._forget_suspended(app_name, tree)  # A parent suspended earlier is gone now
+            self._terminate(tree, app_name)
+        if step == ESCALATE_QUARANTINE:
+            try:
+                self._quarantine[process.exe()] = (app_name, now + QUARANTINE_SECONDS)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, OSError):
+                pass
+        self._signal(process, app_name)
+        ESCALATIONS.inc(step=step)
+        log_event(f"'{app_name}' launched {launches} times in {RESPAWN_WINDOW}s; escalated to {step}")
+        record_audit_event(EVENT_ESCALATE, app_name, step=step, launches=launches)
+
+    @staticmethod
+    def _launcher(process):
+        """The parent that keeps relaunching process, unless it is a shell or system process"""
+        try:
+            parent = process.parent()
+            if (parent is None or parent.pid <= 1 or parent.pid == os.getpid()
+                    or parent.name().lower() in PROTECTED_PROCESS_NAMES):
+                return None
+            return parent
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+
+    def quarantined_app(self, exe_path):
+        """App whose quarantine covers exe_path, or None"""
+        entry = self._quarantine.get(exe_path)
+        if entry is None:
+            return None
+        app_name, until = entry
+        if time.time() >= until:
+            self._quarantine.pop(exe_path, None)
+            log_event(f"Quarantine of {exe_path} ('{app_name}') expired")
+            return None
+        return app_name
+
+    @property
+    def has_quarantine(self):
+        return bool(self._quarantine)
+
+    def kill_quarantined(self, process, app_name):
+        """Kill a process from a quarantined path; no notification or audit"""
+        if self.bucket.take():
+            self._signal(process, app_name, kill=True)
+            QUARANTINE_KILLS.inc()
+            return True
+        return False
+
+    def should_notify(self, app_name):
+        """Rate-limit block notifications; returns (notify, blocks since the last one)"""
+        state = self._respawns.setdefault(app_name, _RespawnState())
+        state.unreported += 1
+        now = time.time()
+        if now - state.last_notice < BLOCK_NOTIFY_INTERVAL:
+            return False, state.unreported
+        state.last_notice = now
+        count, state.unreported = state.unreported, 0
+        return True, count
+
+    def _suspend_tree(self, process, app_name):
+        """Suspend a process and its descendants; False if it already was"""
+        key = _process_key(process)
+        with self._lock:
+            suspended = self._suspended.setdefault(app_name, {})
+            if key in suspended:
+                return False
+            # Each tree gets its own grace period, however long the app has had others paused
+            deadline = time.time() + self.suspend_timeout
+            # Parent first so it cannot spawn new children meanwhile
+            tree = [process]
+            try:
+                tree.extend(process.children(recursive=True))
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+            for member in tree:
+                try:
+                    member.suspend()
+                    member_key = _process_key(member)
+                    suspended[member_key] = member
+                    self._deadlines.setdefault(member_key, deadline)
+                except psutil.NoSuchProcess:
+                    continue
+        return True
+
+    def _forget_suspended(self, app_name, processes):
+        """Stop tracking suspended processes that are about to be terminated"""
+        with self._lock:
+            suspended = self._suspended.get(app_name)
+            if not suspended:
+                return
+            for process in processes:
+                try:
+                    key = _process_key(process)
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+                suspended.pop(key, None)
+                self._deadlines.pop(key, None)
+            if not suspended:
+                del self._suspended[app_name]
+
+    def suspended_counts(self):
+        """Number of suspended processes per app"""
+        with self._lock:
+            return {app: len(processes) for app, processes in self._suspended.items() if processes}
+
+    def release(self, app_name):
+        """Undo every action taken against app_name (resume, unthrottle, lift quarantine)"""
+        self._respawns.pop(app_name, None)
+        for path in [path for path, (app, _) in self._quarantine.items() if app == app_name]:
+            del self._quarantine[path]
+        restored = self.throttler.release(app_name)
+        if restored:
+            log_event(f"Restored {restored} throttled process(es) of '{app_name}'")
+        return self.resume(app_name) + restored
+
+    def resume(self, app_name):
+        """Resume every process suspended for app_name; returns how many"""
+        with self._lock:
+            processes = self._suspended.pop(app_name, {})
+            for key in processes:
+                self._deadlines.pop(key, None)
+        resumed = 0
+        for process in processes.values():
+            try:
+                process.resume()
+                resumed += 1
+            except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
+                log_repeated_error("Failed to resume process", app=app_name, error=e)
+        if resumed:
+            log_event(f"Resumed {resumed} suspended process(es) of '{app_name}'")
+            record_audit_event(EVENT_RESUME, app_name, processes=resumed)
+        return resumed
+
+    def release_unlocked(self, locked_apps, live_keys=None):
+        """Release apps that are no longer locked (schedule ended, lock removed)"""
+        locked = set(locked_apps)
+        if live_keys is not None:
+            self.throttler.forget(live_keys)
+        quarantined = [app for app, _ in self._quarantine.values()]
+        candidates = set(self._suspended) | set(self.throttler.apps()) | set(self._respawns) | set(quarantined)
+        for app_name in candidates - locked:
+            self.release(app_name)
+
+    def expire(self, now=None):
+        """Terminate trees suspended for longer than the timeout"""
+        now = now or time.time()
+        doomed = {}
+        with self._lock:
+            for app_name, suspended in list(self._suspended.items()):
+                expired = [key for key in suspended if self._deadlines.get(key, now) <= now]
+                if not expired:
+                    continue
+                doomed[app_name] = [suspended.pop(key) for key in expired]
+                for key in expired:
+                    self._deadlines.pop(key, None)
+                if not suspended:
+                    del self._suspended[app_name]
+        for app_name, processes in doomed.items():
+            self._terminate(processes, app_name)
+            log_event(f"Terminated {len(processes)} process(es) of '{app_name}' suspended over {self.suspend_timeout}s")
+
+    def shutdown(self):
+        """Terminate everything still suspended and restore throttled processes, e.g. when the monitor stops"""
+        with self._lock:
+            doomed = [process for processes in self._suspended.values() for process in processes.values()]
+            self._suspended.clear()
+            self._deadlines.clear()
+        self._terminate(doomed)
+        for app_name in self.throttler.apps():
+            self.throttler.release(app_name)
+
+    def _signal(self, process, app_name, kill=False):
+        """Terminate (or kill) a process and have the watcher confirm it exits"""
+        signalled_at = time.monotonic()
+        if kill:
+            process.kill()
+        else:
+            process.terminate()
+        if self.watcher is not None:
+            self.watcher.watch(process, app_name, signalled_at)
+
+    def _terminate(self, processes, app_name=None):
+        for process in processes:
+            try:
+                # A stopped process only acts on SIGTERM once it runs again
+                self._signal(process, app_name)
+                process.resume()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+
+# Global enforcer used by the monitor
+enforcer = Enforcer()
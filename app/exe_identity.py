@@ -0,0 +1,106 @@
+"""
+Executable identity module for AppLocker
+SHA-256 of executables, so a lock survives renaming or copying the binary.
+Each file is hashed once per version: digests are cached by (path, device,
+inode, size, mtime) and persisted to an append-only journal, so the monitor
+only reads binaries it has never seen before.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from app.logging import log_event, log_error
+from app.config import EXE_HASH_FILE
+
+CHUNK_SIZE = 1024 * 1024  # Bytes read per step while hashing
+COMPACT_MIN_RECORDS = 256
+
+def hash_file(path):
+    """SHA-256 hex digest of a file, read in fixed-size chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _file_key(stat):
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+class ExeHashCache:
+    def __init__(self, journal_file=EXE_HASH_FILE):
+        self.journal_file = journal_file
+        self._lock = threading.Lock()
+        self._entries = {}  # path -> ((dev, inode, size, mtime_ns), sha256)
+        self._records = 0
+        self.hashed = 0  # Files actually read since startup
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.journal_file, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                        self._entries[record["path"]] = (tuple(record["key"]), record["sha256"])
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        continue  # Torn write at the end of the journal
+                    self._records += 1
+        except FileNotFoundError:
+            pass
+
+    def _append(self, path, key, sha256):
+        """Journal one digest; caller must hold the lock"""
+        try:
+            os.makedirs(os.path.dirname(self.journal_file), exist_ok=True)
+            if self._records >= max(COMPACT_MIN_RECORDS, 2 * len(self._entries)):
+                self._compact()
+                return
+            with open(self.journal_file, "a", encoding="utf-8") as file:
+                file.write(json.dumps({"path": path, "key": list(key), "sha256": sha256}) + "\n")
+            self._records += 1
+        except OSError as e:
+            log_error(f"Failed to save executable hash: {e}")
+
+    def _compact(self):
+        """Rewrite the journal with one record per path; caller must hold the lock"""
+        tmp_file = f"{self.journal_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as file:
+            for path, (key, sha256) in self._entries.items():
+                file.write(json.dumps({"path": path, "key": list(key), "sha256": sha256}) + "\n")
+        os.replace(tmp_file, self.journal_file)
+        self._records = len(self._entries)
+
+    def digest(self, path, hash_new=True):
+        """SHA-256 of the file at path, or '' if it cannot be read.
+        With hash_new=False only cached digests are returned, None otherwise."""
+        if not path:
+            return ""
+        try:
+            key = _file_key(os.stat(path))
+        except OSError:
+            return ""
+
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+        if not hash_new:
+            return None
+
+        # Hash outside the lock; a large binary can take a while
+        try:
+            sha256 = hash_file(path)
+        except OSError as e:
+            log_error(f"Failed to hash {path}: {e}")
+            return ""
+
+        with self._lock:
+            self._entries[path] = (key, sha256)
+            self.hashed += 1
+            self._append(path, key, sha256)
+        log_event(f"Hashed executable {path}")
+        return sha256
+
+# Global cache used by the monitor and the CLI
+exe_hashes = ExeHashCache()
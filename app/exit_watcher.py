@@ -0,0 +1,233 @@
+"""
+Exit watcher module for AppLocker
+Confirms that signalled processes actually exit and measures how long it
+took. On Linux each process gets a pidfd and one thread sleeps in epoll
+on all of them, so hundreds of pending kills cost nothing until they
+exit. Processes still alive after KILL_GRACE_SECONDS are sent SIGKILL
+through their pidfd (immune to pid reuse). Other platforms fall back to
+psutil.wait_procs.
+"""
+
+import os
+import select
+import signal
+import threading
+import time
+from collections import deque
+import psutil
+from app.logging import log_repeated_event, log_repeated_error
+from app.config import KILL_GRACE_SECONDS
+from app.metrics import metrics
+
+EXIT_SECONDS = metrics.histogram("process_exit_seconds", "Time from signal to confirmed exit")
+LIFETIME_SECONDS = metrics.histogram("process_lifetime_seconds", "Time from process creation to confirmed exit",
+                                     buckets=(0.5, 1, 2, 3, 5, 10, 30, 60, 300, 3600))
+STRAGGLERS = metrics.counter("process_stragglers_total", "Processes that needed SIGKILL")
+LOST = metrics.counter("process_exit_lost_total", "Processes still running after SIGKILL")
+
+# How long to wait after SIGKILL before giving up on a process
+KILL_GIVE_UP_SECONDS = 5
+
+def pidfd_supported():
+    return hasattr(os, "pidfd_open") and hasattr(select, "epoll") and hasattr(signal, "pidfd_send_signal")
+
+class _Pending:
+    __slots__ = ("process", "app_name", "signalled_at", "deadline", "killed", "fd", "created")
+
+    def __init__(self, process, app_name, signalled_at, deadline, fd=None):
+        self.process = process
+        try:
+            self.created = process.create_time()  # Cached by psutil; gone once the process is reaped
+        except (psutil.Error, AttributeError):
+            self.created = None
+        self.app_name = app_name
+        self.signalled_at = signalled_at
+        self.deadline = deadline
+        self.killed = False
+        self.fd = fd
+
+class ExitWatcher:
+    def __init__(self, grace=KILL_GRACE_SECONDS, use_pidfd=None):
+        self.grace = grace
+        self.use_pidfd = pidfd_supported() if use_pidfd is None else use_pidfd
+        self._lock = threading.Lock()
+        self._pending = {}  # pidfd (or pid on the fallback) -> _Pending
+        self._watched = set()  # pids in _pending, so repeated signals are tracked once
+        self._thread = None
+        self._running = False
+        self._epoll = None
+        self._wake_r = self._wake_w = None
+        self._wakeup = threading.Event()
+        self.confirmed = 0  # Exits seen
+        self.stragglers = 0  # Processes that needed SIGKILL
+        self.lost = 0  # Processes still alive after SIGKILL
+        self.latencies = deque(maxlen=1000)  # Recent signal-to-exit seconds
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            if self.use_pidfd:
+                self._epoll = select.epoll()
+                self._wake_r, self._wake_w = os.pipe()
+                os.set_blocking(self._wake_r, False)
+                self._epoll.register(self._wake_r, select.EPOLLIN)
+            target = self._run_epoll if self.use_pidfd else self._run_fallback
+            self._thread = threading.Thread(target=target, daemon=True, name="ExitWatcher")
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+        self._wake()
+        if self._thread:
+            self._thread.join(timeout=2)
+        with self._lock:
+            for pending in self._pending.values():
+                if pending.fd is not None:
+                    os.close(pending.fd)
+            self._pending.clear()
+            self._watched.clear()
+            if self._epoll is not None:
+                self._epoll.close()
+                os.close(self._wake_r)
+                os.close(self._wake_w)
+                self._epoll = None
+
+    def _wake(self):
+        if self.use_pidfd:
+            try:
+                os.write(self._wake_w, b"x")
+            except OSError:
+                pass
+        else:
+            self._wakeup.set()
+
+    def watch(self, process, app_name=None, signalled_at=None):
+        """Track a process that was just sent SIGTERM (or SIGKILL)"""
+        if process.pid in self._watched:
+            return
+        if not self._running:
+            self.start()
+        signalled_at = signalled_at or time.monotonic()
+        deadline = signalled_at + self.grace
+
+        if not self.use_pidfd:
+            with self._lock:
+                self._pending[process.pid] = _Pending(process, app_name, signalled_at, deadline)
+                self._watched.add(process.pid)
+            self._wake()
+            return
+
+        try:
+            fd = os.pidfd_open(process.pid)
+        except ProcessLookupError:
+            self._record_exit(signalled_at)  # Gone before we could even look
+            return
+        except OSError as e:
+            log_repeated_error("Failed to open pidfd", app=app_name, error=e)
+            return
+        # The pid may have been reused between the signal and pidfd_open
+        if not process.is_running():
+            os.close(fd)
+            self._record_exit(signalled_at)
+            return
+        with self._lock:
+            self._pending[fd] = _Pending(process, app_name, signalled_at, deadline, fd)
+            self._watched.add(process.pid)
+            self._epoll.register(fd, select.EPOLLIN)
+        self._wake()  # Recompute the poll timeout
+
+    def _record_exit(self, signalled_at, created=None):
+        latency = time.monotonic() - signalled_at
+        self.confirmed += 1
+        self.latencies.append(latency)
+        EXIT_SECONDS.observe(latency)
+        if created is not None:
+            LIFETIME_SECONDS.observe(max(0.0, time.time() - created))
+
+    def _next_timeout(self):
+        with self._lock:
+            if not self._pending:
+                return None
+            return max(0.0, min(p.deadline for p in self._pending.values()) - time.monotonic())
+
+    def _escalate(self, now):
+        """SIGKILL processes past their grace period; give up on ones past that too"""
+        with self._lock:
+            overdue = [(key, p) for key, p in self._pending.items() if p.deadline <= now]
+        for key, pending in overdue:
+            if pending.killed:
+                self.lost += 1
+                LOST.inc()
+                log_repeated_error("Process survived SIGKILL", app=pending.app_name, pid=pending.process.pid)
+                self._forget(key)
+                continue
+            try:
+                if pending.fd is not None:
+                    signal.pidfd_send_signal(pending.fd, signal.SIGKILL)
+                else:
+                    pending.process.kill()
+                self.stragglers += 1
+                STRAGGLERS.inc()
+                log_repeated_event("Killed process that ignored terminate", app=pending.app_name,
+                                   pid=pending.process.pid)
+            except (ProcessLookupError, psutil.NoSuchProcess):
+                pass  # Exited meanwhile; the exit shows up on its own
+            except (OSError, psutil.AccessDenied) as e:
+                log_repeated_error("Failed to kill straggler", app=pending.app_name, error=e)
+            pending.killed = True
+            pending.deadline = now + KILL_GIVE_UP_SECONDS
+
+    def _forget(self, key):
+        with self._lock:
+            pending = self._pending.pop(key, None)
+            if pending is not None:
+                self._watched.discard(pending.process.pid)
+            if pending is not None and pending.fd is not None:
+                self._epoll.unregister(pending.fd)
+                os.close(pending.fd)
+        return pending
+
+    def _run_epoll(self):
+        while self._running:
+            timeout = self._next_timeout()
+            events = self._epoll.poll(-1 if timeout is None else timeout)
+            for fd, _ in events:
+                if fd == self._wake_r:
+                    try:
+                        while os.read(self._wake_r, 64):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                pending = self._forget(fd)  # A pidfd turns readable when the process exits
+                if pending is not None:
+                    self._record_exit(pending.signalled_at, pending.created)
+            self._escalate(time.monotonic())
+
+    def _run_fallback(self):
+        while self._running:
+            with self._lock:
+                pending = list(self._pending.values())
+            if not pending:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            timeout = self._next_timeout()  # 0 means a deadline already passed: escalate now
+            gone, _ = psutil.wait_procs([p.process for p in pending], timeout=0.5 if timeout is None else min(0.5, timeout))
+            gone_pids = {process.pid for process in gone}
+            for item in pending:
+                if item.process.pid in gone_pids and self._forget(item.process.pid) is not None:
+                    self._record_exit(item.signalled_at, item.created)
+            self._escalate(time.monotonic())
+
+# Global watcher used by the enforcer
+exit_watcher = ExitWatcher()
@@ -1,6 +1,5 @@
 import json
 import pyotp
-import qrcode
 import os
 import sys
 import subprocess
@@ -9,13 +8,21 @@ import random
 import string
 from tkinter import *
 from tkinter import messagebox
-from PIL import ImageTk, Image
 from app.logging import log_event, log_error
 from app.auth import save_secret_to_db, unlock_app
+from app.credentials import credential_store
+from app.audit import (
+    audit_log, record_audit_event, EVENT_TYPES, EVENT_AUTH_SUCCESS, EVENT_AUTH_FAILED,
+    EVENT_MASTER_KEY_USED
+)
 from app.app_lock import get_installed_apps
-from app.config import QR_CODE_FILE, LOCKED_APPS_FILE, WINDOW_TITLE
+from app.config import QR_CODE_FILE, WINDOW_TITLE
+from app.lock_store import lock_store
+from app.profiling import mark_startup
+from app.metrics import format_monitor_metrics
+from app import client
 from app.email_service import (
-    generate_otp, save_otp, verify_otp, send_reset_email, 
+    generate_otp, save_otp, verify_otp, send_reset_email, get_email_status,
     cleanup_expired_otps, get_user_email_from_storage
 )
 
@@ -40,15 +47,6 @@ def save_master_keys(keys, user_email):
         from app.config import USER_DATA_FILE
         import json
         
-        # Load existing data
-        try:
-            with open(USER_DATA_FILE, "r", encoding="utf-8") as file:
-                data = file.read().strip().split('\n')
-                secret = data[0] if len(data) > 0 else ""
-                email = data[1] if len(data) > 1 else ""
-        except:
-            secret, email = "", ""
-        
         # Create master keys file
         master_keys_file = USER_DATA_FILE.replace("user_data.txt", "master_keys.json")
         master_data = {
@@ -99,6 +97,7 @@ def verify_master_key(key, user_email):
                 json.dump(data, file, indent=2)
             
             log_event(f"Master key used for {user_email}")
+            record_audit_event(EVENT_MASTER_KEY_USED, email=user_email)
             return True
         
         return False
@@ -107,47 +106,40 @@ def verify_master_key(key, user_email):
         log_error(f"Failed to verify master key: {e}")
         return False
 
-# Function to generate a QR Code for Google Authenticator setup
-def generate_qr_code(secret, email):
+# Rendered provisioning QR codes, {(secret, email, size): png_bytes}
+_qr_png_cache = {}
+
+# Function to generate a QR Code for Google Authenticator setup (PNG bytes, in memory)
+def generate_qr_code(secret, email, size=300):
+    key = (secret, email, size)
+    if key in _qr_png_cache:
+        return _qr_png_cache[key]
+    
     try:
-        # Ensure assets directory exists
-        assets_dir = os.path.dirname(QR_CODE_FILE)
-        if not os.path.exists(assets_dir):
-            os.makedirs(assets_dir, exist_ok=True)
-            log_event(f"Created assets directory: {assets_dir}")
-        
         # Create TOTP URI
         totp = pyotp.TOTP(secret)
         uri = totp.provisioning_uri(email, issuer_name="AppLocker")
         log_event(f"Generated TOTP URI for {email}")
         
-        # Create QR code with qrcode library
+        # Create QR code with qrcode library (imported only when a QR is shown)
+        import io
         import qrcode
+        border = 4
         qr = qrcode.QRCode(
-            version=1,
             error_correction=qrcode.constants.ERROR_CORRECT_M,  # Medium error correction
-            box_size=10,  # Larger box size for better quality
-            border=4,
+            border=border,
         )
         qr.add_data(uri)
         qr.make(fit=True)
         
-        # Create image with high contrast and larger size
+        # Whole pixels per module keeps edges sharp without resampling
+        qr.box_size = max(1, size // (qr.modules_count + 2 * border))
         img = qr.make_image(fill_color="black", back_color="white")
-        # Ensure minimum size for the QR code
-        img = img.resize((300, 300), Image.Resampling.LANCZOS)
-        
-        # Save the image
-        img.save(QR_CODE_FILE)
-        log_event(f"QR code saved successfully to {QR_CODE_FILE}")
-        
-        # Verify file was created
-        if os.path.exists(QR_CODE_FILE):
-            file_size = os.path.getsize(QR_CODE_FILE)
-            log_event(f"QR code file verified: {file_size} bytes")
-            return QR_CODE_FILE
-        else:
-            raise FileNotFoundError("QR code file was not created")
+        
+        buffer = io.BytesIO()
+        img.save(buffer)
+        png = _qr_png_cache[key] = buffer.getvalue()
+        return png
         
     except ImportError as e:
         log_error(f"Missing qrcode library: {e}")
@@ -156,9 +148,67 @@ def generate_qr_code(secret, email):
         log_error(f"Failed to generate QR code: {e}")
         raise RuntimeError(f"QR code generation failed: {str(e)}")
 
+# Function to get the QR code as a Tk image, cached per window root
+def get_qr_photo(secret, email, widget, size=300):
+    import base64
+    root = widget._root()  # Images belong to one Tk interpreter
+    cache = getattr(root, "_qr_photos", None)
+    if cache is None:
+        cache = root._qr_photos = {}
+    key = (secret, email, size)
+    if key not in cache:
+        png = generate_qr_code(secret, email, size)
+        cache[key] = PhotoImage(master=root, data=base64.b64encode(png), format="png")
+    return cache[key]
+
+# Function to write the QR code to disk, only when the user asks for it
+def export_qr_code(secret, email, parent=None):
+    from tkinter import filedialog
+    path = filedialog.asksaveasfilename(
+        parent=parent, title="Save QR Code",
+        initialdir=os.path.dirname(QR_CODE_FILE), initialfile=os.path.basename(QR_CODE_FILE),
+        defaultextension=".png", filetypes=[("PNG image", "*.png")]
+    )
+    if not path:
+        return None
+    try:
+        with open(path, "wb") as file:
+            file.write(generate_qr_code(secret, email))
+        log_event(f"QR code exported to {path}")
+        messagebox.showinfo("QR Code Saved",
+                            f"Saved to:\n{path}\n\n"
+                            f"⚠️ The image contains your 2FA secret. Keep it private.",
+                            parent=parent)
+        return path
+    except OSError as e:
+        log_error(f"Failed to export QR code: {e}")
+        messagebox.showerror("Save Failed", f"Could not save QR code: {e}", parent=parent)
+        return None
+
+# Function to bring a window to the front when a second launch hands off to us
+def watch_show_requests(window, interval_ms=300):
+    from app.instance import show_requested
+
+    def poll():
+        try:
+            if show_requested.is_set():
+                show_requested.clear()
+                window.deiconify()
+                window.lift()
+                window.attributes("-topmost", True)
+                window.after(200, lambda: window.attributes("-topmost", False))
+                window.focus_force()
+            window.after(interval_ms, poll)
+        except TclError:
+            pass  # Window was destroyed
+
+    window.after(interval_ms, poll)
+    window.after_idle(lambda: mark_startup("first_window", final=True))
+
 # Function to handle user setup for 2FA authentication - NEW WIZARD DESIGN
 def user_setup():
     setup_win = Tk()
+    watch_show_requests(setup_win)
     setup_win.title(f"{WINDOW_TITLE} - Setup Wizard")
     setup_win.geometry("500x700")  # Increased height significantly for navigation
     setup_win.resizable(False, False)  # Fixed size for consistent experience
@@ -415,25 +465,18 @@ def user_setup():
                 setup_win.update()
                 
                 secret_key = generate_secret_key()
-                qr_code_path = generate_qr_code(secret_key, user_email)
+                photo = get_qr_photo(secret_key, user_email, setup_win, size=170)
                 
-                if os.path.exists(qr_code_path):
-                    img = Image.open(qr_code_path)
-                    img = img.resize((170, 170), Image.Resampling.LANCZOS)
-                    photo = ImageTk.PhotoImage(img)
-                    
-                    qr_label.config(image=photo, text="")
-                    qr_label.image = photo
-                    
-                    # Show manual key
-                    manual_key_label.config(text=secret_key)
-                    
-                    messagebox.showinfo("QR Code Ready!", 
-                                       "1. Install Google Authenticator on your phone\n"
-                                       "2. Scan the QR code above\n"
-                                       "3. Use the ORANGE navigation buttons at the top!")
-                else:
-                    qr_label.config(text="❌ Generation failed", fg="red")
+                qr_label.config(image=photo, text="")
+                qr_label.image = photo
+                
+                # Show manual key
+                manual_key_label.config(text=secret_key)
+                
+                messagebox.showinfo("QR Code Ready!", 
+                                   "1. Install Google Authenticator on your phone\n"
+                                   "2. Scan the QR code above\n"
+                                   "3. Use the ORANGE navigation buttons at the top!")
                     
             except Exception as e:
                 qr_label.config(text="❌ Error generating QR code", fg="red")
@@ -704,19 +747,11 @@ def show_existing_qr_code(user_email):
         
         # Generate and display QR code
         try:
-            qr_code_path = generate_qr_code(secret, email)
+            photo = get_qr_photo(secret, email, qr_win)
             
-            if os.path.exists(qr_code_path):
-                img = Image.open(qr_code_path)
-                img = img.resize((300, 300), Image.Resampling.LANCZOS)
-                photo = ImageTk.PhotoImage(img)
-                
-                qr_label = Label(main_frame, image=photo, bg="white", relief="solid", borderwidth=2)
-                qr_label.image = photo
-                qr_label.pack(pady=20)
-            else:
-                Label(main_frame, text="QR Code generation failed", 
-                      fg="red", font=("Arial", 12)).pack(pady=20)
+            qr_label = Label(main_frame, image=photo, bg="white", relief="solid", borderwidth=2)
+            qr_label.image = photo
+            qr_label.pack(pady=20)
         except Exception as e:
             log_error(f"Failed to display existing QR code: {e}")
             Label(main_frame, text="Error displaying QR code", 
@@ -740,6 +775,9 @@ def show_existing_qr_code(user_email):
         Button(main_frame, text="Copy Key to Clipboard", command=copy_key,
                bg="lightblue", font=("Arial", 10)).pack(pady=5)
         
+        Button(main_frame, text="Save QR Image...", command=lambda: export_qr_code(secret, email, qr_win),
+               font=("Arial", 10)).pack(pady=5)
+        
         # Instructions
         instructions = """
 If you deleted AppLocker from Google Authenticator:
@@ -794,14 +832,14 @@ def reset_app_completely():
         return
     
     try:
-        from app.config import USER_DATA_FILE, LOCKED_APPS_FILE
+        from app.config import USER_DATA_FILE, LOCKED_APPS_FILE, OTP_FILE
         
         # Delete all data files
         files_to_delete = [
             USER_DATA_FILE,
             LOCKED_APPS_FILE,
             QR_CODE_FILE,
-            os.path.join(os.path.dirname(__file__), "data", "reset_otps.json")
+            OTP_FILE
         ]
         
         deleted_files = []
@@ -813,12 +851,20 @@ def reset_app_completely():
             except Exception as e:
                 log_error(f"Failed to delete {file_path}: {e}")
         
-        # Clear any remaining data directories
+        # Clear any remaining data, keeping the lock and IPC files the
+        # running service and this instance still hold
         try:
             data_dir = os.path.join(os.path.dirname(__file__), "data")
+            keep = {"ipc.key", "gui.lock", "service.lock"}
             if os.path.exists(data_dir):
                 import shutil
-                shutil.rmtree(data_dir)
+                for entry in os.scandir(data_dir):
+                    if entry.name in keep or entry.name.endswith(".sock"):
+                        continue
+                    if entry.is_dir():
+                        shutil.rmtree(entry.path)
+                    else:
+                        os.remove(entry.path)
         except Exception as e:
             log_error(f"Failed to clear data directory: {e}")
         
@@ -829,11 +875,10 @@ def reset_app_completely():
                            f"Deleted: {', '.join(deleted_files) if deleted_files else 'No files found'}\n\n"
                            f"The app will now restart for fresh setup.")
         
-        # Close current windows and restart setup
-        import sys
-        import subprocess
-        
-        # Start new instance
+        # Hand the single-instance lock to a fresh copy for setup, so the
+        # two never run side by side
+        from app.instance import release_gui_instance
+        release_gui_instance()
         subprocess.Popen([sys.executable] + sys.argv)
         
         # Exit current instance
@@ -892,20 +937,12 @@ After verification, you can generate a new QR code."""
             
             # Save OTP
             if save_otp(user_email, otp):
-                # Send email
-                if send_reset_email(user_email, otp):
-                    status_label.config(text="OTP sent to your email! Check your inbox.", fg="green")
-                    
-                    # Show OTP entry
-                    otp_frame.pack(fill=X, pady=10)
-                    otp_label.pack(anchor=W)
-                    otp_entry.pack(fill=X, pady=5)
-                    
-                    # Hide send button, show verify button
-                    send_btn.pack_forget()
-                    verify_btn.pack(pady=10)
-                    
-                    log_event(f"Reset OTP sent to {user_email}")
+                # Queue email; delivery status is polled below
+                message_id = send_reset_email(user_email, otp)
+                if message_id:
+                    status_label.config(text="Sending OTP to your email...", fg="#007bff")
+                    send_btn.config(state=DISABLED)
+                    reset_win.after(500, lambda: poll_email_status(message_id))
                 else:
                     status_label.config(text="Failed to send email. Check email configuration.", fg="red")
             else:
@@ -915,6 +952,37 @@ After verification, you can generate a new QR code."""
             log_error(f"Failed to send reset OTP: {e}")
             status_label.config(text="Error sending OTP. Please try again.", fg="red")
     
+    def poll_email_status(message_id):
+        """Update the window as the mail queue delivers the OTP"""
+        if not reset_win.winfo_exists():
+            return
+        
+        delivery = get_email_status(message_id)
+        if delivery is None or delivery["status"] == "failed":
+            status_label.config(text="Failed to send email. Check email configuration.", fg="red")
+            send_btn.config(state=NORMAL)
+            return
+        
+        if delivery["status"] != "sent":
+            if delivery["attempts"]:
+                status_label.config(text=f"Email server unavailable, retrying (attempt {delivery['attempts'] + 1})...",
+                                    fg="orange")
+            reset_win.after(500, lambda: poll_email_status(message_id))
+            return
+        
+        status_label.config(text="OTP sent to your email! Check your inbox.", fg="green")
+        
+        # Show OTP entry
+        otp_frame.pack(fill=X, pady=10)
+        otp_label.pack(anchor=W)
+        otp_entry.pack(fill=X, pady=5)
+        
+        # Hide send button, show verify button
+        send_btn.pack_forget()
+        verify_btn.pack(pady=10)
+        
+        log_event(f"Reset OTP sent to {user_email}")
+    
     def verify_and_reset():
         """Verify OTP and proceed to reset"""
         entered_otp = otp_entry.get().strip()
@@ -987,19 +1055,11 @@ def show_new_qr_setup(email, secret):
     
     # Generate and display QR code
     try:
-        qr_code_path = generate_qr_code(secret, email)
+        photo = get_qr_photo(secret, email, qr_win)
         
-        if os.path.exists(qr_code_path):
-            img = Image.open(qr_code_path)
-            img = img.resize((300, 300), Image.Resampling.LANCZOS)
-            photo = ImageTk.PhotoImage(img)
-            
-            qr_label = Label(main_frame, image=photo, bg="white")
-            qr_label.image = photo
-            qr_label.pack(pady=20)
-        else:
-            Label(main_frame, text="QR Code generation failed", 
-                  fg="red", font=("Arial", 12)).pack(pady=20)
+        qr_label = Label(main_frame, image=photo, bg="white")
+        qr_label.image = photo
+        qr_label.pack(pady=20)
     except Exception as e:
         log_error(f"Failed to display new QR code: {e}")
         Label(main_frame, text="Error displaying QR code", 
@@ -1014,6 +1074,9 @@ def show_new_qr_setup(email, secret):
     key_entry.config(state=DISABLED)
     key_entry.pack(fill=X, pady=(0, 20))
     
+    Button(main_frame, text="Save QR Image...", command=lambda: export_qr_code(secret, email, qr_win),
+           font=("Arial", 10)).pack()
+    
     # Instructions
     instructions = """
 1. Delete the old AppLocker entry from Google Authenticator
@@ -1039,6 +1102,7 @@ def show_installed_apps():
 
     # Display apps in a new window
     apps_win = Tk()
+    watch_show_requests(apps_win)
     apps_win.title("Lock Applications")
     apps_win.geometry("800x600")
     apps_win.configure(bg="#f8f9fa")
@@ -1223,7 +1287,7 @@ def lock_app_with_confirmation(app_name, parent_window):
     # Create confirmation dialog
     confirm_win = Toplevel(parent_window)
     confirm_win.title("Confirm App Lock")
-    confirm_win.geometry("450x300")
+    confirm_win.geometry("450x380")
     confirm_win.configure(bg="white")
     confirm_win.resizable(False, False)
     confirm_win.grab_set()
@@ -1231,8 +1295,8 @@ def lock_app_with_confirmation(app_name, parent_window):
     # Center dialog
     confirm_win.update_idletasks()
     x = parent_window.winfo_x() + (parent_window.winfo_width() // 2) - 225
-    y = parent_window.winfo_y() + (parent_window.winfo_height() // 2) - 150
-    confirm_win.geometry(f"450x300+{x}+{y}")
+    y = parent_window.winfo_y() + (parent_window.winfo_height() // 2) - 190
+    confirm_win.geometry(f"450x380+{x}+{y}")
     
     # Header
     header_frame = Frame(confirm_win, bg="#dc3545", height=60)
@@ -1256,33 +1320,44 @@ def lock_app_with_confirmation(app_name, parent_window):
 The app will be blocked immediately when launched."""
     
     Label(content_frame, text=info_text, font=("Segoe UI", 10), 
-          bg="white", fg="#6c757d", justify=LEFT).pack(pady=(0, 20))
+          bg="white", fg="#6c757d", justify=LEFT).pack(pady=(0, 10))
+    
+    # Optional schedule, e.g. only during work hours
+    Label(content_frame, text="Only lock during (optional), e.g. mon-fri 09:00-17:00:", 
+          font=("Segoe UI", 9), bg="white", fg="#2c3e50").pack(anchor=W)
+    schedule_entry = Entry(content_frame, font=("Segoe UI", 10), width=40)
+    schedule_entry.pack(fill=X, pady=(2, 0))
     
     def confirm_lock():
+        from app.schedule import parse_schedule_text, format_schedule, ScheduleError
+        
+        schedule_text = schedule_entry.get().strip()
         try:
-            # Load existing locked apps
-            try:
-                with open(LOCKED_APPS_FILE, "r", encoding="utf-8") as file:
-                    locked_apps = json.load(file)
-            except (FileNotFoundError, json.JSONDecodeError):
-                locked_apps = {}
-
-            locked_apps[app_name] = True  # Mark as locked
-
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(LOCKED_APPS_FILE), exist_ok=True)
-            
-            with open(LOCKED_APPS_FILE, "w", encoding="utf-8") as file:
-                json.dump(locked_apps, file, indent=2)
-
-            log_event(f"App '{app_name}' is now locked")
+            schedule = parse_schedule_text(schedule_text) if schedule_text else []
+        except ScheduleError as e:
+            messagebox.showerror("Invalid Schedule", f"{e}\n\nExample: mon-fri 09:00-17:00; sat 10:00-12:00",
+                                 parent=confirm_win)
+            return
+        
+        code = None
+        if lock_store.would_weaken(app_name, schedule=schedule):
+            from tkinter import simpledialog
+            code = simpledialog.askstring("2FA Verification",
+                                          f"'{app_name}' is already locked.\n"
+                                          f"Enter your 2FA code to change its schedule:", parent=confirm_win)
+            if not code:
+                return
+        
+        try:
+            client.lock(app_name, schedule=schedule, code=code)  # Service persists, logs and audits the lock
             
             confirm_win.destroy()
             
+            when = f"🕒 Locked during: {format_schedule(schedule)}" if schedule else "🛡️ Protection is active immediately"
             messagebox.showinfo("App Locked!", 
                                f"✅ '{app_name}' is now protected!\n\n"
                                f"🔒 It will require authentication to open\n"
-                               f"🛡️ Protection is active immediately")
+                               f"{when}")
             
             parent_window.destroy()
             show_unlock_interface()
@@ -1306,6 +1381,7 @@ The app will be blocked immediately when launched."""
 def show_unlock_interface():
     """Show the main unlock interface - NEW MODERN DESIGN"""
     unlock_win = Tk()
+    watch_show_requests(unlock_win)
     unlock_win.title(WINDOW_TITLE)
     unlock_win.geometry("700x500")
     unlock_win.configure(bg="#f8f9fa")
@@ -1318,11 +1394,7 @@ def show_unlock_interface():
     unlock_win.geometry(f"700x500+{x}+{y}")
     
     # Load locked apps
-    try:
-        with open(LOCKED_APPS_FILE, "r", encoding="utf-8") as file:
-            locked_apps = json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        locked_apps = {}
+    locked_apps = lock_store.all()
     
     # Session management
     session_active = getattr(show_unlock_interface, 'session_active', False)
@@ -1416,11 +1488,19 @@ def show_unlock_interface():
                                            f"Remove protection from '{app_name}'?\n\n"
                                            f"The app will no longer require authentication.")
                 if result:
-                    del locked_apps[app_name]
-                    with open(LOCKED_APPS_FILE, "w", encoding="utf-8") as file:
-                        json.dump(locked_apps, file, indent=2)
+                    from tkinter import simpledialog
+                    code = simpledialog.askstring("2FA Verification",
+                                                  f"Enter your 2FA code to remove the lock from '{app_name}':",
+                                                  parent=unlock_win)
+                    if not code:
+                        return
+                    try:
+                        client.remove_lock(app_name, code=code)
+                    except Exception as e:
+                        messagebox.showerror("Remove Lock", f"Lock not removed: {e}", parent=unlock_win)
+                        return
+                    locked_apps.pop(app_name, None)
                     listbox.delete(selection[0])
-                    log_event(f"Lock removed from app: {app_name}")
                     
                     # Refresh if no apps left
                     if not locked_apps:
@@ -1458,6 +1538,11 @@ def show_unlock_interface():
            font=("Segoe UI", 10), bg="#17a2b8", fg="white", 
            relief="flat", padx=15, pady=8).pack(side=RIGHT, padx=(10, 0))
     
+    Button(right_buttons, text="📊 Activity", 
+           command=lambda: show_activity_window(unlock_win, list(locked_apps.keys())),
+           font=("Segoe UI", 10), bg="#6f42c1", fg="white", 
+           relief="flat", padx=15, pady=8).pack(side=RIGHT, padx=(10, 0))
+    
     Button(right_buttons, text="⚙️ Settings", 
            command=lambda: show_settings_window(unlock_win),
            font=("Segoe UI", 10), bg="#6c757d", fg="white", 
@@ -1543,9 +1628,7 @@ def unlock_app_with_popup(app_name, parent_window):
             # Try TOTP verification
             if len(code) == 6 and code.isdigit():
                 try:
-                    import pyotp
-                    totp = pyotp.TOTP(secret)
-                    if totp.verify(code, valid_window=2):
+                    if credential_store.verify_totp(code, valid_window=2):
                         success = True
                         feedback_label.config(text="✅ Authenticator code verified!", fg="#28a745")
                 except Exception as e:
@@ -1564,6 +1647,9 @@ def unlock_app_with_popup(app_name, parent_window):
             elif not success:
                 feedback_label.config(text="❌ Invalid code format", fg="#dc3545")
             
+            record_audit_event(EVENT_AUTH_SUCCESS if success else EVENT_AUTH_FAILED, app_name,
+                               method="totp" if len(code) == 6 else "master_key")
+            
             if success:
                 popup.update()
                 popup.after(1000, lambda: [popup.destroy(), unlock_app_success(app_name, parent_window)])
@@ -1595,9 +1681,7 @@ def unlock_app_with_popup(app_name, parent_window):
             # Try TOTP verification
             if len(code) == 6 and code.isdigit():
                 try:
-                    import pyotp
-                    totp = pyotp.TOTP(secret)
-                    if totp.verify(code, valid_window=2):
+                    if credential_store.verify_totp(code, valid_window=2):
                         success = True
                 except Exception as e:
                     log_error(f"TOTP verification failed: {e}")
@@ -1607,6 +1691,9 @@ def unlock_app_with_popup(app_name, parent_window):
                 if verify_master_key(code, email):
                     success = True
             
+            record_audit_event(EVENT_AUTH_SUCCESS if success else EVENT_AUTH_FAILED, app_name,
+                               method="totp" if len(code) == 6 else "master_key", scope="session")
+            
             if success:
                 # Activate session
                 show_unlock_interface.session_active = True
@@ -1663,7 +1750,7 @@ def show_settings_window(parent):
     """Show settings window with app management options"""
     settings = Toplevel(parent)
     settings.title("AppLocker Settings")
-    settings.geometry("500x400")
+    settings.geometry("500x460")
     settings.configure(bg="white")
     settings.resizable(False, False)
     settings.grab_set()
@@ -1672,7 +1759,7 @@ def show_settings_window(parent):
     settings.update_idletasks()
     x = parent.winfo_x() + 100
     y = parent.winfo_y() + 50
-    settings.geometry(f"500x400+{x}+{y}")
+    settings.geometry(f"500x460+{x}+{y}")
     
     # Header
     header_frame = Frame(settings, bg="#343a40", height=60)
@@ -1708,6 +1795,11 @@ def show_settings_window(parent):
            font=("Segoe UI", 11), bg="#ffc107", fg="#212529", 
            relief="flat", padx=25, pady=10, width=25).pack(pady=5)
     
+    Button(content_frame, text="📈 Monitor Status", 
+           command=lambda: show_monitor_status_window(settings),
+           font=("Segoe UI", 11), bg="#20c997", fg="white", 
+           relief="flat", padx=25, pady=10, width=25).pack(pady=5)
+    
     Button(content_frame, text="🔄 Reset Authenticator", 
            command=lambda: [settings.destroy(), show_reset_authenticator_window(email)],
            font=("Segoe UI", 11), bg="#fd7e14", fg="white", 
@@ -1727,6 +1819,122 @@ def show_settings_window(parent):
            font=("Segoe UI", 10), bg="#6c757d", fg="white", 
            relief="flat", padx=20, pady=5).pack(side=BOTTOM, pady=(20, 0))
 
+def show_activity_window(parent, locked_apps=()):
+    """Show audit history filtered by app, event type and time range"""
+    import time
+    
+    activity = Toplevel(parent)
+    activity.title("AppLocker Activity")
+    activity.geometry("700x500")
+    activity.configure(bg="white")
+    
+    # Header
+    header_frame = Frame(activity, bg="#6f42c1", height=60)
+    header_frame.pack(fill=X)
+    header_frame.pack_propagate(False)
+    
+    Label(header_frame, text="📊 Activity", 
+          font=("Segoe UI", 14, "bold"), fg="white", bg="#6f42c1").pack(pady=15)
+    
+    # Filters
+    filter_frame = Frame(activity, bg="white", padx=20, pady=10)
+    filter_frame.pack(fill=X)
+    
+    all_apps = "All apps"
+    all_types = "All events"
+    ranges = {
+        "Last 24 hours": 24 * 3600,
+        "Last 7 days": 7 * 24 * 3600,
+        "Last 30 days": 30 * 24 * 3600,
+        "Last year": 365 * 24 * 3600
+    }
+    
+    app_choices = [all_apps] + sorted(set(locked_apps) | set(audit_log.known_apps()))
+    app_var = StringVar(value=all_apps)
+    type_var = StringVar(value=all_types)
+    range_var = StringVar(value="Last 7 days")
+    
+    OptionMenu(filter_frame, app_var, *app_choices).pack(side=LEFT, padx=(0, 10))
+    OptionMenu(filter_frame, type_var, all_types, *EVENT_TYPES).pack(side=LEFT, padx=(0, 10))
+    OptionMenu(filter_frame, range_var, *ranges.keys()).pack(side=LEFT, padx=(0, 10))
+    
+    # Results
+    list_frame = Frame(activity, bg="white", relief="solid", bd=1)
+    list_frame.pack(fill=BOTH, expand=True, padx=20, pady=(0, 10))
+    
+    scrollbar = Scrollbar(list_frame, orient=VERTICAL)
+    listbox = Listbox(list_frame, font=("Courier", 9), yscrollcommand=scrollbar.set,
+                      bg="white", fg="#2c3e50", relief="flat", bd=0)
+    listbox.pack(side=LEFT, fill=BOTH, expand=True, padx=10, pady=10)
+    scrollbar.config(command=listbox.yview)
+    scrollbar.pack(side=RIGHT, fill=Y, padx=(0, 10), pady=10)
+    
+    count_label = Label(activity, text="", font=("Segoe UI", 9), bg="white", fg="#6c757d")
+    count_label.pack(anchor=W, padx=20)
+    
+    def run_query(*args):
+        app = None if app_var.get() == all_apps else app_var.get()
+        event_type = None if type_var.get() == all_types else type_var.get()
+        start = time.time() - ranges[range_var.get()]
+        
+        try:
+            events = audit_log.query(app=app, event_type=event_type, start=start, limit=500)
+        except Exception as e:
+            log_error(f"Failed to query activity: {e}")
+            events = []
+        
+        listbox.delete(0, END)
+        for event in events:
+            details = " ".join(f"{key}={value}" for key, value in event.items()
+                               if key not in ("ts", "type", "app"))
+            listbox.insert(END, f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(event['ts']))}  "
+                                f"{event['type']:<16} {event.get('app', '-'):<24} {details}")
+        count_label.config(text=f"Showing {len(events)} events" + (" (newest 500)" if len(events) == 500 else ""))
+    
+    for var in (app_var, type_var, range_var):
+        var.trace("w", run_query)
+    
+    Button(activity, text="Close", command=activity.destroy,
+           font=("Segoe UI", 10), bg="#6c757d", fg="white", 
+           relief="flat", padx=20, pady=5).pack(pady=10)
+    
+    run_query()
+
+def show_monitor_status_window(parent, refresh_ms=2000):
+    """Show live monitor and enforcement metrics from the service"""
+    status_win = Toplevel(parent)
+    status_win.title("AppLocker Monitor Status")
+    status_win.geometry("560x320")
+    status_win.configure(bg="white")
+    
+    # Header
+    header_frame = Frame(status_win, bg="#20c997", height=60)
+    header_frame.pack(fill=X)
+    header_frame.pack_propagate(False)
+    
+    Label(header_frame, text="📈 Monitor Status", 
+          font=("Segoe UI", 14, "bold"), fg="white", bg="#20c997").pack(pady=15)
+    
+    metrics_label = Label(status_win, text="Loading...", font=("Courier", 9), justify=LEFT,
+                          anchor=W, bg="white", fg="#2c3e50", padx=20, pady=15)
+    metrics_label.pack(fill=BOTH, expand=True)
+    
+    def refresh():
+        if not status_win.winfo_exists():
+            return
+        try:
+            metrics_label.config(text="\n".join(format_monitor_metrics(client.metrics())))
+        except Exception as e:
+            log_error(f"Failed to load monitor metrics: {e}")
+            metrics_label.config(text="Monitor metrics are not available")
+        status_win.after(refresh_ms, refresh)
+    
+    Button(status_win, text="Close", command=status_win.destroy,
+           font=("Segoe UI", 10), bg="#6c757d", fg="white", 
+           relief="flat", padx=20, pady=5).pack(pady=10)
+    
+    refresh()
+
 def show_master_keys_window(parent, email):
     """Show master keys window"""
     try:
@@ -0,0 +1,110 @@
+"""
+Single-instance module for AppLocker
+An OS-level lock file per role (GUI, service) so a second launch never
+starts duplicate monitors or writers. A second GUI launch forwards its
+intent to the running one over IPC and exits.
+"""
+
+import os
+import sys
+import threading
+from app.logging import log_event, log_error
+from app.config import DATA_DIR
+from app.ipc import IPCServer, request, default_address, ServiceUnavailable, ServiceError
+
+if sys.platform.startswith("win"):
+    import msvcrt
+else:
+    import fcntl
+
+class InstanceLock:
+    """Non-blocking exclusive lock, released by the OS if the process dies"""
+
+    def __init__(self, name):
+        self.path = DATA_DIR / f"{name}.lock"
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def acquire(self):
+        if self._file is not None:
+            return True
+        file = open(self.path, "a+")
+        try:
+            if sys.platform.startswith("win"):
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+
+        # Owner pid, for humans debugging a stuck lock
+        file.seek(0)
+        file.truncate()
+        file.write(str(os.getpid()))
+        file.flush()
+        self._file = file
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if sys.platform.startswith("win"):
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        except OSError as e:
+            log_error(f"Failed to release instance lock {self.path}: {e}")
+        finally:
+            self._file.close()
+            self._file = None
+
+# Global instance locks
+gui_instance = InstanceLock("gui")
+service_instance = InstanceLock("service")
+
+# Set when another launch asks the running GUI to come to the front
+show_requested = threading.Event()
+_gui_listener = None
+
+def _request_show():
+    show_requested.set()
+    return True
+
+def claim_gui_instance():
+    """Become the single GUI instance; False if one is already running"""
+    global _gui_listener
+    if not gui_instance.acquire():
+        return False
+    try:
+        _gui_listener = IPCServer({"show": _request_show}, default_address("gui"))
+        _gui_listener.start()
+    except Exception as e:
+        # Still the only instance, just not reachable by later launches
+        log_error(f"Failed to start GUI hand-off listener: {e}")
+        _gui_listener = None
+    return True
+
+def release_gui_instance():
+    """Give up the GUI role, e.g. before starting a fresh copy"""
+    global _gui_listener
+    if _gui_listener is not None:
+        _gui_listener.stop()
+        _gui_listener = None
+    gui_instance.release()
+
+def notify_running_gui(intent="show"):
+    """Forward a launch intent to the running GUI"""
+    try:
+        request(intent, address=default_address("gui"), timeout=2)
+        log_event(f"Forwarded '{intent}' to the running AppLocker window")
+        return True
+    except (ServiceUnavailable, ServiceError) as e:
+        log_error(f"Could not reach the running AppLocker window: {e}")
+        return False
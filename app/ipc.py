@@ -0,0 +1,196 @@
+"""
+Local IPC module for AppLocker
+Request/response channel between the service and its GUI/CLI clients over
+a Unix domain socket (a named pipe on Windows). Each message is one compact
+JSON object; connections are authenticated with a per-install key. The
+handshake runs on the connection's own thread with a deadline, so a client
+that stalls mid-handshake cannot hold up the others.
+"""
+
+import getpass
+import json
+import os
+import secrets
+import sys
+import tempfile
+import threading
+from multiprocessing.connection import Listener, Client, deliver_challenge, answer_challenge
+from app.logging import log_event, log_error, log_repeated_error
+from app.config import DATA_DIR, IPC_KEY_FILE
+
+class ServiceUnavailable(ConnectionError):
+    """Raised when no AppLocker service is listening"""
+
+class ServiceError(RuntimeError):
+    """Raised when the service rejects a request"""
+
+# Seconds the service waits for a client to complete the authkey handshake
+HANDSHAKE_TIMEOUT = 2
+
+class _Deadline:
+    """Connection wrapper whose reads give up after a timeout, for the handshake"""
+
+    def __init__(self, conn, timeout):
+        self._conn = conn
+        self._timeout = timeout
+
+    def send_bytes(self, data):
+        self._conn.send_bytes(data)
+
+    def recv_bytes(self, maxlength=None):
+        if not self._conn.poll(self._timeout):
+            raise TimeoutError(f"No handshake reply within {self._timeout}s")
+        return self._conn.recv_bytes(maxlength)
+
+def default_address(name="service"):
+    """Named pipe on Windows, Unix socket in the data directory elsewhere"""
+    if sys.platform.startswith("win"):
+        return rf"\\.\pipe\AppLocker-{getpass.getuser()}-{name}"
+    address = str(DATA_DIR / f"applocker-{name}.sock")
+    if len(address) > 100:
+        # Unix socket paths are limited to ~108 bytes
+        address = os.path.join(tempfile.gettempdir(), f"applocker-{os.getuid()}-{name}.sock")
+    return address
+
+def _family(address):
+    return "AF_PIPE" if address.startswith("\\\\") else "AF_UNIX"
+
+def load_auth_key(create=False, key_file=IPC_KEY_FILE):
+    """Read the shared IPC key, creating it (owner-only) if asked"""
+    try:
+        with open(key_file, "rb") as file:
+            return file.read()
+    except FileNotFoundError:
+        if not create:
+            raise ServiceUnavailable("IPC key not found; is the service running?")
+
+    key = secrets.token_bytes(32)
+    fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as file:
+        file.write(key)
+    return key
+
+def _encode(message):
+    return json.dumps(message, separators=(",", ":"), default=str).encode("utf-8")
+
+def request(command, address=None, timeout=5, key_file=IPC_KEY_FILE, **args):
+    """Send one command to the service and return its result"""
+    address = address or default_address()
+    authkey = load_auth_key(key_file=key_file)
+    try:
+        conn = Client(address, family=_family(address))
+    except (FileNotFoundError, ConnectionRefusedError, OSError) as e:
+        raise ServiceUnavailable(str(e)) from e
+
+    try:
+        # Same handshake as Client(authkey=...), but bounded by timeout
+        answer_challenge(_Deadline(conn, timeout), authkey)
+        deliver_challenge(_Deadline(conn, timeout), authkey)
+    except Exception as e:
+        conn.close()
+        raise ServiceUnavailable(f"Handshake with the service failed: {e}") from e
+
+    try:
+        conn.send_bytes(_encode({"command": command, "args": args}))
+        if not conn.poll(timeout):
+            raise ServiceUnavailable(f"No reply to '{command}' within {timeout}s")
+        reply = json.loads(conn.recv_bytes())
+    except (EOFError, OSError) as e:
+        raise ServiceUnavailable(str(e)) from e
+    finally:
+        conn.close()
+
+    if not reply.get("ok"):
+        raise ServiceError(reply.get("error", "Unknown error"))
+    return reply.get("result")
+
+def is_service_running(address=None, key_file=IPC_KEY_FILE):
+    try:
+        request("ping", address=address, timeout=1, key_file=key_file)
+        return True
+    except (ServiceUnavailable, ServiceError):
+        return False
+
+class IPCServer:
+    """Serve {command: handler(**args)} on a local socket or pipe"""
+
+    def __init__(self, handlers, address=None, key_file=IPC_KEY_FILE):
+        self.handlers = handlers
+        self.address = address or default_address()
+        self.key_file = key_file
+        self._listener = None
+        self._authkey = None
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        family = _family(self.address)
+        if family == "AF_UNIX" and os.path.exists(self.address):
+            # A socket file left behind by a crashed service
+            if is_service_running(self.address, self.key_file):
+                raise RuntimeError("Another AppLocker service is already listening")
+            os.unlink(self.address)
+
+        # No authkey here: Listener.accept() would run the handshake on the accept thread
+        self._authkey = load_auth_key(create=True, key_file=self.key_file)
+        self._listener = Listener(self.address, family=family)
+        if family == "AF_UNIX":
+            os.chmod(self.address, 0o600)
+        self._running = True
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+        log_event(f"IPC server listening on {self.address}")
+
+    def stop(self):
+        self._running = False
+        if self._listener is not None:
+            try:
+                # Wake the accept loop so it can exit
+                Client(self.address, family=_family(self.address)).close()
+            except Exception:
+                pass
+            self._listener.close()
+            self._listener = None
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if self._running:
+                    log_error(f"IPC accept failed: {e}")
+                continue
+            if not self._running:
+                conn.close()
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            deliver_challenge(_Deadline(conn, HANDSHAKE_TIMEOUT), self._authkey)
+            answer_challenge(_Deadline(conn, HANDSHAKE_TIMEOUT), self._authkey)
+        except Exception as e:
+            log_repeated_error("IPC handshake failed", error=e)
+            conn.close()
+            return
+        try:
+            while True:
+                try:
+                    message = json.loads(conn.recv_bytes())
+                except EOFError:
+                    return
+                conn.send_bytes(_encode(self._dispatch(message)))
+        except Exception as e:
+            log_error(f"IPC connection error: {e}")
+        finally:
+            conn.close()
+
+    def _dispatch(self, message):
+        handler = self.handlers.get(message.get("command"))
+        if handler is None:
+            return {"ok": False, "error": f"Unknown command: {message.get('command')}"}
+        try:
+            return {"ok": True, "result": handler(**message.get("args", {}))}
+        except Exception as e:
+            log_error(f"IPC command '{message.get('command')}' failed: {e}")
+            return {"ok": False, "error": str(e)}
@@ -0,0 +1,248 @@
+"""
+Locked apps storage module for AppLocker
+Single reader/writer of LOCKED_APPS_FILE, cached in memory and re-read
+only when the file changes on disk (e.g. written by another process).
+An entry is either a plain bool or {"locked": bool, "schedule": [...],
+"rules": [...], "action": str, "relock_at": float} for locks that only
+apply during their time windows, that match processes by policy rules
+(see app/policy.py), that override the enforcement action (see
+app/enforcement.py) or that are unlocked until relock_at (epoch seconds).
+The deadline is stored here so a restarted service still re-locks.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from app.logging import log_error
+from app.config import LOCKED_APPS_FILE, ENFORCEMENT_ACTIONS, ENFORCEMENT_MODE
+from app.schedule import Schedule, ScheduleError
+from app.metrics import metrics, sample
+
+def _entry_locked(entry):
+    if isinstance(entry, dict):
+        return bool(entry.get("locked", True))
+    return bool(entry)
+
+class LockStore:
+    def __init__(self, path=LOCKED_APPS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._apps = {}
+        self._schedules = {}  # app_name -> compiled Schedule
+        self._active = None  # Cached locked_apps() result
+        self._active_since = None  # Time it was computed for
+        self._active_until = None  # Next schedule transition, None = no expiry
+        self.version = 0  # Bumped whenever the entries change
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _refresh(self):
+        """Reload the file if it changed; caller must hold the lock"""
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        self._stamp = stamp
+        if stamp is None:
+            self._apps = {}  # Deleted, e.g. by a reset: nothing is locked any more
+        else:
+            try:
+                with open(self.path, "r", encoding="utf-8") as file:
+                    apps = json.load(file)
+                self._apps = apps if isinstance(apps, dict) else {}
+            except (FileNotFoundError, json.JSONDecodeError) as e:
+                log_error(f"Failed to read locked apps: {e}")
+                self._apps = {}
+        self._compile()
+
+    def _compile(self):
+        """Compile schedules and drop the cached active set"""
+        self._schedules = {}
+        for app, entry in self._apps.items():
+            if isinstance(entry, dict) and entry.get("schedule"):
+                try:
+                    self._schedules[app] = Schedule(entry["schedule"])
+                except ScheduleError as e:
+                    log_error(f"Ignoring invalid schedule for '{app}': {e}")
+        self._active = None
+        self.version += 1
+
+    def _write(self):
+        """Persist the cache; caller must hold the lock"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as file:
+            json.dump(self._apps, file, indent=2)
+        os.replace(tmp_file, self.path)
+        self._stamp = self._file_stamp()
+        self._compile()
+
+    def _is_active(self, app_name, now):
+        """Locked and, for scheduled locks, inside a window; caller must hold the lock"""
+        if not _entry_locked(self._apps.get(app_name, False)):
+            return False
+        schedule = self._schedules.get(app_name)
+        return schedule is None or schedule.is_active(now)
+
+    def all(self):
+        """Return {app_name: locked}, ignoring schedules"""
+        with self._lock:
+            self._refresh()
+            return {app: _entry_locked(entry) for app, entry in self._apps.items()}
+
+    def rules(self):
+        """Return {app_name: rules} for locks with policy rules"""
+        with self._lock:
+            self._refresh()
+            return {app: entry["rules"] for app, entry in self._apps.items()
+                    if isinstance(entry, dict) and entry.get("rules")}
+
+    def actions(self):
+        """Return {app_name: action} for locks with their own enforcement action"""
+        with self._lock:
+            self._refresh()
+            return {app: entry["action"] for app, entry in self._apps.items()
+                    if isinstance(entry, dict) and entry.get("action")}
+
+    def schedules(self):
+        """Return {app_name: windows} for scheduled locks"""
+        with self._lock:
+            self._refresh()
+            return {app: schedule.windows for app, schedule in self._schedules.items()}
+
+    def locked_apps(self, now=None):
+        """Names of apps that are locked right now, honouring schedules"""
+        with self._lock:
+            self._refresh()
+            now = now or datetime.now()
+            if (self._active is not None and self._active_since <= now
+                    and (self._active_until is None or now < self._active_until)):
+                return list(self._active)
+
+            # Recomputed only after a file change or a schedule transition
+            self._active = [app for app in self._apps if self._is_active(app, now)]
+            self._active_since = now
+            transitions = [s.next_transition(now) for s in self._schedules.values()]
+            transitions = [t for t in transitions if t is not None]
+            self._active_until = min(transitions) if transitions else None
+            return list(self._active)
+
+    def next_transition(self):
+        """When the scheduled locked set next changes (None if never)"""
+        self.locked_apps()
+        with self._lock:
+            return self._active_until
+
+    def is_locked(self, app_name, now=None):
+        with self._lock:
+            self._refresh()
+            return self._is_active(app_name, now or datetime.now())
+
+    def contains(self, app_name):
+        with self._lock:
+            self._refresh()
+            return app_name in self._apps
+
+    def set_locked(self, app_name, locked=True, schedule=None, rules=None, action=None, relock_at=None):
+        """Lock or unlock an app; for schedule/rules/action, [] or "" clears and None keeps the current value.
+        relock_at makes an unlock temporary (see relock_due); any other change clears it."""
+        # Validate before touching the file
+        if action and action not in ENFORCEMENT_ACTIONS:
+            raise ValueError(f"Unknown enforcement action '{action}'")
+        if schedule:
+            Schedule(schedule)
+        if rules:
+            from app.policy import validate_rules
+            validate_rules(rules)
+        with self._lock:
+            self._refresh()
+            entry = self._apps.get(app_name)
+            entry = dict(entry) if isinstance(entry, dict) else {}
+            entry["locked"] = locked
+            if relock_at and not locked:
+                entry["relock_at"] = relock_at
+            else:
+                entry.pop("relock_at", None)
+            for key, value in (("schedule", schedule), ("rules", rules), ("action", action)):
+                if value is not None:
+                    entry[key] = value
+                if not entry.get(key):
+                    entry.pop(key, None)
+            self._apps[app_name] = entry if len(entry) > 1 else locked
+            self._write()
+
+    def would_weaken(self, app_name, schedule=None, rules=None, action=None, remove=False):
+        """Whether set_locked(app_name, True, ...) or remove() would loosen a current lock"""
+        with self._lock:
+            self._refresh()
+            entry = self._apps.get(app_name, False)
+        if not _entry_locked(entry):
+            return False  # Nothing to weaken
+        if remove:
+            return True
+        entry = entry if isinstance(entry, dict) else {}
+        # [] makes the lock apply at all times, which only tightens it
+        if schedule and schedule != entry.get("schedule"):
+            return True
+        if rules is not None and rules != entry.get("rules", []):
+            return True
+        if action is not None:
+            current, new = entry.get("action") or ENFORCEMENT_MODE, action or ENFORCEMENT_MODE
+            if new != current and new != ENFORCEMENT_ACTIONS[0]:  # Anything but kill is gentler
+                return True
+        return False
+
+    def unlocks(self):
+        """Return {app_name: relock_at} for temporary unlocks"""
+        with self._lock:
+            self._refresh()
+            return {app: entry["relock_at"] for app, entry in self._apps.items()
+                    if isinstance(entry, dict) and entry.get("relock_at") and not _entry_locked(entry)}
+
+    def relock_due(self, now):
+        """Lock again every temporary unlock whose relock_at has passed; returns their names"""
+        with self._lock:
+            self._refresh()
+            due = [app for app, entry in self._apps.items()
+                   if isinstance(entry, dict) and entry.get("relock_at") and entry["relock_at"] <= now
+                   and not _entry_locked(entry)]
+            for app in due:
+                entry = dict(self._apps[app], locked=True)
+                del entry["relock_at"]
+                self._apps[app] = entry if len(entry) > 1 else True
+            if due:
+                self._write()
+            return due
+
+    def remove(self, app_name):
+        with self._lock:
+            self._refresh()
+            if self._apps.pop(app_name, None) is None:
+                return False
+            self._write()
+            return True
+
+# Global lock store instance
+lock_store = LockStore()
+
+def _collect_lock_metrics():
+    """Store and scheduler gauges, read from the store's caches"""
+    next_change = lock_store.next_transition()
+    managed = lock_store.all()
+    return {
+        "lock_store_apps": sample("gauge", "Apps with a lock entry", len(managed)),
+        "lock_store_locked_apps": sample("gauge", "Apps locked right now, honouring schedules",
+                                         len(lock_store.locked_apps())),
+        "lock_store_rule_locks": sample("gauge", "Locks matched by policy rules", len(lock_store.rules())),
+        "schedule_locks": sample("gauge", "Locks with time windows", len(lock_store.schedules())),
+        "schedule_next_change_seconds": sample("gauge", "Seconds until the scheduled locked set changes (-1 if never)",
+                                               (next_change - datetime.now()).total_seconds() if next_change else -1)
+    }
+
+metrics.add_collector(_collect_lock_metrics)
@@ -1,44 +1,165 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
-from app.config import LOG_FILE, LOG_FORMAT, LOG_LEVEL, MAX_LOG_SIZE, BACKUP_COUNT
+import queue
+import threading
+import time
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from app.config import LOG_FILE, LOG_FORMAT, LOG_LEVEL, MAX_LOG_SIZE, BACKUP_COUNT, LOG_QUEUE_SIZE, LOG_DEDUP_WINDOW
+
+# Background listener that owns the file and console handlers
+_listener = None
+_queue_handler = None
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that never blocks the caller; drops records when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1  # Handler.handle() holds self.lock around this
 
 # Set up logging configuration with rotation
 def setup_logging():
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
     # Create formatter
     formatter = logging.Formatter(LOG_FORMAT)
-    
+
     # Create rotating file handler
     file_handler = RotatingFileHandler(
-        LOG_FILE, 
-        maxBytes=MAX_LOG_SIZE, 
+        LOG_FILE,
+        maxBytes=MAX_LOG_SIZE,
         backupCount=BACKUP_COUNT,
         encoding='utf-8'
     )
     file_handler.setFormatter(formatter)
-    
+
     # Create console handler for development
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    
+
+    # Callers only enqueue; the listener thread formats and writes to disk
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    # QueueHandler.prepare renders the message with this; LOG_FORMAT is applied on the listener thread
+    _queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
     # Configure root logger
     logging.basicConfig(
         level=getattr(logging, LOG_LEVEL.upper()),
-        handlers=[file_handler, console_handler],
+        handlers=[_queue_handler],
         format=LOG_FORMAT
     )
 
+# Flush queued records and stop the listener thread
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        if _queue_handler is not None:
+            logging.getLogger().removeHandler(_queue_handler)
+
+# Get the number of log records dropped because the queue was full
+def get_dropped_log_count():
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+# Render structured fields as key=value pairs after the message
+def _format_fields(message, fields):
+    if not fields:
+        return message
+    parts = []
+    for key, value in fields.items():
+        value = str(value)
+        if not value or ' ' in value or '=' in value:
+            value = '"' + value.replace('"', '\\"') + '"'
+        parts.append(f"{key}={value}")
+    return f"{message} {' '.join(parts)}"
+
 # Log an event
-def log_event(message):
-    logging.info(message)
+def log_event(message, **fields):
+    logging.info(_format_fields(message, fields), extra={"fields": fields})
 
 # Log an error
-def log_error(message):
-    logging.error(message)
+def log_error(message, **fields):
+    logging.error(_format_fields(message, fields), extra={"fields": fields})
 
 # Log a warning
-def log_warning(message):
-    logging.warning(message)
+def log_warning(message, **fields):
+    logging.warning(_format_fields(message, fields), extra={"fields": fields})
 
 # Log debug information
-def log_debug(message):
-    logging.debug(message)
+def log_debug(message, **fields):
+    logging.debug(_format_fields(message, fields), extra={"fields": fields})
+
+class EventAggregator:
+    """Collapse repeated events with the same (template, app) key into one summary per window"""
+
+    def __init__(self, window_seconds=LOG_DEDUP_WINDOW):
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._windows = {}  # (template, app) -> [window_start, suppressed, level, fields]
+
+    def log(self, template, app=None, level=logging.INFO, **fields):
+        """Log the first occurrence now; count repeats until the window closes"""
+        key = (template, app)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None and now - window[0] < self.window_seconds:
+                window[1] += 1
+                window[3] = fields
+                return
+            self._windows[key] = [now, 0, level, fields]
+        if window is not None:
+            self._emit_summary(key, window, now)
+        self._emit(level, template, app, fields)
+
+    def flush(self, force=False):
+        """Emit summaries for windows that have closed (or all windows if force)"""
+        now = time.monotonic()
+        with self._lock:
+            closed = [(key, window) for key, window in self._windows.items()
+                      if force or now - window[0] >= self.window_seconds]
+            for key, _ in closed:
+                del self._windows[key]
+        for key, window in closed:
+            self._emit_summary(key, window, now)
+
+    def _emit_summary(self, key, window, now):
+        window_start, suppressed, level, fields = window
+        if suppressed:
+            template, app = key
+            self._emit(level, f"{template} (repeated {suppressed} more times)", app,
+                       dict(fields, window_seconds=round(now - window_start)))
+
+    def _emit(self, level, message, app, fields):
+        if app is not None:
+            fields = {"app": app, **fields}
+            fields["app"] = app  # The argument wins over a field of the same name
+        logging.log(level, _format_fields(message, fields), extra={"fields": fields})
+
+# Shared aggregator for high-frequency monitor events
+event_aggregator = EventAggregator()
+
+# Log an event that may repeat many times, e.g. once per detected process
+def log_repeated_event(template, app=None, **fields):
+    event_aggregator.log(template, app, logging.INFO, **fields)
+
+# Log an error that may repeat many times
+def log_repeated_error(template, app=None, **fields):
+    event_aggregator.log(template, app, logging.ERROR, **fields)
+
+# Emit summaries for repeated events whose window has closed
+def flush_repeated_events(force=False):
+    event_aggregator.flush(force)
@@ -0,0 +1,283 @@
+"""
+Outbound mail module for AppLocker
+Queues messages on disk and delivers them from a background worker that
+keeps one authenticated SMTP session open between sends. Only the GUI
+sends mail; the queue file also carries delivery totals so the service
+can export them (see app/metrics_server.py).
+"""
+
+import json
+import os
+import smtplib
+import threading
+import time
+import uuid
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from app.logging import log_event, log_error
+from app.config import MAIL_QUEUE_FILE
+from app.email_config import EMAIL_CONFIG
+
+# Delivery states reported by get_status()
+STATUS_QUEUED = "queued"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+# How long finished messages stay queryable before they are pruned
+STATUS_RETENTION_SECONDS = 3600
+
+class MailQueue:
+    def __init__(self, queue_file=MAIL_QUEUE_FILE, settings=None):
+        self.queue_file = queue_file
+        self.settings = dict(EMAIL_CONFIG)
+        if settings:
+            self.settings.update(settings)
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._messages = {}
+        self._worker = None
+        self._running = False
+        self._server = None
+        self._last_used = 0.0
+        self.sessions_opened = 0
+        self.messages_sent = 0
+        self.messages_failed = 0
+        self._load()
+
+    def _load(self):
+        """Load messages left over from a previous run and resume delivering them"""
+        try:
+            with open(self.queue_file, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+
+        if isinstance(data, list):
+            messages, stats = data, {}  # Written before the file carried totals
+        else:
+            messages, stats = data.get("messages", []), data.get("stats", {})
+        self.messages_sent = stats.get("sent", 0)
+        self.messages_failed = stats.get("failed", 0)
+        self.sessions_opened = stats.get("sessions", 0)
+        now = time.time()
+        expired = 0
+        for message in messages:
+            # A message interrupted mid-send is retried
+            if message.get("status") == STATUS_SENDING:
+                message["status"] = STATUS_QUEUED
+            # An OTP that expired while the app was closed is not worth sending
+            expires = message.get("expires")
+            if message["status"] == STATUS_QUEUED and expires is not None and expires < now:
+                expired += 1
+                continue
+            self._messages[message["id"]] = message
+
+        if expired:
+            log_event(f"Dropped {expired} expired queued emails")
+        if any(m["status"] == STATUS_QUEUED for m in self._messages.values()):
+            self.start()
+
+    def _save(self):
+        """Persist the queue; caller must hold the lock"""
+        cutoff = time.time() - STATUS_RETENTION_SECONDS
+        for message_id in [m["id"] for m in self._messages.values()
+                           if m["status"] in (STATUS_SENT, STATUS_FAILED) and m["updated"] < cutoff]:
+            del self._messages[message_id]
+
+        try:
+            os.makedirs(os.path.dirname(self.queue_file), exist_ok=True)
+            tmp_file = f"{self.queue_file}.tmp"
+            stats = {
+                "pending": sum(1 for m in self._messages.values() if m["status"] in (STATUS_QUEUED, STATUS_SENDING)),
+                "sent": self.messages_sent,
+                "failed": self.messages_failed,
+                "sessions": self.sessions_opened
+            }
+            with open(tmp_file, "w", encoding="utf-8") as file:
+                json.dump({"messages": list(self._messages.values()), "stats": stats}, file, indent=2)
+            os.replace(tmp_file, self.queue_file)
+        except OSError as e:
+            log_error(f"Failed to save mail queue: {e}")
+
+    def enqueue(self, to_address, subject, body, expires=None):
+        """Queue a plain-text message and return its id"""
+        return self.enqueue_many([(to_address, subject, body)], expires)[0]
+
+    def enqueue_many(self, messages, expires=None):
+        """Queue several (to, subject, body) messages; they share one SMTP session.
+
+        expires is when the content (e.g. an OTP) stops being useful; such
+        messages are dropped instead of sent after a restart past that time.
+        """
+        now = time.time()
+        message_ids = []
+        with self._wakeup:
+            for to_address, subject, body in messages:
+                message_id = uuid.uuid4().hex
+                self._messages[message_id] = {
+                    "id": message_id,
+                    "to": to_address,
+                    "subject": subject,
+                    "body": body,
+                    "status": STATUS_QUEUED,
+                    "attempts": 0,
+                    "next_attempt": now,
+                    "expires": expires,
+                    "error": None,
+                    "updated": now
+                }
+                message_ids.append(message_id)
+            self._save()
+            self._wakeup.notify()
+        self.start()
+        return message_ids
+
+    def get_status(self, message_id):
+        """Return delivery status for a message, or None if unknown"""
+        with self._lock:
+            message = self._messages.get(message_id)
+            if message is None:
+                return None
+            return {
+                "status": message["status"],
+                "attempts": message["attempts"],
+                "error": message["error"]
+            }
+
+    def pending_count(self):
+        with self._lock:
+            return sum(1 for m in self._messages.values() if m["status"] == STATUS_QUEUED)
+
+    def start(self):
+        """Start the delivery worker if it is not running"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+
+    def stop(self, timeout=5):
+        """Stop the worker and close the SMTP session"""
+        with self._wakeup:
+            self._running = False
+            self._wakeup.notify()
+        if self._worker:
+            self._worker.join(timeout=timeout)
+        self._close_connection()
+
+    def _run(self):
+        """Deliver due messages, sleeping until the next retry is due"""
+        while True:
+            with self._wakeup:
+                if not self._running:
+                    return
+                now = time.time()
+                due = [m for m in self._messages.values()
+                       if m["status"] == STATUS_QUEUED and m["next_attempt"] <= now]
+                if not due:
+                    waits = [m["next_attempt"] - now for m in self._messages.values()
+                             if m["status"] == STATUS_QUEUED]
+                    if self._server is not None:
+                        waits.append(self._last_used + self.settings["SMTP_IDLE_TIMEOUT"] - now)
+                    self._wakeup.wait(max(0.05, min(waits)) if waits else None)
+                    due_idle = self._server is not None and \
+                        time.time() - self._last_used >= self.settings["SMTP_IDLE_TIMEOUT"]
+                else:
+                    for message in due:
+                        message["status"] = STATUS_SENDING
+                    due_idle = False
+
+            if due_idle:
+                self._close_connection()
+            for message in due:
+                self._deliver(message)
+
+    def _build_message(self, message):
+        msg = MIMEMultipart()
+        msg['From'] = self.settings["EMAIL_FROM"]
+        msg['To'] = message["to"]
+        msg['Subject'] = message["subject"]
+        msg.attach(MIMEText(message["body"], 'plain'))
+        return msg.as_string()
+
+    def _connection(self):
+        """Return the pooled SMTP session, opening a new one if needed"""
+        if self._server is not None and \
+                time.time() - self._last_used >= self.settings["SMTP_IDLE_TIMEOUT"]:
+            self._close_connection()
+
+        if self._server is None:
+            server = smtplib.SMTP(self.settings["SMTP_SERVER"], self.settings["SMTP_PORT"],
+                                  timeout=self.settings["SMTP_TIMEOUT"])
+            try:
+                if self.settings["SMTP_USE_TLS"]:
+                    server.starttls()
+                if self.settings["EMAIL_PASSWORD"]:
+                    server.login(self.settings["EMAIL_FROM"], self.settings["EMAIL_PASSWORD"])
+            except Exception:
+                server.close()
+                raise
+            self._server = server
+            self.sessions_opened += 1
+        return self._server
+
+    def _close_connection(self):
+        server, self._server = self._server, None
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                server.close()
+
+    def _deliver(self, message):
+        """Send one message, reconnecting once if the pooled session went stale"""
+        error = None
+        permanent = False
+        for _ in range(2):
+            try:
+                server = self._connection()
+                server.sendmail(self.settings["EMAIL_FROM"], [message["to"]],
+                                self._build_message(message))
+                self._last_used = time.time()
+                error = None
+                break
+            except smtplib.SMTPServerDisconnected as e:
+                self._close_connection()
+                error = e
+            except smtplib.SMTPRecipientsRefused as e:
+                error, permanent = e, True
+                break
+            except Exception as e:
+                self._close_connection()
+                error = e
+                break
+
+        with self._lock:
+            message["attempts"] += 1
+            message["updated"] = time.time()
+            if error is None:
+                message["status"] = STATUS_SENT
+                message["error"] = None
+                message["body"] = ""  # Do not keep OTPs on disk after delivery
+                self.messages_sent += 1
+                log_event(f"Email delivered to {message['to']}")
+            elif permanent or message["attempts"] >= self.settings["MAX_SEND_ATTEMPTS"]:
+                message["status"] = STATUS_FAILED
+                message["error"] = str(error)
+                message["body"] = ""
+                self.messages_failed += 1
+                log_error(f"Giving up on email to {message['to']}: {error}")
+            else:
+                delay = min(self.settings["RETRY_BASE_SECONDS"] * 2 ** (message["attempts"] - 1),
+                            self.settings["RETRY_MAX_SECONDS"])
+                message["status"] = STATUS_QUEUED
+                message["error"] = str(error)
+                message["next_attempt"] = time.time() + delay
+                log_error(f"Email to {message['to']} failed, retrying in {delay}s: {error}")
+            self._save()
+
+# Global mail queue instance
+mail_queue = MailQueue()
@@ -0,0 +1,165 @@
+"""
+Metrics module for AppLocker
+A small in-process registry of counters, gauges and fixed-bucket
+histograms. Recording is a dict lookup plus an add (a bisect for
+histograms), so the monitor can record every tick. snapshot() returns
+plain dicts that travel over IPC and are rendered by the CLI, the GUI
+and the Prometheus endpoint (see app/metrics_server.py). Stores that
+already keep their own totals add a collector instead of recording.
+"""
+
+import threading
+from bisect import bisect_left
+from app.config import ENFORCEMENT_ACTIONS
+
+# Default histogram buckets in seconds, 1 ms to 10 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text=""):
+        self.name = name
+        self.help = help_text
+        self._values = {}  # label tuple -> value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def snapshot(self):
+        return {"type": self.kind, "help": self.help,
+                "values": [{"labels": dict(key), "value": value} for key, value in self._values.items()]}
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self._values[_label_key(labels)] = value
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text="", buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        return {"type": self.kind, "help": self.help, "buckets": list(self.buckets),
+                "counts": list(self._counts), "count": self.count, "sum": self.sum}
+
+def sample(kind, help_text, value, **labels):
+    """Snapshot of a single counter/gauge value, for collectors"""
+    return {"type": kind, "help": help_text, "values": [{"labels": labels, "value": value}]}
+
+def histogram_quantile(snapshot, q):
+    """Upper bound of the bucket holding quantile q of a histogram snapshot (None if empty)"""
+    if not snapshot["count"]:
+        return None
+    rank = q * snapshot["count"]
+    seen = 0
+    for bound, count in zip(snapshot["buckets"] + [float("inf")], snapshot["counts"]):
+        seen += count
+        if seen >= rank:
+            return bound
+    return float("inf")
+
+def metric_value(snapshot, name, **labels):
+    """Sum of a counter/gauge's values in a snapshot matching labels"""
+    metric = snapshot.get(name)
+    if not metric:
+        return 0
+    return sum(v["value"] for v in metric["values"] if all(v["labels"].get(k) == x for k, x in labels.items()))
+
+def _format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    if seconds == float("inf"):
+        return "slow"
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:g}s"
+
+def format_monitor_metrics(snapshot):
+    """One-line summaries of a metrics snapshot, for the CLI and GUI"""
+    scan = snapshot.get("monitor_scan_seconds")
+    exits = snapshot.get("process_exit_seconds")
+    lines = [
+        f"Scans: {metric_value(snapshot, 'monitor_ticks_total')} "
+        f"({metric_value(snapshot, 'monitor_errors_total')} failed, "
+        f"{metric_value(snapshot, 'monitor_tick_overruns_total')} over budget), "
+        f"p50 {_format_seconds(scan and histogram_quantile(scan, 0.5))}, "
+        f"p95 {_format_seconds(scan and histogram_quantile(scan, 0.95))}",
+        f"Processes: {metric_value(snapshot, 'monitor_processes')} running, "
+        f"{metric_value(snapshot, 'monitor_decisions_total')} judged, "
+        f"{metric_value(snapshot, 'monitor_matches_total')} matched",
+        "Actions: " + ", ".join(f"{action} {metric_value(snapshot, 'monitor_enforcement_actions_total', action=action)}"
+                                for action in ENFORCEMENT_ACTIONS)
+        + f", rate-limited {metric_value(snapshot, 'enforcement_rate_limited_total')}",
+        f"Exits: {exits['count'] if exits else 0} confirmed, "
+        f"p95 {_format_seconds(exits and histogram_quantile(exits, 0.95))} after the signal, "
+        f"{metric_value(snapshot, 'process_stragglers_total')} needed SIGKILL",
+        f"Watchdog: {metric_value(snapshot, 'monitor_restarts_total')} restarts, "
+        f"{metric_value(snapshot, 'monitor_downtime_seconds_total'):.0f}s without protection, "
+        f"last heartbeat {metric_value(snapshot, 'monitor_heartbeat_age_seconds'):.0f}s ago",
+        f"Dropped log records: {metric_value(snapshot, 'monitor_dropped_log_records')}"
+    ]
+    return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}  # name -> metric
+        self._collectors = []  # callables returning {name: snapshot}
+
+    def _get(self, cls, name, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args)
+            elif type(metric) is not cls:
+                raise ValueError(f"Metric '{name}' is already a {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text=""):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text=""):
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text="", buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets)
+
+    def add_collector(self, collector):
+        """Register a callable returning {name: snapshot}, run on every snapshot()"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def snapshot(self):
+        """{name: metric snapshot} for every registered metric and collector"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        snapshot = {metric.name: metric.snapshot() for metric in metrics}
+        for collector in collectors:
+            try:
+                snapshot.update(collector())
+            except Exception:
+                continue  # A broken collector must not take the others down
+        return snapshot
+
+# Global registry shared by the monitor, the enforcer and the exit watcher
+metrics = MetricsRegistry()
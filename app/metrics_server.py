@@ -0,0 +1,184 @@
+"""
+Metrics endpoint module for AppLocker
+Optional HTTP endpoint serving the metrics registry in Prometheus text
+format, for watching enforcement health across machines. Stdlib only;
+binds to a loopback address or a Unix socket, never a public interface.
+Scrapes render the registry's pre-aggregated values, so they never wait
+on the monitor loop. Mail is queued and sent by the GUI process, so mail
+metrics are read from the totals it persists in MAIL_QUEUE_FILE.
+"""
+
+import json
+import math
+import os
+import socket
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.logging import log_event, log_error
+from app.config import METRICS_ADDRESS, MAIL_QUEUE_FILE
+from app.metrics import metrics, sample
+
+METRICS_ENV_VAR = "APPLOCKER_METRICS"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LOOPBACK_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())) + "}"
+
+def _number(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+# (mtime_ns, size) of MAIL_QUEUE_FILE and the totals read from it
+_mail_stats = [None, {}]
+
+def _collect_mail_metrics(queue_file=MAIL_QUEUE_FILE):
+    """Mail queue totals written by the GUI's mail queue; re-read only when the file changes"""
+    try:
+        stat = os.stat(queue_file)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        stamp = None
+    if stamp != _mail_stats[0]:
+        stats = {}
+        if stamp is not None:
+            try:
+                with open(queue_file, "r", encoding="utf-8") as file:
+                    data = json.load(file)
+                stats = data.get("stats", {}) if isinstance(data, dict) else {}
+            except (OSError, json.JSONDecodeError):
+                pass
+        _mail_stats[:] = [stamp, stats]
+    stats = _mail_stats[1]
+    return {
+        "mail_queue_pending": sample("gauge", "Messages waiting to be sent", stats.get("pending", 0)),
+        "mail_messages_sent_total": sample("counter", "Messages delivered", stats.get("sent", 0)),
+        "mail_messages_failed_total": sample("counter", "Messages given up on", stats.get("failed", 0)),
+        "mail_smtp_sessions_total": sample("counter", "SMTP sessions opened", stats.get("sessions", 0))
+    }
+
+metrics.add_collector(_collect_mail_metrics)
+
+def render_prometheus(snapshot):
+    """Prometheus text exposition of a registry snapshot"""
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        if metric.get("help"):
+            lines.append(f"# HELP {name} {_escape(metric['help'])}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        if metric["type"] == "histogram":
+            cumulative = 0
+            for bound, count in zip(metric["buckets"] + [float("inf")], metric["counts"]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{le="{_number(float(bound))}"}} {cumulative}')
+            lines.append(f"{name}_sum {_number(metric['sum'])}")
+            lines.append(f"{name}_count {metric['count']}")
+        else:
+            for value in metric["values"]:
+                lines.append(f"{name}{_labels(value['labels'])} {_number(value['value'])}")
+    return "\n".join(lines) + "\n"
+
+def parse_address(address):
+    """("tcp", host, port) or ("unix", path, None) from "127.0.0.1:9464" / "unix:/path" """
+    if address.startswith("unix:"):
+        return "unix", address[5:], None
+    host, _, port = address.rpartition(":")
+    host = host.strip("[]") or "127.0.0.1"
+    if host not in LOOPBACK_HOSTS:
+        raise ValueError(f"Metrics endpoint must bind to localhost, not '{host}'")
+    return "tcp", host, int(port)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_prometheus(self.server.registry.snapshot()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the log
+
+class _HTTP6Server(ThreadingHTTPServer):
+    address_family = socket.AF_INET6
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        def server_bind(self):
+            socketserver.UnixStreamServer.server_bind(self)
+            self.server_name, self.server_port = "localhost", 0
+else:
+    _UnixHTTPServer = type(None)  # No Unix sockets on this platform
+
+class MetricsServer:
+    def __init__(self, address, registry=metrics):
+        self.address = address
+        self.registry = registry
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        kind, host, port = parse_address(self.address)
+        if kind == "unix":
+            if _UnixHTTPServer is type(None):
+                raise ValueError("Unix sockets are not supported on this platform")
+            if os.path.exists(host):
+                os.unlink(host)  # Left over from a crash
+            self._server = _UnixHTTPServer(host, _MetricsHandler)
+            os.chmod(host, 0o600)
+        else:
+            server_class = _HTTP6Server if ":" in host else ThreadingHTTPServer
+            self._server = server_class((host, port), _MetricsHandler)
+        self._server.registry = self.registry
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="MetricsServer")
+        self._thread.start()
+        log_event(f"Metrics endpoint listening on {self.url}")
+
+    @property
+    def url(self):
+        if isinstance(self._server, _UnixHTTPServer):
+            return f"unix:{self._server.server_address}"
+        host, port = self._server.server_address[:2]
+        return f"http://{'[' + host + ']' if ':' in host else host}:{port}/metrics"
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        if isinstance(self._server, _UnixHTTPServer) and os.path.exists(self._server.server_address):
+            os.unlink(self._server.server_address)
+        self._server = None
+
+def start_metrics_server(address=None):
+    """Start the endpoint if configured (METRICS_ADDRESS or APPLOCKER_METRICS); returns it or None"""
+    address = address or os.environ.get(METRICS_ENV_VAR) or METRICS_ADDRESS
+    if not address:
+        return None
+    server = MetricsServer(address)
+    try:
+        server.start()
+    except (OSError, ValueError) as e:
+        log_error(f"Metrics endpoint not started: {e}")
+        return None
+    return server
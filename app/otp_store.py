@@ -0,0 +1,165 @@
+"""
+Reset OTP storage module for AppLocker
+Keeps OTPs in memory with a min-heap of expiry times and persists
+changes to an append-only journal instead of rewriting a JSON file
+"""
+
+import heapq
+import hmac
+import json
+import os
+import threading
+import time
+from app.logging import log_event, log_error
+from app.config import OTP_FILE
+from app.email_config import SECURITY_CONFIG
+
+# Compact the journal once it holds this many records per live OTP
+COMPACT_RATIO = 4
+COMPACT_MIN_RECORDS = 256
+
+class OTPStore:
+    def __init__(self, journal_file=OTP_FILE, expiry_minutes=None, max_attempts=None):
+        self.journal_file = journal_file
+        self.expiry_seconds = (expiry_minutes or SECURITY_CONFIG["OTP_EXPIRY_MINUTES"]) * 60
+        self.max_attempts = max_attempts or SECURITY_CONFIG["MAX_OTP_ATTEMPTS"]
+
+        self._lock = threading.Lock()
+        self._entries = {}   # email -> {"otp", "expiry", "used", "attempts"}
+        self._expiries = []  # heap of (expiry, email)
+        self._journal = None
+        self._records = 0
+        self._load()
+
+    def _load(self):
+        """Rebuild state by replaying the journal"""
+        try:
+            with open(self.journal_file, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        self._apply(json.loads(line))
+                    except (json.JSONDecodeError, KeyError):
+                        continue  # Torn write at the end of the journal
+                    self._records += 1
+        except FileNotFoundError:
+            pass
+
+        now = time.time()
+        for email, entry in self._entries.items():
+            heapq.heappush(self._expiries, (entry["expiry"], email))
+        self._sweep(now)
+
+    def _apply(self, record):
+        op = record["op"]
+        email = record["email"]
+        if op == "set":
+            self._entries[email] = {"otp": record["otp"], "expiry": record["expiry"],
+                                    "used": record.get("used", False),
+                                    "attempts": record.get("attempts", 0)}
+        elif email in self._entries:
+            if op == "attempt":
+                self._entries[email]["attempts"] += 1
+            elif op == "used":
+                self._entries[email]["used"] = True
+            elif op == "delete":
+                del self._entries[email]
+
+    def _append(self, record):
+        """Append one change to the journal; caller must hold the lock"""
+        try:
+            if self._journal is None:
+                os.makedirs(os.path.dirname(self.journal_file), exist_ok=True)
+                self._journal = open(self.journal_file, "a", encoding="utf-8")
+            self._journal.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self._journal.flush()
+            self._records += 1
+        except OSError as e:
+            log_error(f"Failed to write OTP journal: {e}")
+            return
+
+        if self._records > max(COMPACT_MIN_RECORDS, COMPACT_RATIO * len(self._entries)):
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the journal with one record per live OTP"""
+        try:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            tmp_file = f"{self.journal_file}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as file:
+                for email, entry in self._entries.items():
+                    file.write(json.dumps(dict(entry, op="set", email=email), separators=(",", ":")) + "\n")
+            os.replace(tmp_file, self.journal_file)
+            self._records = len(self._entries)
+        except OSError as e:
+            log_error(f"Failed to compact OTP journal: {e}")
+
+    def _sweep(self, now):
+        """Drop expired OTPs in heap order; caller must hold the lock"""
+        removed = 0
+        while self._expiries and self._expiries[0][0] <= now:
+            expiry, email = heapq.heappop(self._expiries)
+            entry = self._entries.get(email)
+            # Skip heap items left behind when an OTP was replaced
+            if entry is not None and entry["expiry"] == expiry:
+                del self._entries[email]
+                removed += 1
+        return removed
+
+    def save(self, email, otp):
+        """Store a new OTP for email, replacing any previous one"""
+        expiry = time.time() + self.expiry_seconds
+        with self._lock:
+            self._entries[email] = {"otp": otp, "expiry": expiry, "used": False, "attempts": 0}
+            heapq.heappush(self._expiries, (expiry, email))
+            self._append({"op": "set", "email": email, "otp": otp, "expiry": expiry})
+        return expiry
+
+    def verify(self, email, entered_otp):
+        """Verify an OTP, counting failed attempts and marking it used on success"""
+        now = time.time()
+        with self._lock:
+            if self._expiries and self._expiries[0][0] <= now:
+                self._sweep(now)
+
+            entry = self._entries.get(email)
+            if entry is None:
+                log_error(f"No valid OTP found for {email}")
+                return False
+
+            if entry["used"]:
+                log_error(f"OTP already used for {email}")
+                return False
+
+            if entry["attempts"] >= self.max_attempts:
+                log_error(f"Too many OTP attempts for {email}")
+                return False
+
+            if not hmac.compare_digest(str(entered_otp).encode("utf-8"), entry["otp"].encode("utf-8")):
+                entry["attempts"] += 1
+                self._append({"op": "attempt", "email": email})
+                log_error(f"Invalid OTP for {email} (attempt {entry['attempts']} of {self.max_attempts})")
+                return False
+
+            entry["used"] = True
+            self._append({"op": "used", "email": email})
+
+        log_event(f"OTP verified successfully for {email}")
+        return True
+
+    def cleanup(self):
+        """Remove expired OTPs; returns how many were removed"""
+        with self._lock:
+            removed = self._sweep(time.time())
+            if removed:
+                self._compact()
+        if removed:
+            log_event(f"Cleaned up {removed} expired OTPs")
+        return removed
+
+    def __len__(self):
+        return len(self._entries)
+
+# Global OTP store instance
+otp_store = OTPStore()
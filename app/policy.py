@@ -0,0 +1,284 @@
+"""
+Lock policy module for AppLocker
+Compiles every locked app's rules into one decision structure: hash maps
+for exact process names, one combined regex per pattern kind, and the
+expensive checks (exe path, user, parent, command line) last. The
+monitor asks it once per new process.
+
+A rule is a dict of conditions that must all hold:
+    {"name": "steam(webhelper)?\\.exe"}        process name regex (full match)
+    {"exe": "C:/Games/*/steam.exe"}           executable path glob
+    {"name": "chrome\\.exe", "cmdline": "--profile-directory=Work"}
+                                              command line regex (search)
+    {"script": "C:/Games/*/launcher.jar"}     script/jar an interpreter runs (glob;
+                                              a bare file name matches in any folder)
+    {"hash": "9f86d081884c7d65..."}           SHA-256 of the executable (64 hex digits)
+    {"parent": "explorer.exe"}                parent process name
+    {"user": "alice"}                         owning user
+An app is matched when any of its rules holds. Apps without rules use
+the display-name matching AppLocker has always used.
+
+Processes are passed in as views with a lowercase `name` attribute and
+exe()/cmdline()/script()/sha256()/parent()/user() methods, so only the facts a
+rule actually needs are fetched (see ProcessView in app/process_manager.py).
+Exe globs indexed by file name are also checked against the executable's
+real file name, for processes that run under another name. Command lines
+are only read for processes named in INTERPRETER_NAMES (python, java,
+node, ...), unless a rule also pins the process name, so an editor opening
+a jar never matches a script rule. Executables are only hashed when a hash
+rule exists, and then once per binary version (see app/exe_identity.py).
+"""
+
+import fnmatch
+import re
+from app.logging import log_error
+from app.config import INTERPRETER_NAMES
+
+RULE_FIELDS = ("name", "exe", "cmdline", "script", "hash", "parent", "user")
+
+# Interpreter options whose value is the next argument
+_OPTIONS_WITH_VALUE = {"-cp", "-classpath", "--class-path", "-p", "--module-path", "-W", "-X", "-r", "--require"}
+
+# Exact executables for common apps whose display name does not contain them
+COMMON_EXECUTABLES = {
+    'chrome': 'chrome.exe',
+    'firefox': 'firefox.exe',
+    'notepad': 'notepad.exe',
+    'calculator': 'calc.exe',
+    'paint': 'mspaint.exe',
+    'steam': 'steam.exe',
+    'discord': 'discord.exe',
+    'spotify': 'spotify.exe',
+    'skype': 'skype.exe',
+    'zoom': 'zoom.exe'
+}
+
+_REGEX_META = set(".^$*+?{}[]|()\\")
+_GLOB_META = set("*?[")
+_SHA256 = re.compile(r"[0-9a-f]{64}")
+
+class PolicyError(ValueError):
+    """Raised for rules that cannot be compiled"""
+
+def normalize_path(path):
+    return path.replace("\\", "/").lower()
+
+def hosted_target(argv):
+    """Script, jar or module an interpreter command line runs ('' if none)"""
+    args = iter(argv[1:])
+    for arg in args:
+        if arg in ("-jar", "-m"):
+            return normalize_path(next(args, ""))
+        if arg in _OPTIONS_WITH_VALUE:
+            next(args, None)
+        elif arg == "-c":
+            return ""  # Inline code, nothing to match
+        elif not arg.startswith("-"):
+            return normalize_path(arg)
+    return ""
+
+def _literal_regex(pattern):
+    """The literal string a regex matches, or None if it is a real pattern"""
+    text = pattern.replace("\\.", "\0")
+    if any(char in _REGEX_META for char in text):
+        return None
+    return text.replace("\0", ".")
+
+class _Rule:
+    """One compiled rule; checks run cheapest first"""
+    __slots__ = ("app", "name", "exe", "cmdline", "script", "hash", "parent", "user", "cost")
+
+    def __init__(self, app, spec):
+        unknown = set(spec) - set(RULE_FIELDS)
+        if unknown or not spec:
+            raise PolicyError(f"Invalid rule for '{app}': {spec!r}")
+        self.app = app
+        try:
+            self.name = re.compile(spec["name"], re.IGNORECASE) if "name" in spec else None
+            self.cmdline = re.compile(spec["cmdline"], re.IGNORECASE) if "cmdline" in spec else None
+        except re.error as e:
+            raise PolicyError(f"Invalid pattern in rule for '{app}': {e}")
+        self.exe = re.compile(fnmatch.translate(normalize_path(spec["exe"]))) if "exe" in spec else None
+        self.script = None
+        if "script" in spec:
+            script = normalize_path(spec["script"])
+            pattern = fnmatch.translate(script)
+            # A bare file name matches the script wherever it lives; paths (C:/..., /opt/...) as written
+            self.script = re.compile(pattern if "/" in script else "(?s:.*/)?" + pattern)
+        self.hash = None
+        if "hash" in spec:
+            self.hash = str(spec["hash"]).strip().lower()
+            if not _SHA256.fullmatch(self.hash):
+                raise PolicyError(f"Invalid SHA-256 in rule for '{app}': {spec['hash']!r}")
+        self.parent = spec["parent"].lower() if "parent" in spec else None
+        self.user = spec["user"].lower() if "user" in spec else None
+        # Rough cost of the lazy lookups this rule forces
+        self.cost = ((self.exe is not None) + (self.user is not None) + 2 * (self.parent is not None)
+                     + 4 * (self.cmdline is not None or self.script is not None))
+
+    def matches(self, view):
+        if self.name is not None and not self.name.fullmatch(view.name):
+            return False
+        if self.exe is not None and not self.exe.match(view.exe()):
+            return False
+        if self.user is not None:
+            user = view.user()
+            if user != self.user and user.rpartition("\\")[2] != self.user:
+                return False
+        if self.parent is not None and view.parent() != self.parent:
+            return False
+        if self.cmdline is not None and not self.cmdline.search(view.cmdline()):
+            return False
+        if self.script is not None and not self.script.match(view.script()):
+            return False
+        if self.hash is not None and view.sha256() != self.hash:
+            return False
+        return True
+
+class _LegacyRule:
+    """Exact executable match for a display-name lock"""
+    __slots__ = ("app",)
+
+    def __init__(self, app):
+        self.app = app
+
+    def matches(self, view):
+        return True
+
+def validate_rules(rules):
+    """Raise PolicyError unless rules is a list of valid rule dicts"""
+    if not isinstance(rules, list):
+        raise PolicyError("Rules must be a list")
+    for spec in rules:
+        if not isinstance(spec, dict):
+            raise PolicyError(f"Invalid rule {spec!r}")
+        _Rule("rule", spec)
+
+def _combine(patterns):
+    """One alternation regex used as a prefilter, or None"""
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+
+class Policy:
+    """Decision structure for a set of locked apps"""
+
+    def __init__(self, locked_apps, rules=None, interpreters=INTERPRETER_NAMES):
+        rules = rules or {}
+        self.interpreters = interpreters
+        self.by_name = {}  # exact process name -> [rules]
+        self.by_basename = {}  # exe globs with a literal file name -> [rules]
+        self.name_rules = []  # name regexes behind one combined prefilter
+        self.exe_rules = []  # exe globs that need the full path
+        self.interpreter_rules = []  # cmdline/script rules, tried on interpreters only
+        self.by_hash = {}  # executable SHA-256 -> [rules], survives renamed binaries
+        self.generic_rules = []  # parent/user-only rules
+        self.legacy = []  # (app, words) for display-name matching
+        self.rule_count = 0
+
+        name_patterns, interpreter_patterns, legacy_words = [], [], set()
+        for app in locked_apps:
+            specs = rules.get(app)
+            if not specs:
+                self._add_legacy(app, legacy_words)
+                continue
+            for spec in specs:
+                try:
+                    rule = _Rule(app, spec)
+                except PolicyError as e:
+                    log_error(f"Skipping lock rule: {e}")
+                    continue
+                self.rule_count += 1
+                literal = _literal_regex(spec["name"]) if "name" in spec else None
+                basename = normalize_path(spec["exe"]).rpartition("/")[2] if "exe" in spec else None
+                if rule.hash is not None:
+                    self.by_hash.setdefault(rule.hash, []).append(rule)
+                elif literal is not None:
+                    self.by_name.setdefault(literal.lower(), []).append(rule)
+                elif basename and not _GLOB_META & set(basename):
+                    self.by_basename.setdefault(basename, []).append(rule)
+                elif rule.name is not None:
+                    self.name_rules.append(rule)
+                    name_patterns.append(spec["name"])
+                elif rule.exe is not None:
+                    self.exe_rules.append(rule)
+                elif rule.cmdline is not None or rule.script is not None:
+                    self.interpreter_rules.append(rule)
+                    interpreter_patterns.append(spec.get("cmdline"))
+                else:
+                    self.generic_rules.append(rule)
+
+        self.name_filter = _combine(name_patterns)
+        # Only usable when every interpreter rule has a command line pattern
+        self.cmdline_filter = None if None in interpreter_patterns else _combine(interpreter_patterns)
+        self.legacy_filter = _combine(sorted(map(re.escape, legacy_words), key=len, reverse=True))
+        self.exe_rules.sort(key=lambda rule: rule.cost)
+        self.interpreter_rules.sort(key=lambda rule: rule.cost)
+        self.generic_rules.sort(key=lambda rule: rule.cost)
+
+    def _add_legacy(self, app, legacy_words):
+        app_lower = app.lower()
+        words = [word for word in app_lower.split() if len(word) > 3]
+        self.legacy.append((app, words))
+        legacy_words.update(words)
+        for key, exe_name in COMMON_EXECUTABLES.items():
+            if key in app_lower:
+                self.by_name.setdefault(exe_name, []).append(_LegacyRule(app))
+
+    def decide(self, view):
+        """Return the locked app a process belongs to, or None"""
+        name = view.name
+        for rule in self.by_name.get(name, ()):
+            if rule.matches(view):
+                return rule.app
+        for rule in self.by_basename.get(name, ()):
+            if rule.matches(view):
+                return rule.app
+        if self.name_filter is not None and self.name_filter.fullmatch(name):
+            for rule in self.name_rules:
+                if rule.matches(view):
+                    return rule.app
+        if self.legacy_filter is not None and self.legacy_filter.search(name):
+            for app, words in self.legacy:
+                if any(word in name for word in words):
+                    return app
+        if name in self.interpreters:
+            app = self._decide_hosted(view)
+            if app is not None:
+                return app
+        for rule in self.exe_rules:
+            if rule.matches(view):
+                return rule.app
+        if self.by_basename:
+            # The process name may differ from the file name (truncated, renamed by the process)
+            basename = view.exe().rpartition("/")[2]
+            if basename != name:
+                for rule in self.by_basename.get(basename, ()):
+                    if rule.matches(view):
+                        return rule.app
+        for rule in self.generic_rules:
+            if rule.matches(view):
+                return rule.app
+        if self.by_hash:
+            for rule in self.by_hash.get(view.sha256(), ()):
+                if rule.matches(view):
+                    return rule.app
+        return None
+
+    def _decide_hosted(self, view):
+        """Match what an interpreter is running; only called for interpreter names"""
+        if self.legacy_filter is not None:
+            script = view.script()
+            basename = script.rpartition("/")[2]
+            if basename and self.legacy_filter.search(basename):
+                for app, words in self.legacy:
+                    if any(word in basename for word in words):
+                        return app
+        if not self.interpreter_rules:
+            return None
+        if self.cmdline_filter is not None and not self.cmdline_filter.search(view.cmdline()):
+            return None
+        for rule in self.interpreter_rules:
+            if rule.matches(view):
+                return rule.app
+        return None
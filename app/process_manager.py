@@ -1,116 +1,331 @@
 """
 Process management module for AppLocker
-Handles blocking and unblocking of applications
+Handles blocking and unblocking of applications and records what the
+monitor costs in the metrics registry (see get_monitor_metrics)
 """
 
 import subprocess
 import psutil
 import time
 import threading
-from app.logging import log_event, log_error
-from app.config import LOCKED_APPS_FILE
-import json
+from app.logging import (log_event, log_error, log_repeated_event, log_repeated_error, flush_repeated_events,
+                         get_dropped_log_count)
+from app.lock_store import lock_store
+from app.policy import Policy, normalize_path, hosted_target
+from app.exe_identity import exe_hashes
+from app.enforcement import enforcer, ACTION_SUSPEND, ACTION_THROTTLE
+from app.profiling import mark_startup, monitor_profile_seconds, MonitorProfiler
+from app.audit import record_audit_event, EVENT_BLOCK, EVENT_UNLOCK, EVENT_RELOCK
+from app.metrics import metrics
+from app.config import MONITOR_INTERVAL, MONITOR_TICK_BUDGET, MONITOR_STALL_SECONDS, MONITOR_HASH_BUDGET
 import os
 
+# Placeholder for facts not fetched yet
+_MISSING = object()
+
+# Monitor metrics; recorded once per tick except enforcement actions
+TICKS = metrics.counter("monitor_ticks_total", "Process table scans")
+TICK_ERRORS = metrics.counter("monitor_errors_total", "Scans that failed with an error")
+SCAN_SECONDS = metrics.histogram("monitor_scan_seconds", "Time to scan the process table and enforce")
+EXAMINED = metrics.gauge("monitor_processes", "Processes seen in the last scan")
+EXAMINED_TOTAL = metrics.counter("monitor_processes_examined_total", "Processes seen over all scans")
+DECISIONS = metrics.counter("monitor_decisions_total", "New processes judged against the policy")
+MATCHES = metrics.counter("monitor_matches_total", "New processes that belong to a locked app")
+HASH_DEFERRED = metrics.counter("monitor_hash_deferrals_total", "New processes left for the next scan, out of hashing time")
+ACTIONS = metrics.counter("monitor_enforcement_actions_total", "Enforcement actions taken, by action")
+DROPPED_LOGS = metrics.gauge("monitor_dropped_log_records", "Log records dropped because the log queue was full")
+# Watchdog metrics
+OVERRUNS = metrics.counter("monitor_tick_overruns_total", "Scans that took longer than the tick budget")
+STALLS = metrics.counter("monitor_stalls_total", "Times the monitor stopped sending heartbeats")
+RESTARTS = metrics.counter("monitor_restarts_total", "Monitor workers restarted by the watchdog")
+DOWNTIME = metrics.counter("monitor_downtime_seconds_total", "Seconds between the last heartbeat and a restart")
+HEARTBEAT_AGE = metrics.gauge("monitor_heartbeat_age_seconds", "Seconds since the monitor's last heartbeat")
+
+class ProcessView:
+    """Facts about one process, fetched from psutil only when a rule needs them"""
+    __slots__ = ("process", "pid", "name", "key", "argv_cache", "hash_deadline", "deferred", "_exe_path", "_exe",
+                 "_argv", "_sha256", "_parent", "_user")
+
+    def __init__(self, process, name, pid=None, key=None, argv_cache=None, hash_deadline=None):
+        self.process = process
+        self.pid = pid
+        self.name = (name or "").lower()
+        self.key = key  # (pid, create_time) for argv_cache
+        self.argv_cache = argv_cache
+        self.hash_deadline = hash_deadline  # monotonic time after which unseen binaries are not hashed
+        self.deferred = False  # A hash rule could not be checked yet
+        self._exe_path = self._exe = self._argv = self._sha256 = self._parent = self._user = _MISSING
+
+    def exe_path(self):
+        """Executable path as the OS reports it"""
+        if self._exe_path is _MISSING:
+            try:
+                self._exe_path = self.process.exe() or ""
+            except (psutil.Error, OSError):
+                self._exe_path = ""
+        return self._exe_path
+
+    def exe(self):
+        if self._exe is _MISSING:
+            self._exe = normalize_path(self.exe_path())
+        return self._exe
+
+    def sha256(self):
+        if self._sha256 is _MISSING:
+            hash_new = self.hash_deadline is None or time.monotonic() < self.hash_deadline
+            digest = exe_hashes.digest(self.exe_path(), hash_new)
+            if digest is None:
+                self.deferred = True  # Out of hashing time for this scan
+                return ""
+            self._sha256 = digest
+        return self._sha256
+
+    def argv(self):
+        if self._argv is _MISSING:
+            if self.argv_cache is not None and self.key in self.argv_cache:
+                self._argv = self.argv_cache[self.key]
+            else:
+                try:
+                    self._argv = tuple(self.process.cmdline())
+                except (psutil.Error, OSError):
+                    self._argv = ()
+                if self.argv_cache is not None:
+                    self.argv_cache[self.key] = self._argv
+        return self._argv
+
+    def cmdline(self):
+        return " ".join(self.argv())
+
+    def script(self):
+        """Script, jar or module an interpreter is running"""
+        return hosted_target(self.argv())
+
+    def parent(self):
+        if self._parent is _MISSING:
+            try:
+                parent = self.process.parent()
+                self._parent = parent.name().lower() if parent else ""
+            except (psutil.Error, OSError):
+                self._parent = ""
+        return self._parent
+
+    def user(self):
+        if self._user is _MISSING:
+            try:
+                self._user = (self.process.username() or "").lower()
+            except (psutil.Error, OSError):
+                self._user = ""
+        return self._user
+
 class AppBlocker:
-    def __init__(self):
+    def __init__(self, show_notifications=True, interval=MONITOR_INTERVAL, tick_budget=MONITOR_TICK_BUDGET,
+                 stall_seconds=MONITOR_STALL_SECONDS, hash_budget=MONITOR_HASH_BUDGET):
         self.monitoring = False
         self.monitor_thread = None
+        self.show_notifications = show_notifications  # Headless service runs without Tk
+        self.interval = interval
+        self.tick_budget = tick_budget
+        self.stall_seconds = stall_seconds
+        self.hash_budget = hash_budget
+        self._generation = 0  # Bumped on every (re)start; older workers exit when they notice
+        self._heartbeat = None  # monotonic time the current worker last started a tick
+        self._watchdog_thread = None
+        self._watchdog_stop = threading.Event()
+        self._policy = None
+        self._policy_key = None
+        self._actions = {}  # app_name -> enforcement action overriding the default
+        self._decisions = {}  # (pid, create_time) -> locked app or None
+        self._argv_cache = {}  # (pid, create_time) -> argv, kept across policy rebuilds
         
     def start_monitoring(self):
         """Start monitoring for locked applications"""
         if not self.monitoring:
             self.monitoring = True
-            self.monitor_thread = threading.Thread(target=self._monitor_processes, daemon=True)
-            self.monitor_thread.start()
+            # Chosen once here, so the unprofiled loop carries no profiling checks
+            seconds = monitor_profile_seconds()
+            if seconds:
+                self._start_worker(self._profiled_monitor_processes, seconds)
+            else:
+                self._start_worker(self._monitor_processes)
+            self._watchdog_stop.clear()
+            self._watchdog_thread = threading.Thread(target=self._watchdog, daemon=True, name="MonitorWatchdog")
+            self._watchdog_thread.start()
             log_event("App monitoring started")
     
+    def _start_worker(self, target, *args):
+        """Start a monitor worker; any previous one exits at its next check"""
+        self._generation += 1
+        self._heartbeat = time.monotonic()
+        self.monitor_thread = threading.Thread(target=target, args=(self._generation,) + args,
+                                               daemon=True, name=f"Monitor-{self._generation}")
+        self.monitor_thread.start()
+    
+    def _watchdog(self):
+        """Restart the monitor worker when it dies or stops sending heartbeats"""
+        check_every = max(0.1, min(self.stall_seconds / 4, 5))
+        while not self._watchdog_stop.wait(check_every):
+            if not self.monitoring:
+                break
+            age = time.monotonic() - self._heartbeat
+            HEARTBEAT_AGE.set(round(age, 3))
+            alive = self.monitor_thread is not None and self.monitor_thread.is_alive()
+            if alive and age < self.stall_seconds:
+                continue
+            # A wedged thread cannot be killed; it exits once its blocking call returns.
+            # Restarts always run the plain loop: a profiled worker's profiler keeps
+            # recording until it returns and writes its report then.
+            STALLS.inc()
+            RESTARTS.inc()
+            DOWNTIME.inc(age)
+            log_error(f"Monitor {'stalled' if alive else 'died'} ({age:.1f}s since last heartbeat), restarting",
+                      worker=self.monitor_thread.name if self.monitor_thread else None)
+            self._start_worker(self._monitor_processes)
+    
     def stop_monitoring(self):
         """Stop monitoring"""
         self.monitoring = False
+        self._watchdog_stop.set()
+        if self._watchdog_thread:
+            self._watchdog_thread.join(timeout=1)
         if self.monitor_thread:
             self.monitor_thread.join(timeout=1)
+        enforcer.shutdown()  # Nothing may stay frozen or throttled without a monitor to release it
+        flush_repeated_events(force=True)
         log_event("App monitoring stopped")
     
-    def _monitor_processes(self):
-        """Monitor running processes and block locked apps"""
-        while self.monitoring:
+    def _monitor_processes(self, generation, deadline=None):
+        """Monitor running processes and block locked apps (until deadline, a monotonic time, if given)"""
+        while (self.monitoring and generation == self._generation
+               and (deadline is None or time.monotonic() < deadline)):
+            self._heartbeat = started = time.monotonic()
             try:
-                locked_apps = self._get_locked_apps()
-                
-                for proc in psutil.process_iter(['pid', 'name']):
-                    try:
-                        proc_name = proc.info['name']
-                        
-                        # Check if any locked app name is in the process name
-                        for locked_app in locked_apps:
-                            if self._app_matches_process(locked_app, proc_name):
-                                log_event(f"Detected locked app running: {proc_name}")
-                                self._block_process(proc, locked_app)
-                                
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        continue
-                        
-                time.sleep(2)  # Check every 2 seconds
+                self._tick(generation)
+                elapsed = time.monotonic() - started
+                if elapsed > self.tick_budget:
+                    OVERRUNS.inc()
+                    log_repeated_event("Monitor tick over budget", seconds=round(elapsed, 2))
+                time.sleep(self.interval)
                 
             except Exception as e:
+                TICK_ERRORS.inc()
                 log_error(f"Error in process monitoring: {e}")
                 time.sleep(5)
     
-    def _get_locked_apps(self):
-        """Get list of locked applications"""
+    def _profiled_monitor_processes(self, generation, seconds):
+        """Run the loop under the monitor profiler for `seconds`, then carry on unprofiled"""
+        profiler = MonitorProfiler(seconds)
+        profiler.start()
         try:
-            with open(LOCKED_APPS_FILE, "r", encoding="utf-8") as file:
-                locked_apps = json.load(file)
-                return [app for app, locked in locked_apps.items() if locked]
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+            self._monitor_processes(generation, deadline=time.monotonic() + seconds)
+        finally:
+            profiler.stop()
+        self._monitor_processes(generation)
     
-    def _app_matches_process(self, app_name, process_name):
-        """Check if app name matches process name"""
-        # Simple matching - can be improved
-        app_words = app_name.lower().split()
-        process_lower = process_name.lower()
+    def _tick(self, generation):
+        """One scan of the process table; a worker replaced meanwhile leaves no state behind"""
+        started = time.perf_counter()
+        relock_expired()
+        policy = self._get_policy()
+        enforcer.begin_tick()
+        hash_deadline = time.monotonic() + self.hash_budget  # Cold hash caches are filled over several scans
+        decisions = {}
+        judged = matched = 0
         
-        # Check if any word from app name is in process name
-        for word in app_words:
-            if len(word) > 3 and word in process_lower:
-                return True
+        for proc in psutil.process_iter(['pid', 'name', 'create_time']):
+            try:
+                # Each process is judged once; later ticks reuse the decision
+                key = (proc.info['pid'], proc.info['create_time'])
+                if key in self._decisions:
+                    locked_app = self._decisions[key]
+                else:
+                    view = ProcessView(proc, proc.info['name'], proc.info['pid'], key, self._argv_cache, hash_deadline)
+                    # Relaunch storms: quarantined paths die without a policy lookup
+                    if enforcer.has_quarantine:
+                        locked_app = enforcer.quarantined_app(view.exe_path())
+                        if locked_app is not None and enforcer.kill_quarantined(proc, locked_app):
+                            continue
+                    locked_app = policy.decide(view)
+                    if view.deferred and locked_app is None:
+                        HASH_DEFERRED.inc()
+                        continue  # Not remembered, so the next scan judges it again
+                    judged += 1
+                    matched += locked_app is not None
+                decisions[key] = locked_app
                 
-        # Check exact matches for common executables
-        common_mappings = {
-            'chrome': 'chrome.exe',
-            'firefox': 'firefox.exe',
-            'notepad': 'notepad.exe',
-            'calculator': 'calc.exe',
-            'paint': 'mspaint.exe',
-            'steam': 'steam.exe',
-            'discord': 'discord.exe',
-            'spotify': 'spotify.exe',
-            'skype': 'skype.exe',
-            'zoom': 'zoom.exe'
-        }
+                if locked_app is not None:
+                    log_repeated_event("Detected locked app running", app=locked_app,
+                                       process=proc.info['name'], pid=proc.info['pid'])
+                    self._block_process(proc, locked_app)
+                        
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
         
-        for app_key, exe_name in common_mappings.items():
-            if app_key in app_name.lower() and exe_name == process_name.lower():
-                return True
-                
-        return False
+        if generation != self._generation:
+            return  # The watchdog restarted the monitor while this scan was stuck
+        
+        # Only live processes are kept
+        self._decisions = decisions
+        if self._argv_cache:  # Only interpreters (and rule-pinned names) are in here
+            self._argv_cache = {key: argv for key, argv in self._argv_cache.items() if key in decisions}
+        
+        # Apps whose lock lapsed run normally again; stale suspended ones are terminated
+        enforcer.release_unlocked(self._get_locked_apps(), decisions)
+        enforcer.expire()
+        
+        # Summarize repeated detections once their window closes
+        flush_repeated_events()
+        mark_startup("monitor_active", final=True)  # No-op unless profiling
+        
+        TICKS.inc()
+        SCAN_SECONDS.observe(time.perf_counter() - started)
+        EXAMINED.set(len(decisions))
+        EXAMINED_TOTAL.inc(len(decisions))
+        DECISIONS.inc(judged)
+        MATCHES.inc(matched)
+        DROPPED_LOGS.set(get_dropped_log_count())
+    
+    def _get_locked_apps(self):
+        """Get list of locked applications"""
+        return lock_store.locked_apps()
+    
+    def _get_policy(self):
+        """Compiled policy for the apps locked right now, rebuilt only when that changes"""
+        locked_apps = self._get_locked_apps()
+        key = (tuple(locked_apps), lock_store.version)
+        if key != self._policy_key:
+            self._policy = Policy(locked_apps, lock_store.rules())
+            self._actions = lock_store.actions()
+            self._policy_key = key
+            self._decisions = {}  # Earlier decisions were made under other rules
+            log_event(f"Lock policy compiled: {len(locked_apps)} apps, {self._policy.rule_count} rules")
+        return self._policy
     
     def _block_process(self, process, app_name):
-        """Block a process by terminating it"""
+        """Block a process by terminating or suspending it (see app/enforcement.py)"""
         try:
-            # Show blocking message in a separate thread to avoid blocking monitor
-            threading.Thread(target=self._show_block_message, args=(app_name,), daemon=True).start()
+            action = enforcer.enforce(process, app_name, self._actions.get(app_name))
+            if action is None:
+                return  # Already suspended or throttled on an earlier tick
+            ACTIONS.inc(action=action)
+            
+            log_repeated_event("Blocked process", app=app_name, action=action,
+                               process=process.info['name'], pid=process.info['pid'])
             
-            # Terminate the process
-            process.terminate()
-            log_event(f"Blocked process: {process.info['name']} for app: {app_name}")
+            # One notification and audit record per app per BLOCK_NOTIFY_INTERVAL
+            notify, blocks = enforcer.should_notify(app_name)
+            if not notify:
+                return
+            record_audit_event(EVENT_BLOCK, app_name, action=action, blocks=blocks,
+                               process=process.info['name'], pid=process.info['pid'])
+            
+            # Show blocking message in a separate thread to avoid blocking monitor
+            if self.show_notifications:
+                threading.Thread(target=self._show_block_message, args=(app_name, action), daemon=True).start()
             
         except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
-            log_error(f"Failed to block process: {e}")
+            log_repeated_error("Failed to block process", app=app_name, error=e)
     
-    def _show_block_message(self, app_name):
+    def _show_block_message(self, app_name, action=None):
         """Show blocking message to user"""
         try:
             import tkinter as tk
@@ -120,9 +335,18 @@ class AppBlocker:
             root = tk.Tk()
             root.withdraw()  # Hide the root window
             
-            messagebox.showwarning("App Blocked", 
-                                 f"'{app_name}' is locked!\n\n"
-                                 f"Use AppLocker to unlock it with your authenticator code.")
+            if action == ACTION_THROTTLE:
+                messagebox.showwarning("App Slowed Down",
+                                     f"'{app_name}' is locked and will run slowly.\n\n"
+                                     f"Unlock it in AppLocker with your authenticator code to restore full speed.")
+            elif action == ACTION_SUSPEND:
+                messagebox.showwarning("App Paused",
+                                     f"'{app_name}' is locked and has been paused.\n\n"
+                                     f"Unlock it in AppLocker with your authenticator code to continue where you left off.")
+            else:
+                messagebox.showwarning("App Blocked", 
+                                     f"'{app_name}' is locked!\n\n"
+                                     f"Use AppLocker to unlock it with your authenticator code.")
             
             root.destroy()
             
@@ -143,31 +367,36 @@ def stop_app_blocking():
 def unlock_app_temporarily(app_name, duration_minutes=60):
     """Temporarily unlock an app for specified duration"""
     try:
-        with open(LOCKED_APPS_FILE, "r", encoding="utf-8") as file:
-            locked_apps = json.load(file)
-            
-        if app_name in locked_apps:
-            locked_apps[app_name] = False  # Temporarily unlock
-            
-            with open(LOCKED_APPS_FILE, "w", encoding="utf-8") as file:
-                json.dump(locked_apps, file, indent=2)
+        if lock_store.contains(app_name):
+            # The deadline is persisted, so the monitor re-locks even after a service restart
+            lock_store.set_locked(app_name, False, relock_at=time.time() + duration_minutes * 60)
+            enforcer.release(app_name)  # Paused or throttled apps recover right away
             
             log_event(f"App '{app_name}' temporarily unlocked for {duration_minutes} minutes")
-            
-            # Re-lock after duration
-            def re_lock():
-                time.sleep(duration_minutes * 60)
-                try:
-                    with open(LOCKED_APPS_FILE, "r", encoding="utf-8") as file:
-                        locked_apps = json.load(file)
-                    locked_apps[app_name] = True  # Re-lock
-                    with open(LOCKED_APPS_FILE, "w", encoding="utf-8") as file:
-                        json.dump(locked_apps, file, indent=2)
-                    log_event(f"App '{app_name}' automatically re-locked")
-                except Exception as e:
-                    log_error(f"Failed to re-lock app: {e}")
-            
-            threading.Thread(target=re_lock, daemon=True).start()
+            record_audit_event(EVENT_UNLOCK, app_name, duration_minutes=duration_minutes)
+            return True
             
     except Exception as e:
         log_error(f"Failed to unlock app temporarily: {e}")
+    return False
+
+def relock_expired(now=None):
+    """Re-lock temporary unlocks whose time is up; called by the monitor every tick"""
+    try:
+        relocked = lock_store.relock_due(now or time.time())
+    except Exception as e:
+        log_error(f"Failed to re-lock app: {e}")
+        return []
+    for app_name in relocked:
+        log_event(f"App '{app_name}' automatically re-locked")
+        record_audit_event(EVENT_RELOCK, app_name)
+    return relocked
+
+def get_monitor_metrics():
+    """Snapshot of the monitor, enforcement and exit metrics"""
+    return metrics.snapshot()
+
+def get_unlock_remaining():
+    """Seconds left on each temporary unlock"""
+    now = time.time()
+    return {app: max(0, int(relock_at - now)) for app, relock_at in lock_store.unlocks().items()}
@@ -0,0 +1,264 @@
+"""
+Profiling module for AppLocker
+Startup: opt-in via APPLOCKER_PROFILE_STARTUP=1 or `--profile-startup`.
+Records how long each module takes to import and when startup milestones
+are reached (first window, monitor active), then writes a JSON report to
+the logs directory, or to APPLOCKER_PROFILE_DIR when set. Only stdlib is imported here so app.config itself is
+measured.
+Monitor loop: opt-in via APPLOCKER_PROFILE_MONITOR=<seconds> or
+MONITOR_PROFILE_SECONDS. Runs cProfile and tracemalloc on the monitor
+thread for that long, then writes a timestamped report next to LOG_FILE.
+"""
+
+import atexit
+import importlib.abc
+import json
+import os
+import sys
+import time
+
+PROFILE_ENV_VAR = "APPLOCKER_PROFILE_STARTUP"
+MONITOR_PROFILE_ENV_VAR = "APPLOCKER_PROFILE_MONITOR"
+PROFILE_DIR_ENV_VAR = "APPLOCKER_PROFILE_DIR"  # Where startup reports go instead of LOGS_DIR
+DEFAULT_MONITOR_PROFILE_SECONDS = 60  # When the variable is just "1"
+REPORT_TOP = 40  # Functions and allocation sites listed in a monitor report
+TRACEMALLOC_FRAMES = 10
+
+class _TimingLoader:
+    """Wraps a module loader to time create_module/exec_module"""
+
+    def __init__(self, loader, profiler, name):
+        self._loader = loader
+        self._profiler = profiler
+        self._name = name
+
+    def create_module(self, spec):
+        self._profiler._enter(self._name)
+        try:
+            return self._loader.create_module(spec)
+        finally:
+            self._profiler._leave(self._name)
+
+    def exec_module(self, module):
+        self._profiler._enter(self._name)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._leave(self._name)
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    """First entry on sys.meta_path; delegates to the real finders"""
+
+    def __init__(self, profiler):
+        self._profiler = profiler
+
+    def find_spec(self, name, path, target=None):
+        start = time.perf_counter()
+        spec = None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        self._profiler._add_self_time(name, time.perf_counter() - start)
+
+        if spec is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimingLoader(spec.loader, self._profiler, name)
+        return spec
+
+class StartupProfiler:
+    def __init__(self, role):
+        self.role = role
+        self.started = time.perf_counter()
+        self.modules = {}  # name -> [self_seconds, total_seconds]
+        self.marks = {}
+        self._stack = []  # [name, start, child_seconds]
+        self._finder = _TimingFinder(self)
+        self.report_file = None
+
+    def install(self):
+        sys.meta_path.insert(0, self._finder)
+
+    def uninstall(self):
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+
+    def _add_self_time(self, name, seconds):
+        timing = self.modules.setdefault(name, [0.0, 0.0])
+        timing[0] += seconds
+        timing[1] += seconds
+        if self._stack:
+            self._stack[-1][2] += seconds  # Not the parent's own time
+
+    def _enter(self, name):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def _leave(self, name):
+        _, start, children = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        timing = self.modules.setdefault(name, [0.0, 0.0])
+        timing[0] += elapsed - children
+        timing[1] += elapsed
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def mark(self, name):
+        """Record a milestone; only the first occurrence counts"""
+        self.marks.setdefault(name, round((time.perf_counter() - self.started) * 1000, 2))
+
+    def report(self):
+        modules = [
+            {"name": name, "self_ms": round(own * 1000, 3), "total_ms": round(total * 1000, 3)}
+            for name, (own, total) in self.modules.items()
+        ]
+        modules.sort(key=lambda m: m["self_ms"], reverse=True)
+        return {
+            "role": self.role,
+            "pid": os.getpid(),
+            "python": sys.version.split()[0],
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "marks": dict(self.marks),
+            "import_ms": round(sum(m["self_ms"] for m in modules), 2),
+            "modules": modules
+        }
+
+    def write_report(self):
+        """Write the report next to the logs; returns its path"""
+        from app.config import LOGS_DIR
+        from app.logging import log_event
+
+        report = self.report()
+        report_dir = os.environ.get(PROFILE_DIR_ENV_VAR) or LOGS_DIR
+        self.report_file = os.path.join(report_dir, f"startup_profile_{self.role}.json")
+        with open(self.report_file, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+        slowest = ", ".join(f"{m['name']} {m['self_ms']:.1f}ms" for m in report["modules"][:5])
+        log_event(f"Startup profile ({self.role}): imports {report['import_ms']:.0f} ms, "
+                  f"marks {report['marks']}, slowest {slowest}; report {self.report_file}")
+        return self.report_file
+
+# Active profiler, or None when profiling is off (the common case)
+_profiler = None
+
+def profiling_requested(argv=()):
+    return "--profile-startup" in argv or os.environ.get(PROFILE_ENV_VAR, "") not in ("", "0")
+
+def start_startup_profile(role):
+    """Start timing imports; call before importing anything from app"""
+    global _profiler
+    if _profiler is None:
+        _profiler = StartupProfiler(role)
+        _profiler.install()
+        # Processes that never reach their final milestone still get a report
+        atexit.register(finish_startup_profile)
+    return _profiler
+
+def mark_startup(name, final=False):
+    """Record a startup milestone; final=True writes the report"""
+    if _profiler is None:
+        return
+    _profiler.mark(name)
+    if final:
+        finish_startup_profile()
+
+def finish_startup_profile():
+    """Stop timing imports and write the report"""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is None:
+        return None
+    profiler.uninstall()
+    try:
+        return profiler.write_report()
+    except Exception as e:
+        print(f"Failed to write startup profile: {e}", file=sys.stderr)
+        return None
+
+class MonitorProfiler:
+    """cProfile + tracemalloc over a bounded stretch of the monitor loop"""
+
+    def __init__(self, seconds, report_dir=None):
+        self.seconds = seconds
+        self.report_dir = report_dir
+        self.report_file = None
+        self._profile = None
+        self._started_tracemalloc = False
+        self._started = None
+
+    def start(self):
+        """Call on the thread to profile"""
+        import cProfile
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        self._started = time.perf_counter()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop(self):
+        """Stop profiling and write the report; returns its path"""
+        import tracemalloc
+        from app.logging import log_event, log_error
+
+        if self._profile is None:
+            return None
+        self._profile.disable()
+        elapsed = time.perf_counter() - self._started
+        allocations = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        current, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        try:
+            self.report_file = self._write(elapsed, allocations, current, peak)
+        except OSError as e:
+            log_error(f"Failed to write monitor profile: {e}")
+            return None
+        finally:
+            self._profile = None
+        log_event(f"Monitor profile: {elapsed:.0f}s profiled, peak traced memory {peak / 1024:.0f} KiB; "
+                  f"report {self.report_file}")
+        return self.report_file
+
+    def _write(self, elapsed, allocations, current, peak):
+        import io
+        import pstats
+        from app.config import LOG_FILE
+
+        report_dir = self.report_dir or LOG_FILE.parent
+        stem = os.path.join(report_dir, f"monitor_profile_{time.strftime('%Y%m%d_%H%M%S')}")
+        # Raw stats for snakeviz / `python -m pstats`
+        self._profile.dump_stats(f"{stem}.prof")
+
+        stats_text = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=stats_text)
+        stats.sort_stats("cumulative").print_stats(REPORT_TOP)
+        with open(f"{stem}.txt", "w", encoding="utf-8") as file:
+            file.write(f"Monitor profile, pid {os.getpid()}, {elapsed:.1f}s profiled, "
+                       f"created {time.strftime('%Y-%m-%dT%H:%M:%S')}\n\n")
+            file.write(stats_text.getvalue())
+            file.write(f"\nTraced memory: {current / 1024:.0f} KiB current, {peak / 1024:.0f} KiB peak\n")
+            if allocations is not None:
+                file.write(f"Top {REPORT_TOP} allocation sites:\n")
+                for stat in allocations.statistics("lineno")[:REPORT_TOP]:
+                    file.write(f"  {stat}\n")
+        return f"{stem}.txt"
+
+def monitor_profile_seconds():
+    """Seconds to profile the monitor loop for; 0 when monitor profiling is off"""
+    value = os.environ.get(MONITOR_PROFILE_ENV_VAR, "")
+    if value in ("", "0"):
+        from app.config import MONITOR_PROFILE_SECONDS
+        return MONITOR_PROFILE_SECONDS
+    if value == "1":
+        return DEFAULT_MONITOR_PROFILE_SECONDS
+    try:
+        return max(0, float(value))
+    except ValueError:
+        return DEFAULT_MONITOR_PROFILE_SECONDS
@@ -0,0 +1,146 @@
+"""
+Lock schedule module for AppLocker
+A lock can carry recurring time windows ("mon-fri 09:00-17:00"). Windows
+are compiled into a sorted boundary table per weekday, so "locked right
+now?" is one bisect and the next transition is known ahead of time.
+"""
+
+import re
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+DAY_ALIASES = {
+    "daily": DAY_NAMES,
+    "weekdays": DAY_NAMES[:5],
+    "weekends": DAY_NAMES[5:]
+}
+SECONDS_PER_DAY = 24 * 3600
+
+_TIME_RANGE = re.compile(r"^\d{1,2}:\d{2}-\d{1,2}:\d{2}$")
+
+class ScheduleError(ValueError):
+    """Raised for schedules that cannot be parsed"""
+
+def _parse_days(text):
+    days = []
+    for part in text.lower().split(","):
+        part = part.strip()
+        if part in DAY_ALIASES:
+            days.extend(DAY_ALIASES[part])
+        elif "-" in part:
+            first, _, last = part.partition("-")
+            if first not in DAY_NAMES or last not in DAY_NAMES:
+                raise ScheduleError(f"Unknown day range '{part}'")
+            start, end = DAY_NAMES.index(first), DAY_NAMES.index(last)
+            span = (end - start) % 7
+            days.extend(DAY_NAMES[(start + i) % 7] for i in range(span + 1))
+        elif part in DAY_NAMES:
+            days.append(part)
+        else:
+            raise ScheduleError(f"Unknown day '{part}'")
+    return sorted(set(days), key=DAY_NAMES.index)
+
+def _parse_time(text):
+    hours, _, minutes = text.partition(":")
+    seconds = int(hours) * 3600 + int(minutes) * 60
+    if not 0 <= int(minutes) < 60 or not 0 <= seconds <= SECONDS_PER_DAY:
+        raise ScheduleError(f"Invalid time '{text}'")
+    return seconds
+
+def parse_schedule_text(text):
+    """Parse "mon-fri 09:00-17:00; sat 10:00-12:00" into window dicts"""
+    windows = []
+    for chunk in text.split(";"):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        days, _, times = chunk.rpartition(" ")
+        match = _TIME_RANGE.match(times)
+        if not days or not match:
+            raise ScheduleError(f"Expected '<days> HH:MM-HH:MM', got '{chunk}'")
+        windows.append({"days": _parse_days(days), "start": times.split("-")[0], "end": times.split("-")[1]})
+    if not windows:
+        raise ScheduleError("Schedule is empty")
+    validate_schedule(windows)
+    return windows
+
+def format_schedule(windows):
+    """Human-readable form of a list of window dicts"""
+    return "; ".join(f"{','.join(w['days'])} {w['start']}-{w['end']}" for w in windows)
+
+def validate_schedule(windows):
+    """Check stored/received window dicts; raises ScheduleError"""
+    if not isinstance(windows, list):
+        raise ScheduleError("Schedule must be a list of windows")
+    for window in windows:
+        try:
+            days, start, end = window["days"], window["start"], window["end"]
+        except (KeyError, TypeError):
+            raise ScheduleError(f"Invalid window {window!r}")
+        if not days or any(day not in DAY_NAMES for day in days):
+            raise ScheduleError(f"Invalid days in window {window!r}")
+        if _parse_time(start) == _parse_time(end):
+            raise ScheduleError(f"Window {window!r} is empty")
+
+class Schedule:
+    """Compiled weekly schedule"""
+
+    def __init__(self, windows):
+        validate_schedule(windows)
+        self.windows = windows
+        intervals = [[] for _ in DAY_NAMES]
+        for window in windows:
+            start, end = _parse_time(window["start"]), _parse_time(window["end"])
+            for day in window["days"]:
+                index = DAY_NAMES.index(day)
+                if end > start:
+                    intervals[index].append((start, end))
+                elif end < start:
+                    # Overnight window, e.g. 22:00-06:00
+                    intervals[index].append((start, SECONDS_PER_DAY))
+                    intervals[(index + 1) % 7].append((0, end))
+        # Per weekday: sorted, merged boundaries [start0, end0, start1, end1, ...]
+        self._days = [self._merge(day) for day in intervals]
+        self._transitions = self._compile_transitions()
+
+    @staticmethod
+    def _merge(intervals):
+        bounds = []
+        for start, end in sorted(intervals):
+            if bounds and start <= bounds[-1]:
+                bounds[-1] = max(bounds[-1], end)
+            else:
+                bounds.extend((start, end))
+        return bounds
+
+    def _compile_transitions(self):
+        """Seconds from Monday 00:00 at which the state flips"""
+        week = self._merge([
+            (day * SECONDS_PER_DAY + bounds[i], day * SECONDS_PER_DAY + bounds[i + 1])
+            for day, bounds in enumerate(self._days)
+            for i in range(0, len(bounds), 2)
+        ])
+        # A window running through Sunday midnight into Monday is one window
+        if week and week[0] == 0 and week[-1] == 7 * SECONDS_PER_DAY:
+            week = week[1:-1]
+        return week
+
+    def is_active(self, when=None):
+        """True if `when` (a datetime, default now) falls inside a window"""
+        when = when or datetime.now()
+        second = when.hour * 3600 + when.minute * 60 + when.second
+        return bisect_right(self._days[when.weekday()], second) % 2 == 1
+
+    def next_transition(self, when=None):
+        """Datetime of the next change in is_active, or None if it never changes"""
+        if not self._transitions:
+            return None
+        when = when or datetime.now()
+        monday = (when - timedelta(days=when.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+        second = when.weekday() * SECONDS_PER_DAY + when.hour * 3600 + when.minute * 60 + when.second
+
+        index = bisect_right(self._transitions, second)
+        if index < len(self._transitions):
+            return monday + timedelta(seconds=self._transitions[index])
+        return monday + timedelta(days=7, seconds=self._transitions[0])
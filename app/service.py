@@ -0,0 +1,138 @@
+"""
+Headless service module for AppLocker
+Runs the process monitor without importing Tk, PIL or qrcode, so it can
+stay resident cheaply and run on machines without a display. GUI and CLI
+clients control it over the local IPC channel (see app/ipc.py).
+"""
+
+import os
+import signal
+import sys
+import threading
+from app.logging import setup_logging, log_event
+from app.process_manager import app_blocker, unlock_app_temporarily, get_unlock_remaining, get_monitor_metrics
+from app.lock_store import lock_store
+from app.credentials import credential_store
+from app.enforcement import enforcer
+from app.schedule import format_schedule
+from app.audit import audit_log, record_audit_event, EVENT_LOCK, EVENT_LOCK_REMOVED, EVENT_AUTH_FAILED
+from app.ipc import IPCServer
+from app.metrics_server import start_metrics_server
+from app.instance import service_instance
+
+def display_available():
+    """Check whether block notifications can be shown on this machine"""
+    if sys.platform.startswith("win") or sys.platform == "darwin":
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+# Service commands, also run in-process by app/client.py when no service is up
+def ping():
+    return {"pid": os.getpid()}
+
+def status():
+    next_change = lock_store.next_transition()
+    return {
+        "pid": os.getpid(),
+        "monitoring": app_blocker.monitoring,
+        "locked_apps": lock_store.locked_apps(),
+        "unlocked": get_unlock_remaining(),
+        "suspended": enforcer.suspended_counts(),
+        "throttled": enforcer.throttler.counts(),
+        "schedules": {app: format_schedule(windows) for app, windows in lock_store.schedules().items()},
+        "next_schedule_change": next_change.isoformat(timespec="seconds") if next_change else None
+    }
+
+def _require_code(code, app, command):
+    """Check the 2FA code of a request that weakens protection; raises PermissionError"""
+    if code and credential_store.verify_totp(str(code).strip()):
+        return
+    record_audit_event(EVENT_AUTH_FAILED, app, method="totp", command=command)
+    raise PermissionError("Invalid or missing 2FA code")
+
+def lock(app, schedule=None, rules=None, action=None, code=None):
+    # Locking is free; loosening an existing lock needs the same code as unlocking
+    if lock_store.would_weaken(app, schedule=schedule, rules=rules, action=action):
+        _require_code(code, app, "lock")
+    lock_store.set_locked(app, True, schedule=schedule, rules=rules, action=action)
+    if schedule:
+        log_event(f"App '{app}' is now locked during: {format_schedule(schedule)}")
+        record_audit_event(EVENT_LOCK, app, schedule=format_schedule(schedule))
+    else:
+        log_event(f"App '{app}' is now locked")
+        record_audit_event(EVENT_LOCK, app)
+    return True
+
+def remove_lock(app, code=None):
+    if lock_store.would_weaken(app, remove=True):
+        _require_code(code, app, "remove_lock")
+    if not lock_store.remove(app):
+        return False
+    log_event(f"Lock removed from app: {app}")
+    record_audit_event(EVENT_LOCK_REMOVED, app)
+    enforcer.release(app)
+    return True
+
+def unlock(app, minutes=60, code=None):
+    _require_code(code, app, "unlock")
+    return unlock_app_temporarily(app, minutes)
+
+def metrics():
+    return get_monitor_metrics()
+
+def events(app=None, event_type=None, start=None, end=None, limit=100):
+    return audit_log.query(app=app, event_type=event_type, start=start, end=end, limit=limit)
+
+COMMANDS = {
+    "ping": ping,
+    "status": status,
+    "lock": lock,
+    "remove_lock": remove_lock,
+    "unlock": unlock,
+    "events": events,
+    "metrics": metrics
+}
+
+def run_service(show_notifications=None):
+    """Run the monitor until SIGINT/SIGTERM"""
+    setup_logging()
+
+    if not service_instance.acquire():
+        log_event("AppLocker service is already running")
+        return
+
+    if show_notifications is None:
+        show_notifications = display_available()
+    app_blocker.show_notifications = show_notifications
+
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    server = IPCServer(COMMANDS)
+    try:
+        server.start()
+    except RuntimeError as e:
+        log_event(f"AppLocker service not started: {e}")
+        service_instance.release()
+        return
+
+    app_blocker.start_monitoring()
+    metrics_server = start_metrics_server()
+    log_event(f"AppLocker service started (pid {os.getpid()}, notifications {'on' if show_notifications else 'off'})")
+
+    try:
+        # Wake up periodically so Ctrl+C is handled promptly on Windows
+        while not stop_event.wait(1):
+            pass
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        server.stop()
+        app_blocker.stop_monitoring()
+        service_instance.release()
+        log_event("AppLocker service stopped")
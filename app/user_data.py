@@ -1,11 +1,146 @@
+import json
+import threading
+import time
 import bcrypt
+from app.logging import log_event, log_error
+from app.config import BCRYPT_SETTINGS_FILE, BCRYPT_TARGET_MS, BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS
+
+# Cost chosen for this machine, loaded once per process and settings file
+_bcrypt_rounds = {}
+_calibrations = {}  # settings_file -> background calibration thread
+_rounds_lock = threading.Lock()
+
+# Function to benchmark bcrypt on this machine and pick a cost factor
+def calibrate_bcrypt_cost(target_ms=BCRYPT_TARGET_MS):
+    """Pick the highest bcrypt cost whose verification stays within target_ms"""
+    rounds = BCRYPT_MIN_ROUNDS
+    salt = bcrypt.gensalt(rounds)
+
+    # Best of two runs so a cold cache does not skew the measurement
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"applocker-calibration", salt)
+        timings.append((time.perf_counter() - start) * 1000)
+    elapsed_ms = min(timings)
+
+    # Every extra round doubles the work, so extrapolate instead of hashing again
+    while rounds < BCRYPT_MAX_ROUNDS and elapsed_ms * 2 <= target_ms:
+        rounds += 1
+        elapsed_ms *= 2
+
+    log_event(f"Calibrated bcrypt cost: {rounds} (~{elapsed_ms:.0f} ms per verification)")
+    return rounds
+
+# Function to read a previously calibrated cost without benchmarking
+def _stored_cost(settings_file):
+    """Cost from memory or the settings file, or None; caller holds the lock"""
+    if settings_file in _bcrypt_rounds:
+        return _bcrypt_rounds[settings_file]
+    try:
+        with open(settings_file, "r", encoding="utf-8") as file:
+            rounds = int(json.load(file)["rounds"])
+        if BCRYPT_MIN_ROUNDS <= rounds <= BCRYPT_MAX_ROUNDS:
+            _bcrypt_rounds[settings_file] = rounds
+            return rounds
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+        pass
+    return None
+
+# Function to get the bcrypt cost for this machine, calibrating on first use
+def get_bcrypt_cost(settings_file=BCRYPT_SETTINGS_FILE):
+    """Stored cost, or calibrate (two hashes at BCRYPT_MIN_ROUNDS) and store it; blocks the caller"""
+    with _rounds_lock:
+        rounds = _stored_cost(settings_file)
+    if rounds is not None:
+        return rounds
+
+    # Benchmark outside the lock so current_bcrypt_cost() never waits for it
+    rounds = calibrate_bcrypt_cost()
+    with _rounds_lock:
+        try:
+            with open(settings_file, "w", encoding="utf-8") as file:
+                json.dump({"rounds": rounds, "target_ms": BCRYPT_TARGET_MS}, file, indent=2)
+        except OSError as e:
+            log_error(f"Failed to save bcrypt settings: {e}")
+        _bcrypt_rounds[settings_file] = rounds
+    return rounds
+
+# Function to calibrate on a background thread, e.g. while the GUI starts
+def start_bcrypt_calibration(settings_file=BCRYPT_SETTINGS_FILE):
+    """Calibrate off the caller's thread; returns the thread, or None if the cost is known"""
+    with _rounds_lock:
+        if _stored_cost(settings_file) is not None:
+            return None
+        thread = _calibrations.get(settings_file)
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=get_bcrypt_cost, args=(settings_file,), daemon=True,
+                                      name="BcryptCalibration")
+            _calibrations[settings_file] = thread
+            thread.start()
+        return thread
+
+# Function to get the calibrated cost without ever benchmarking on this thread
+def current_bcrypt_cost(settings_file=BCRYPT_SETTINGS_FILE):
+    """Calibrated cost, or None while calibration runs in the background"""
+    with _rounds_lock:
+        rounds = _stored_cost(settings_file)
+    if rounds is None:
+        start_bcrypt_calibration(settings_file)
+    return rounds
+
+# Function to read the cost factor embedded in a bcrypt hash ($2b$<cost>$...)
+def get_hash_cost(hashed_pin):
+    if isinstance(hashed_pin, str):
+        hashed_pin = hashed_pin.encode('utf-8')
+    return int(hashed_pin.split(b"$")[2])
+
+# Function to check whether a stored hash uses a different cost than this machine's
+def needs_rehash(hashed_pin, rounds=None):
+    rounds = rounds or current_bcrypt_cost()
+    return rounds is not None and get_hash_cost(hashed_pin) != rounds
 
 # Function to hash the PIN securely
-def hash_pin(pin):
-    salt = bcrypt.gensalt()  # Generate salt for bcrypt
+def hash_pin(pin, rounds=None):
+    """Hash at the calibrated cost; until calibration finishes, at BCRYPT_MIN_ROUNDS (re-hashed on verify)"""
+    if rounds is None:
+        rounds = current_bcrypt_cost() or BCRYPT_MIN_ROUNDS
+    salt = bcrypt.gensalt(rounds)  # Generate salt for bcrypt
     hashed_pin = bcrypt.hashpw(pin.encode('utf-8'), salt)  # Hash the PIN with salt
     return hashed_pin
 
 # Function to verify the PIN
-def verify_pin(stored_hashed_pin, entered_pin):
-    return bcrypt.checkpw(entered_pin.encode('utf-8'), stored_hashed_pin)
+def verify_pin(stored_hashed_pin, entered_pin, on_rehash=None, rounds=None):
+    """Verify a PIN; on success, hand a re-hashed PIN to on_rehash if its cost differs from rounds
+    (default: this machine's calibrated cost) so the caller can persist it"""
+    if not bcrypt.checkpw(entered_pin.encode('utf-8'), stored_hashed_pin):
+        return False
+
+    if on_rehash is not None and needs_rehash(stored_hashed_pin, rounds):
+        try:
+            new_hash = hash_pin(entered_pin, rounds or current_bcrypt_cost())
+            on_rehash(new_hash)
+            log_event(f"PIN re-hashed with bcrypt cost {get_hash_cost(new_hash)}")
+        except Exception as e:
+            log_error(f"Failed to re-hash PIN: {e}")
+
+    return True
+
+# Function to verify the PIN on a background thread
+def verify_pin_async(stored_hashed_pin, entered_pin, callback, on_rehash=None):
+    """Run verify_pin off the caller's thread and pass the result to callback.
+
+    The callback runs on the worker thread; Tk callers should hop back to the
+    UI thread with widget.after().
+    """
+    def worker():
+        try:
+            result = verify_pin(stored_hashed_pin, entered_pin, on_rehash)
+        except Exception as e:
+            log_error(f"PIN verification failed: {e}")
+            result = False
+        callback(result)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    return thread
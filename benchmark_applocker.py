@@ -0,0 +1,334 @@
+"""
+Benchmark script for AppLocker
+
+This script measures hot paths of the AppLocker application and fails
+when they fall below their performance budget.
+"""
+
+import sys
+import os
+import json
+import statistics
+import subprocess
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.otp_store import OTPStore
+from app.audit import AuditStore
+from app.lock_store import LockStore
+from app.schedule import Schedule
+from app.policy import Policy
+from app.profiling import PROFILE_DIR_ENV_VAR
+
+# Kept outside the repo so runs can be compared over time; override with APPLOCKER_STARTUP_HISTORY
+STARTUP_HISTORY_FILE = (os.environ.get("APPLOCKER_STARTUP_HISTORY")
+                        or os.path.join(tempfile.gettempdir(), "applocker_startup_history.jsonl"))
+
+def benchmark_otp_verification():
+    """Benchmark OTP verifications per second"""
+    print("Benchmarking OTP verification...")
+
+    users = 5000
+    budget = 1000  # Verifications per second
+    store = OTPStore(os.path.join(tempfile.mkdtemp(), "reset_otps.jsonl"))
+
+    for i in range(users):
+        store.save(f"user{i}@applocker.com", f"{i:06d}")
+
+    start = time.perf_counter()
+    for i in range(users):
+        store.verify(f"user{i}@applocker.com", f"{i:06d}")
+    elapsed = time.perf_counter() - start
+
+    rate = users / elapsed
+    if rate >= budget:
+        print(f"✅ OTP verification: PASS ({rate:,.0f}/s, budget {budget:,}/s)")
+        return True
+    else:
+        print(f"❌ OTP verification: FAIL ({rate:,.0f}/s, budget {budget:,}/s)")
+        return False
+
+def benchmark_audit_query():
+    """Benchmark audit queries over a year of history"""
+    print("Benchmarking audit queries...")
+
+    budget_ms = 50
+    store = AuditStore(tempfile.mkdtemp())
+    day = 24 * 3600
+    now = time.time()
+
+    # One year, 200 events a day spread over 20 apps
+    for d in range(365):
+        for i in range(200):
+            store.record("block", f"App {i % 20}", timestamp=now - d * day - i, process=f"app{i % 20}.exe")
+    store.record("master_key_used", timestamp=now - 100 * day)
+    store.close()
+    store = AuditStore(store.root)
+    store.query(limit=1)  # Load the index
+
+    queries = {
+        "latest for one app": dict(app="App 7", start=now - 365 * day, limit=100),
+        "rare event type": dict(event_type="master_key_used", start=now - 365 * day),
+        "last 24 hours": dict(start=now - day, limit=100)
+    }
+
+    passed = True
+    for label, query in queries.items():
+        start = time.perf_counter()
+        events = store.query(**query)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        ok = elapsed_ms <= budget_ms and events
+        passed = passed and bool(ok)
+        mark = "✅" if ok else "❌"
+        print(f"{mark} Audit query, {label}: {elapsed_ms:.1f} ms ({len(events)} events, budget {budget_ms} ms)")
+
+    return passed
+
+def benchmark_cli_startup():
+    """Benchmark CLI cold start and check it stays free of heavy imports"""
+    print("Benchmarking CLI startup...")
+
+    budget_ms = 100
+    runs = 5
+    heavy = ["tkinter", "PIL", "qrcode", "psutil", "pyotp", "bcrypt", "smtplib", "app.gui", "app.process_manager"]
+    root = os.path.dirname(os.path.abspath(__file__))
+
+    probe = (
+        "import sys, io, contextlib\n"
+        "from app.cli import main\n"
+        "with contextlib.redirect_stdout(io.StringIO()):\n"
+        "    main(['status', '--json'])\n"
+        f"print(','.join(m for m in {heavy!r} if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", probe], cwd=root, capture_output=True, text=True)
+    loaded = result.stdout.strip()
+    if result.returncode != 0 or loaded:
+        print(f"❌ CLI imports: FAIL (heavy modules loaded: {loaded or result.stderr.strip()})")
+        return False
+    print("✅ CLI imports: PASS (no GUI or monitor modules)")
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "main.py", "status", "--json"], cwd=root,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    best = min(timings)
+    if best <= budget_ms:
+        print(f"✅ CLI startup: PASS ({best:.0f} ms, budget {budget_ms} ms)")
+        return True
+    else:
+        print(f"❌ CLI startup: FAIL ({best:.0f} ms, budget {budget_ms} ms)")
+        return False
+
+def benchmark_schedule_lookup():
+    """Benchmark "locked right now?" with hundreds of scheduled locks"""
+    print("Benchmarking schedule lookups...")
+
+    from datetime import datetime, timedelta
+    rules = 500
+    budget = 100000  # Lookups per second
+    days = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+    windows = lambda i: [
+        {"days": days[i % 7:] + days[:i % 7][:2], "start": f"{h:02d}:{i % 60:02d}", "end": f"{h + 1:02d}:00"}
+        for h in range(0, 23, 3)
+    ]
+
+    store = LockStore(os.path.join(tempfile.mkdtemp(), "locked_apps.json"))
+    for i in range(rules):
+        store._apps[f"App {i}"] = {"locked": True, "schedule": windows(i)}
+    store._write()
+    schedules = [Schedule(windows(i)) for i in range(rules)]
+
+    now = datetime.now()
+    moments = [now + timedelta(minutes=7 * i) for i in range(200)]
+    start = time.perf_counter()
+    for moment in moments:
+        for schedule in schedules:
+            schedule.is_active(moment)
+    rate = len(moments) * rules / (time.perf_counter() - start)
+
+    # The monitor's per-tick call is answered from the cache until the next transition
+    calls = 1000
+    start = time.perf_counter()
+    for _ in range(calls):
+        store.locked_apps()
+    tick_ms = (time.perf_counter() - start) * 1000 / calls
+
+    if rate >= budget:
+        print(f"✅ Schedule lookups: PASS ({rate:,.0f}/s over {rules} rules, budget {budget:,}/s; "
+              f"monitor tick {tick_ms:.3f} ms)")
+        return True
+    else:
+        print(f"❌ Schedule lookups: FAIL ({rate:,.0f}/s over {rules} rules, budget {budget:,}/s)")
+        return False
+
+class _ProcessStub:
+    """Process view whose facts count as lookups when the policy asks for them"""
+
+    def __init__(self, name, exe=""):
+        self.name = name
+        self._exe = exe or f"c:/windows/system32/{name}"
+        self.lookups = 0
+
+    def _fetch(self, value):
+        self.lookups += 1
+        return value
+
+    def exe(self):
+        return self._fetch(self._exe)
+
+    def cmdline(self):
+        return self._fetch(self.name)
+
+    def script(self):
+        return self._fetch("")
+
+    def parent(self):
+        return self._fetch("services.exe")
+
+    def user(self):
+        return self._fetch("system")
+
+    def sha256(self):
+        return self._fetch("")
+
+def benchmark_policy_decision():
+    """Benchmark the per-process lock decision with 1,000 rules"""
+    print("Benchmarking policy decisions...")
+
+    rules = 1000
+    budget_ns = 1000
+    apps = [f"App {i}" for i in range(rules)]
+    policy_rules = {}
+    for i, app in enumerate(apps):
+        if i % 10 < 6:
+            policy_rules[app] = [{"name": f"tool{i}\\.exe"}]
+        elif i % 10 < 8:
+            policy_rules[app] = [{"exe": f"C:/Program Files/Vendor {i}/bin/prog{i}.exe"}]
+        elif i % 10 < 9:
+            policy_rules[app] = [{"name": f"game{i}(-launcher)?\\.exe"}]
+        elif i % 20 < 10:
+            policy_rules[app] = [{"name": f"helper{i}\\.exe", "parent": "explorer.exe"}]
+        else:
+            policy_rules[app] = [{"cmdline": f"--profile-directory=Profile{i}"}]
+    policy = Policy(apps, policy_rules)
+
+    processes = [_ProcessStub(f"svchost{i}.exe") for i in range(300)]
+    processes += [_ProcessStub(name) for name in ("explorer.exe", "python.exe", "code.exe", "tool6.exe")]
+    rounds = 200
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for process in processes:
+            policy.decide(process)
+    cost_ns = (time.perf_counter() - start) / (rounds * len(processes)) * 1e9
+    lookups = sum(process.lookups for process in processes) / (rounds * len(processes))
+    summary = f"{cost_ns:.0f} ns/process, {lookups:.1f} lookups/process at {policy.rule_count} rules, budget {budget_ns} ns"
+
+    if cost_ns <= budget_ns:
+        print(f"✅ Policy decision: PASS ({summary})")
+        return True
+    else:
+        print(f"❌ Policy decision: FAIL ({summary})")
+        return False
+
+def _profiled_run(args, report_name, report_dir):
+    """Run a command with the startup profiler on and return its report"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, APPLOCKER_PROFILE_STARTUP="1", **{PROFILE_DIR_ENV_VAR: report_dir})
+    subprocess.run([sys.executable] + args, cwd=root, env=env,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    with open(os.path.join(report_dir, f"startup_profile_{report_name}.json"), "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def benchmark_startup_history():
+    """Track startup milestones over time and flag regressions"""
+    print("Benchmarking startup against history...")
+
+    runs = 3
+    tolerance = 1.25  # Allowed slowdown against the recent median
+    slack_ms = 5  # Absolute noise allowance for tiny numbers
+    probe = (
+        "from app.profiling import start_startup_profile, mark_startup\n"
+        "start_startup_profile('bench')\n"
+        "import app.service\n"
+        "mark_startup('service_imported')\n"
+        "import app.gui\n"
+        "mark_startup('gui_imported', final=True)"
+    )
+
+    report_dir = tempfile.mkdtemp()
+    samples = {}
+    for _ in range(runs):
+        cli = _profiled_run(["main.py", "status", "--json"], "cli", report_dir)
+        bench = _profiled_run(["-c", probe], "bench", report_dir)
+        current = {
+            "cli_command_done_ms": cli["marks"]["command_done"],
+            "cli_import_ms": cli["import_ms"],
+            "service_imported_ms": bench["marks"]["service_imported"],
+            "gui_imported_ms": bench["marks"]["gui_imported"]
+        }
+        for metric, value in current.items():
+            samples.setdefault(metric, []).append(value)
+    current = {metric: min(values) for metric, values in samples.items()}
+
+    # Compare against the recent history, then record this run
+    try:
+        with open(STARTUP_HISTORY_FILE, "r", encoding="utf-8") as file:
+            history = [json.loads(line) for line in file if line.strip()][-10:]
+    except FileNotFoundError:
+        history = []
+
+    with open(STARTUP_HISTORY_FILE, "a", encoding="utf-8") as file:
+        file.write(json.dumps({"ts": time.time(), **current}) + "\n")
+
+    passed = True
+    for metric, value in current.items():
+        previous = [entry[metric] for entry in history if metric in entry]
+        if not previous:
+            print(f"✅ {metric}: {value:.1f} ms (first recorded run)")
+            continue
+        baseline = statistics.median(previous)
+        ok = value <= baseline * tolerance + slack_ms
+        passed = passed and ok
+        mark = "✅" if ok else "❌"
+        print(f"{mark} {metric}: {value:.1f} ms (median of last {len(previous)}: {baseline:.1f} ms)")
+
+    return passed
+
+def main():
+    """Run all benchmarks"""
+    print("⏱️  AppLocker Benchmarks")
+    print("=" * 40)
+
+    benchmarks = [
+        benchmark_otp_verification,
+        benchmark_audit_query,
+        benchmark_schedule_lookup,
+        benchmark_policy_decision,
+        benchmark_cli_startup,
+        benchmark_startup_history
+    ]
+
+    passed = 0
+    total = len(benchmarks)
+
+    for benchmark in benchmarks:
+        try:
+            if benchmark():
+                passed += 1
+        except Exception as e:
+            print(f"❌ {benchmark.__name__}: FAIL - {e}")
+        print()
+
+    print("=" * 40)
+    print(f"Benchmark Results: {passed}/{total} within budget")
+
+    return passed == total
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -1,48 +1,84 @@
-from app.gui import user_setup
-from app.auth import unlock_app
-from app.config import USER_DATA_FILE
-from app.process_manager import start_app_blocking, stop_app_blocking
-import os
-import atexit
+import sys
+from app.profiling import profiling_requested, start_startup_profile, mark_startup
 
-# Initialize logging
-from app.logging import setup_logging
-setup_logging()
+# Heavy modules (Tk, PIL, qrcode) are imported only on the GUI path so the
+# headless service starts fast and runs without a display
 
 def check_setup():
     """Check if user setup is complete and valid"""
-    if not os.path.exists(USER_DATA_FILE):
-        return False
-    
-    # Check if setup file has valid data
     try:
-        from app.auth import load_user_data
-        secret_key, user_email = load_user_data()
-        return secret_key is not None
+        from app.credentials import credential_store
+        return credential_store.is_configured()
     except Exception:
         return False
 
-# Main entry point
-if __name__ == '__main__':
+def run_gui():
+    """Make sure the service is running, then show the setup wizard or unlock interface"""
+    from app.logging import setup_logging
+    from app.client import ensure_service
+    from app.instance import claim_gui_instance, release_gui_instance, notify_running_gui
+
+    # Initialize logging
+    setup_logging()
+
+    # Only one window at a time; a second launch just raises the first
+    if not claim_gui_instance():
+        print("AppLocker is already open.")
+        notify_running_gui("show")
+        return
+
+    # PIN hashing needs the machine's bcrypt cost; benchmark it away from the Tk thread
+    from app.user_data import start_bcrypt_calibration
+    start_bcrypt_calibration()
+
     try:
-        # Start app blocking service
-        start_app_blocking()
-        
-        # Register cleanup function
-        atexit.register(stop_app_blocking)
-        
+        # Enforcement lives in the background service, so closing the
+        # window no longer stops app blocking
+        if not ensure_service():
+            print("Warning: AppLocker service is not running; apps are not being blocked.")
+
         if not check_setup():
             print("Setting up AppLocker for first time...")
+            from app.gui import user_setup
             user_setup()  # Setup user 2FA
         else:
             print("AppLocker is running. App blocking is active.")
-        
+
         # After setup, run the unlock app flow
+        from app.auth import unlock_app
         unlock_app()
-        
+
     except KeyboardInterrupt:
-        print("\nShutting down AppLocker...")
-        stop_app_blocking()
+        print("\nClosing AppLocker...")
     except Exception as e:
         print(f"Error: {e}")
-        stop_app_blocking()
+    finally:
+        release_gui_instance()
+
+def main(argv=None):
+    """Entry point for `python main.py` and the `applocker` console script"""
+    argv = sys.argv[1:] if argv is None else argv
+    service = "--service" in argv or "--headless" in argv
+
+    if profiling_requested(argv):
+        argv = [arg for arg in argv if arg != "--profile-startup"]
+        start_startup_profile("service" if service else "cli" if argv else "gui")
+
+    if service:
+        from app.service import run_service
+        run_service()
+        return 0
+
+    if argv:
+        # Subcommands go to the CLI, which never loads Tk or the monitor
+        from app.cli import main as cli_main
+        exit_code = cli_main(argv)
+        mark_startup("command_done", final=True)
+        return exit_code
+
+    run_gui()
+    return 0
+
+# Main entry point
+if __name__ == '__main__':
+    sys.exit(main())
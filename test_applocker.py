@@ -7,20 +7,61 @@ without requiring GUI interaction.
 
 import sys
 import os
+import json
+import tempfile
+import socketserver
+import logging
+import queue
+import threading
+import time
+import functools
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.user_data import hash_pin, verify_pin
-from app.auth import save_pin_to_db, load_user_data, verify_totp
+from app.user_data import (hash_pin, verify_pin, verify_pin_async, get_bcrypt_cost, get_hash_cost,
+                            start_bcrypt_calibration, current_bcrypt_cost)
+from app.config import BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS
+from app.auth import verify_totp
+from app.credentials import CredentialStore
+from app.mail_queue import MailQueue
+from app.otp_store import OTPStore
+from app import audit
+from app.audit import AuditStore
+from app.lock_store import LockStore
+from app.schedule import Schedule, parse_schedule_text
+from app.policy import Policy, hosted_target
+from app.process_manager import ProcessView, AppBlocker, OVERRUNS, RESTARTS
+from app.exe_identity import ExeHashCache, hash_file
+from app.enforcement import Enforcer, Throttler, TokenBucket
+from app.exit_watcher import ExitWatcher, pidfd_supported
+from app.metrics import MetricsRegistry, histogram_quantile, format_monitor_metrics, sample, metric_value
+from app.metrics_server import MetricsServer, parse_address, _collect_mail_metrics
+from app.ipc import IPCServer, request, ServiceError, ServiceUnavailable
+from app.instance import InstanceLock
+from app.cli import build_parser
+from app.profiling import StartupProfiler, MonitorProfiler, monitor_profile_seconds, MONITOR_PROFILE_ENV_VAR
 from app.app_lock import get_installed_apps
-from app.logging import setup_logging, log_event
+from app.logging import setup_logging, log_event, DroppingQueueHandler, EventAggregator
 import pyotp
 
+def with_temp_audit_log(test):
+    """Send the audit records a test triggers to a throwaway store instead of app/data"""
+    @functools.wraps(test)
+    def wrapper():
+        previous = audit.audit_log
+        audit.audit_log = AuditStore(tempfile.mkdtemp())
+        try:
+            return test()
+        finally:
+            audit.audit_log.close()
+            audit.audit_log = previous
+    return wrapper
+
 def test_pin_hashing():
     """Test PIN hashing and verification"""
     print("Testing PIN hashing...")
     
     test_pin = "1234"
-    hashed = hash_pin(test_pin)
+    hashed = hash_pin(test_pin, rounds=4)
     
     # Verify correct PIN
     if verify_pin(hashed, test_pin):
@@ -38,6 +79,72 @@ def test_pin_hashing():
         
     return True
 
+def test_bcrypt_calibration():
+    """Test calibrating the bcrypt cost once and reusing the stored value"""
+    print("Testing bcrypt calibration...")
+    
+    # The benchmark runs in the background; callers meanwhile get None instead of waiting
+    settings_file = os.path.join(tempfile.mkdtemp(), "bcrypt_settings.json")
+    calibration = start_bcrypt_calibration(settings_file)
+    pending = current_bcrypt_cost(settings_file)
+    calibration.join(timeout=30)
+    rounds = current_bcrypt_cost(settings_file)
+    if pending is not None or rounds is None or start_bcrypt_calibration(settings_file) is not None:
+        print(f"❌ Background calibration: FAIL - {pending}, {rounds}")
+        return False
+    with open(settings_file, "r", encoding="utf-8") as file:
+        stored = json.load(file)["rounds"]
+    if stored != rounds or not BCRYPT_MIN_ROUNDS <= rounds <= BCRYPT_MAX_ROUNDS:
+        print(f"❌ bcrypt calibration: FAIL - cost {rounds}, stored {stored}")
+        return False
+    
+    # Another process picks up the stored cost instead of calibrating again
+    other_file = os.path.join(tempfile.mkdtemp(), "bcrypt_settings.json")
+    with open(other_file, "w", encoding="utf-8") as file:
+        json.dump({"rounds": BCRYPT_MAX_ROUNDS}, file)
+    if get_bcrypt_cost(other_file) != BCRYPT_MAX_ROUNDS:
+        print("❌ Stored bcrypt cost: FAIL")
+        return False
+    
+    if get_hash_cost(hash_pin("1234", rounds=4)) != 4:
+        print("❌ bcrypt cost override: FAIL")
+        return False
+    
+    print(f"✅ bcrypt calibration: PASS (cost {rounds})")
+    return True
+
+def test_pin_rehash():
+    """Test transparent re-hashing when the bcrypt cost changes"""
+    print("Testing PIN re-hash...")
+    
+    old_hash = hash_pin("1234", rounds=4)
+    rehashed = []
+    if not verify_pin(old_hash, "1234", on_rehash=rehashed.append, rounds=5):
+        print("❌ PIN re-hash: FAIL - Verification failed")
+        return False
+    if len(rehashed) != 1 or get_hash_cost(rehashed[0]) != 5 or not verify_pin(rehashed[0], "1234"):
+        print("❌ PIN re-hash: FAIL - Hash was not upgraded")
+        return False
+    
+    # Already at the target cost, or a wrong PIN: nothing to re-hash
+    rehashed.clear()
+    verify_pin(old_hash, "1234", on_rehash=rehashed.append, rounds=4)
+    verify_pin(old_hash, "wrong", on_rehash=rehashed.append, rounds=5)
+    if rehashed:
+        print("❌ PIN re-hash: FAIL - Unnecessary re-hash")
+        return False
+    
+    # Verification off the caller's thread
+    results = []
+    verify_pin_async(old_hash, "1234", results.append).join(timeout=10)
+    verify_pin_async(old_hash, "wrong", results.append).join(timeout=10)
+    if results != [True, False]:
+        print(f"❌ Async PIN verification: FAIL - {results}")
+        return False
+    
+    print("✅ PIN re-hash: PASS (cost 4 -> 5)")
+    return True
+
 def test_totp():
     """Test TOTP functionality"""
     print("Testing TOTP...")
@@ -79,13 +186,13 @@ def test_data_persistence():
     """Test data saving and loading"""
     print("Testing data persistence...")
     
-    test_pin = "test123"
-    hashed_pin = hash_pin(test_pin)
     test_secret = pyotp.random_base32()
+    test_email = "test@applocker.com"
+    store = CredentialStore(os.path.join(tempfile.mkdtemp(), "user_data.txt"))
     
     # Save data
     try:
-        save_pin_to_db(hashed_pin, test_secret)
+        store.save(test_secret, test_email)
         print("✅ Data saving: PASS")
     except Exception as e:
         print(f"❌ Data saving: FAIL - {e}")
@@ -93,8 +200,8 @@ def test_data_persistence():
     
     # Load data
     try:
-        loaded_pin, loaded_secret = load_user_data()
-        if loaded_pin and loaded_secret == test_secret:
+        loaded_secret, loaded_email = store.load()
+        if loaded_secret == test_secret and loaded_email == test_email:
             print("✅ Data loading: PASS")
         else:
             print("❌ Data loading: FAIL - Data mismatch")
@@ -105,6 +212,1232 @@ def test_data_persistence():
         
     return True
 
+def test_credential_cache():
+    """Test cached credential loading with change invalidation"""
+    print("Testing credential cache...")
+    
+    path = os.path.join(tempfile.mkdtemp(), "user_data.txt")
+    store = CredentialStore(path)
+    first_secret = pyotp.random_base32()
+    store.save(first_secret, "first@applocker.com")
+    
+    # Repeated loads must not touch the file contents again
+    reads = []
+    original_read = store._read
+    store._read = lambda: reads.append(1) or original_read()
+    for _ in range(100):
+        store.load()
+    if reads:
+        print("❌ Credential cache: FAIL - File re-read without changes")
+        return False
+    
+    # An external write must be picked up
+    second_secret = pyotp.random_base32()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"{second_secret}\nsecond@applocker.com\n")
+    os.utime(path, ns=(0, 1))
+    
+    if store.load() != (second_secret, "second@applocker.com") or len(reads) != 1:
+        print("❌ Credential cache: FAIL - Change not detected")
+        return False
+    
+    if not store.verify_totp(pyotp.TOTP(second_secret).now()):
+        print("❌ Credential cache: FAIL - TOTP not verified against new secret")
+        return False
+    
+    print("✅ Credential cache: PASS")
+    return True
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """Minimal stand-in SMTP server that records sessions and messages"""
+    daemon_threads = True
+    allow_reuse_address = True
+    
+    def __init__(self):
+        self.sessions = 0
+        self.messages = []
+        super().__init__(("127.0.0.1", 0), LocalSMTPHandler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+class LocalSMTPHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.sessions += 1
+        self.wfile.write(b"220 localhost test server\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii", "replace").strip().upper()
+            if command.startswith("DATA"):
+                self.wfile.write(b"354 end with .\r\n")
+                data = b""
+                while not data.endswith(b"\r\n.\r\n"):
+                    data += self.rfile.readline()
+                self.server.messages.append(data)
+                self.wfile.write(b"250 queued\r\n")
+            elif command.startswith("QUIT"):
+                self.wfile.write(b"221 bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 ok\r\n")
+
+def test_mail_queue():
+    """Test queued delivery over a single pooled SMTP session"""
+    print("Testing mail queue...")
+    
+    server = LocalSMTPServer()
+    settings = {
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": server.server_address[1],
+        "SMTP_USE_TLS": False,
+        "EMAIL_PASSWORD": "",
+        "SMTP_TIMEOUT": 5
+    }
+    queue = MailQueue(os.path.join(tempfile.mkdtemp(), "mail_queue.json"), settings=settings)
+    restarted = None
+    
+    try:
+        message_ids = queue.enqueue_many([(f"user{i}@applocker.com", "Test", f"Message {i}")
+                                          for i in range(5)])
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            if all(queue.get_status(m)["status"] == "sent" for m in message_ids):
+                break
+            time.sleep(0.05)
+        else:
+            print("❌ Mail queue: FAIL - Messages not delivered")
+            return False
+        
+        if len(server.messages) != 5 or server.sessions != 1:
+            print(f"❌ Mail queue: FAIL - {len(server.messages)} messages over {server.sessions} sessions")
+            return False
+        
+        # The service exports the totals the GUI's queue persists
+        exported = _collect_mail_metrics(queue.queue_file)
+        if (metric_value(exported, "mail_messages_sent_total"), metric_value(exported, "mail_queue_pending"),
+                metric_value(exported, "mail_smtp_sessions_total")) != (5, 0, 1):
+            print(f"❌ Mail queue metrics: FAIL - {exported}")
+            return False
+        
+        # Messages left by a previous run are sent without a new enqueue, unless their OTP expired
+        queue_file = os.path.join(tempfile.mkdtemp(), "mail_queue.json")
+        leftover = {"status": "queued", "subject": "Test", "body": "Reset", "attempts": 0,
+                    "next_attempt": 0, "error": None, "updated": time.time()}
+        with open(queue_file, "w", encoding="utf-8") as file:
+            json.dump({"messages": [dict(leftover, id="fresh", to="fresh@applocker.com", expires=time.time() + 600),
+                                    dict(leftover, id="stale", to="stale@applocker.com", expires=time.time() - 1)]}, file)
+        restarted = MailQueue(queue_file, settings=settings)
+        deadline = time.time() + 10
+        while restarted.get_status("fresh")["status"] != "sent" and time.time() < deadline:
+            time.sleep(0.05)
+        if restarted.get_status("fresh")["status"] != "sent" or restarted.get_status("stale") is not None \
+                or len(server.messages) != 6:
+            print(f"❌ Mail queue resume: FAIL - {restarted.get_status('fresh')}, {len(server.messages)} messages")
+            return False
+        
+        print("✅ Mail queue: PASS (5 messages, 1 SMTP session, resumed after restart)")
+        return True
+    finally:
+        queue.stop()
+        if restarted is not None:
+            restarted.stop()
+        server.shutdown()
+        server.server_close()
+
+def test_otp_store():
+    """Test OTP expiry, attempt limits and journal persistence"""
+    print("Testing OTP store...")
+    
+    journal = os.path.join(tempfile.mkdtemp(), "reset_otps.jsonl")
+    store = OTPStore(journal, expiry_minutes=15, max_attempts=3)
+    store.save("user@applocker.com", "123456")
+    
+    # Wrong codes count against the limit, then even the right code is refused
+    for _ in range(3):
+        store.verify("user@applocker.com", "000000")
+    if store.verify("user@applocker.com", "123456"):
+        print("❌ OTP attempt limit: FAIL")
+        return False
+    print("✅ OTP attempt limit: PASS")
+    
+    # A fresh OTP resets the counter and can only be used once
+    store.save("user@applocker.com", "654321")
+    if not store.verify("user@applocker.com", "654321") or store.verify("user@applocker.com", "654321"):
+        print("❌ OTP single use: FAIL")
+        return False
+    print("✅ OTP single use: PASS")
+    
+    # State survives a restart
+    store.save("other@applocker.com", "111111")
+    reloaded = OTPStore(journal, expiry_minutes=15, max_attempts=3)
+    if reloaded.verify("user@applocker.com", "654321") or not reloaded.verify("other@applocker.com", "111111"):
+        print("❌ OTP persistence: FAIL")
+        return False
+    print("✅ OTP persistence: PASS")
+    
+    # Expired OTPs are swept
+    expiring = OTPStore(os.path.join(tempfile.mkdtemp(), "reset_otps.jsonl"), expiry_minutes=1 / 600)
+    expiring.save("user@applocker.com", "123456")
+    time.sleep(0.2)
+    if expiring.cleanup() != 1 or expiring.verify("user@applocker.com", "123456"):
+        print("❌ OTP expiry: FAIL")
+        return False
+    print("✅ OTP expiry: PASS")
+    
+    return True
+
+def test_logging_queue():
+    """Test that a full log queue drops records instead of blocking"""
+    print("Testing logging queue...")
+    
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    logger = logging.getLogger("applocker.test.queue")
+    logger.propagate = False
+    logger.addHandler(handler)
+    
+    start = time.perf_counter()
+    for i in range(5):
+        logger.error("Record %d", i)
+    elapsed = time.perf_counter() - start
+    logger.removeHandler(handler)
+    
+    if handler.dropped != 3 or handler.queue.get_nowait().msg != "Record 0" or elapsed >= 1:
+        print(f"❌ Logging queue: FAIL - {handler.dropped} records dropped")
+        return False
+    
+    # Tracebacks are rendered into the queued copy, the caller's record is left alone
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logger.makeRecord(logger.name, logging.ERROR, __file__, 0, "Failed %s", ("task",), sys.exc_info())
+    queued = DroppingQueueHandler(queue.Queue()).prepare(record)
+    if queued is record or queued.exc_info or "ValueError: boom" not in queued.msg or record.args != ("task",):
+        print(f"❌ Logging queue prepare: FAIL - {queued.msg!r}")
+        return False
+    
+    print("✅ Logging queue: PASS (3 records dropped without blocking)")
+    return True
+
+def test_repeated_events():
+    """Test that repeated monitor events collapse into one summary line"""
+    print("Testing repeated event aggregation...")
+    
+    records = []
+    capture = logging.Handler()
+    capture.emit = records.append
+    root = logging.getLogger()
+    old_level = root.level
+    root.setLevel(logging.INFO)
+    root.addHandler(capture)
+    
+    try:
+        aggregator = EventAggregator(window_seconds=60)
+        for pid in range(100):
+            aggregator.log("Blocked process", app="Chrome", process="chrome.exe", pid=pid)
+        aggregator.log("Blocked process", app="Steam", process="steam.exe", pid=1)
+        aggregator.flush(force=True)
+        aggregator._emit(logging.INFO, "Blocked process", "Steam", {"app": "steam.exe", "pid": 2})
+    finally:
+        root.removeHandler(capture)
+        root.setLevel(old_level)
+    
+    messages = [record.getMessage() for record in records]
+    if (len(messages) == 4 and "repeated 99 more times" in messages[2] and "app=Chrome" in messages[2]
+            and messages[3] == "Blocked process app=Steam pid=2"):
+        print(f"✅ Repeated events: PASS (101 events -> {len(messages) - 1} lines)")
+        return True
+    else:
+        print(f"❌ Repeated events: FAIL - {messages}")
+        return False
+
+def test_audit_store():
+    """Test audit event recording and filtered queries"""
+    print("Testing audit store...")
+    
+    root = tempfile.mkdtemp()
+    store = AuditStore(root)
+    day = 24 * 3600
+    now = time.time()
+    store.record("block", "Chrome", timestamp=now - 3 * day, process="chrome.exe")
+    store.record("unlock", "Chrome", timestamp=now - 2 * day, duration_minutes=60)
+    store.record("block", "Steam", timestamp=now - day, process="steam.exe")
+    store.record("master_key_used", timestamp=now)
+    store.close()
+    
+    # A fresh instance must answer from the persisted segments and index
+    store = AuditStore(root)
+    chrome = store.query(app="Chrome")
+    blocks = store.query(event_type="block")
+    recent = store.query(start=now - 1.5 * day)
+    
+    if [e["type"] for e in chrome] != ["unlock", "block"]:
+        print(f"❌ Audit app filter: FAIL - {chrome}")
+        return False
+    if [e["app"] for e in blocks] != ["Steam", "Chrome"]:
+        print(f"❌ Audit type filter: FAIL - {blocks}")
+        return False
+    if len(recent) != 2 or store.count(app="Chrome") != 2:
+        print(f"❌ Audit time filter: FAIL - {recent}")
+        return False
+    
+    # The GUI and the service append to the same segment; each sees the other's events
+    service = AuditStore(root)
+    service.query()
+    store.record("auth_success")
+    service.record("block", "Discord", process="discord.exe")
+    if len(service.query(event_type="auth_success")) != 1 or len(store.query(app="Discord")) != 1:
+        print("❌ Audit shared segments: FAIL")
+        return False
+    if store.count() != 6 or service.count() != 6:
+        print(f"❌ Audit shared counts: FAIL - {store.count()}, {service.count()}")
+        return False
+    store.close()
+    service.close()
+    
+    print("✅ Audit store: PASS")
+    return True
+
+def test_lock_store():
+    """Test locked apps persistence and change detection"""
+    print("Testing lock store...")
+    
+    path = os.path.join(tempfile.mkdtemp(), "locked_apps.json")
+    store = LockStore(path)
+    store.set_locked("Chrome")
+    store.set_locked("Steam")
+    store.set_locked("Steam", False)
+    
+    # A second instance stands in for another process writing the file
+    other = LockStore(path)
+    if other.locked_apps() != ["Chrome"] or not other.contains("Steam"):
+        print(f"❌ Lock store reload: FAIL - {other.all()}")
+        return False
+    
+    other.remove("Chrome")
+    if store.is_locked("Chrome") or store.all() != {"Steam": False}:
+        print(f"❌ Lock store change detection: FAIL - {store.all()}")
+        return False
+    
+    # Deleting the file (a reset) unlocks everything for a running service
+    store.set_locked("Chrome")
+    store.locked_apps()
+    version = store.version
+    os.remove(path)
+    if store.locked_apps() != [] or store.version == version:
+        print(f"❌ Lock store deletion: FAIL - {store.locked_apps()}")
+        return False
+    
+    # Temporary unlocks survive a restart (a new instance) and re-lock once due
+    store.set_locked("Chrome", action="throttle")
+    store.set_locked("Chrome", False, relock_at=time.time() + 60)
+    store.set_locked("Steam", False, relock_at=time.time() - 1)
+    restarted = LockStore(path)
+    if set(restarted.unlocks()) != {"Chrome", "Steam"} or restarted.relock_due(time.time()) != ["Steam"]:
+        print(f"❌ Temporary unlock persistence: FAIL - {restarted.unlocks()}")
+        return False
+    if (restarted.relock_due(time.time() + 61) != ["Chrome"] or restarted.unlocks()
+            or store.locked_apps() != ["Chrome", "Steam"] or store.actions() != {"Chrome": "throttle"}):
+        print(f"❌ Re-lock: FAIL - {store.all()}")
+        return False
+    
+    print("✅ Lock store: PASS")
+    return True
+
+@with_temp_audit_log
+def test_lock_authentication():
+    """Test that unlocking or loosening a lock needs a 2FA code in the service"""
+    print("Testing lock authentication...")
+    
+    from app import service
+    store = LockStore(os.path.join(tempfile.mkdtemp(), "locked_apps.json"))
+    store.set_locked("Chrome", schedule=parse_schedule_text("mon-fri 09:00-17:00"))
+    store.set_locked("Steam")
+    store.set_locked("Notes", False)
+    
+    loosening = [
+        store.would_weaken("Chrome", schedule=parse_schedule_text("mon 03:00-03:01")),
+        store.would_weaken("Steam", rules=[{"name": "nothing"}]),
+        store.would_weaken("Steam", action="throttle"),
+        store.would_weaken("Steam", remove=True)
+    ]
+    tightening = [
+        store.would_weaken("Chrome", schedule=[]),
+        store.would_weaken("Steam", action="kill"),
+        store.would_weaken("Steam"),
+        store.would_weaken("Notes", rules=[{"name": "notes"}]),
+        store.would_weaken("Discord", remove=True)
+    ]
+    if not all(loosening) or any(tightening):
+        print(f"❌ Lock weakening: FAIL - {loosening}, {tightening}")
+        return False
+    
+    for code in (None, "not-a-code"):
+        try:
+            service.unlock("Chrome", 1, code=code)
+            print(f"❌ Service unlock without a valid code: FAIL - {code}")
+            return False
+        except PermissionError:
+            pass
+    
+    print("✅ Lock authentication: PASS")
+    return True
+
+def test_lock_schedule():
+    """Test scheduled locks and transition times"""
+    print("Testing lock schedules...")
+    
+    from datetime import datetime
+    work = Schedule(parse_schedule_text("mon-fri 09:00-17:00"))
+    night = Schedule(parse_schedule_text("sun 22:00-06:00"))
+    monday = datetime(2026, 10, 19, 8, 30)  # A Monday
+    
+    if work.is_active(monday) or not work.is_active(monday.replace(hour=9)):
+        print("❌ Schedule lookup: FAIL")
+        return False
+    if work.next_transition(monday) != monday.replace(hour=9, minute=0):
+        print(f"❌ Schedule transition: FAIL - {work.next_transition(monday)}")
+        return False
+    # Friday 17:00 -> next Monday 09:00
+    if work.next_transition(datetime(2026, 10, 23, 17, 0)) != datetime(2026, 10, 26, 9, 0):
+        print("❌ Schedule weekend transition: FAIL")
+        return False
+    # Overnight window spills into Monday morning
+    if not night.is_active(datetime(2026, 10, 19, 5, 0)) or night.is_active(datetime(2026, 10, 19, 7, 0)):
+        print("❌ Overnight schedule: FAIL")
+        return False
+    
+    store = LockStore(os.path.join(tempfile.mkdtemp(), "locked_apps.json"))
+    store.set_locked("Steam", schedule=parse_schedule_text("mon-fri 09:00-17:00"))
+    store.set_locked("Chrome")
+    store.set_locked("Steam", False)  # Temporary unlock keeps the schedule
+    store.set_locked("Steam", True)
+    if store.locked_apps(monday) != ["Chrome"] or store.locked_apps(monday.replace(hour=10)) != ["Steam", "Chrome"]:
+        print(f"❌ Scheduled lock store: FAIL - {store.locked_apps(monday)}")
+        return False
+    
+    print("✅ Lock schedules: PASS")
+    return True
+
+class FakeProcess:
+    """Stand-in for a process view in policy tests"""
+    
+    def __init__(self, name, exe="", cmdline="", parent="", user="", sha256=""):
+        self.name = name.lower()
+        self._facts = {"exe": exe.replace("\\", "/").lower(), "cmdline": cmdline, "parent": parent, "user": user,
+                       "script": hosted_target(cmdline.split()), "sha256": sha256}
+        self.fetched = []
+    
+    def __getattr__(self, fact):
+        def fetch():
+            self.fetched.append(fact)
+            return self._facts[fact]
+        return fetch
+
+def test_policy_rules():
+    """Test compiled lock rules and legacy name matching"""
+    print("Testing lock policy rules...")
+    
+    policy = Policy(["Google Chrome", "Steam", "Work Browser"], {
+        "Steam": [{"exe": "C:/Games/*/steam.exe"}, {"name": "steamwebhelper(64)?\\.exe"}],
+        "Work Browser": [{"name": "firefox\\.exe", "cmdline": "-P work", "user": "alice"}]
+    })
+    
+    cases = [
+        (FakeProcess("chrome.exe"), "Google Chrome"),
+        (FakeProcess("steam.exe", exe="C:\\Games\\Steam\\steam.exe"), "Steam"),
+        (FakeProcess("steam.exe", exe="D:/Other/steam.exe"), None),
+        (FakeProcess("steamwebhelper64.exe"), "Steam"),
+        (FakeProcess("firefox.exe", cmdline="firefox -P work", user="desktop\\alice"), "Work Browser"),
+        (FakeProcess("firefox.exe", cmdline="firefox -P home", user="alice"), None)
+    ]
+    for process, expected in cases:
+        if policy.decide(process) != expected:
+            print(f"❌ Policy decision for {process.name}: FAIL - expected {expected}")
+            return False
+    
+    # A process name that differs from its file name (truncated or renamed) still hits exe globs
+    if policy.decide(FakeProcess("steam-runtime", exe="C:/Games/Steam/steam.exe")) != "Steam":
+        print("❌ Exe glob behind a different process name: FAIL")
+        return False
+    
+    # Unrelated processes only cost the executable path, and nothing at all without exe rules
+    unrelated = FakeProcess("explorer.exe", exe="C:/Windows/explorer.exe")
+    policy.decide(unrelated)
+    if unrelated.fetched != ["exe"]:
+        print(f"❌ Policy lazy lookups: FAIL - fetched {unrelated.fetched}")
+        return False
+    unrelated = FakeProcess("explorer.exe")
+    Policy(["Google Chrome"], {"Google Chrome": [{"name": "chrome\\.exe"}]}).decide(unrelated)
+    if unrelated.fetched:
+        print(f"❌ Policy lazy lookups without exe rules: FAIL - fetched {unrelated.fetched}")
+        return False
+    
+    print("✅ Lock policy rules: PASS")
+    return True
+
+def test_interpreter_matching():
+    """Test matching scripts and jars run by interpreters"""
+    print("Testing interpreter-hosted apps...")
+    
+    if (hosted_target(["java", "-Xmx2G", "-cp", "lib", "-jar", "C:\\Games\\Minecraft.jar"]) != "c:/games/minecraft.jar"
+            or hosted_target(["python3", "-u", "-m", "http.server"]) != "http.server"
+            or hosted_target(["python", "-c", "print(1)"]) != ""):
+        print("❌ Hosted target parsing: FAIL")
+        return False
+    
+    policy = Policy(["Minecraft", "Toolbox"], {
+        "Minecraft": [{"script": "minecraft*.jar"}],
+        "Toolbox": [{"cmdline": "toolbox\\.py"}]
+    })
+    cases = [
+        (FakeProcess("javaw.exe", cmdline="javaw -jar C:/Games/Minecraft.jar"), "Minecraft"),
+        (FakeProcess("python3", cmdline="python3 /opt/toolbox.py"), "Toolbox"),
+        (FakeProcess("node", cmdline="node /srv/app.js"), None)
+    ]
+    for process, expected in cases:
+        if policy.decide(process) != expected:
+            print(f"❌ Interpreter decision for {process.name}: FAIL - expected {expected}")
+            return False
+    
+    # Command lines are only read for interpreters: an editor opening the jar is left alone
+    for other in (FakeProcess("vim", cmdline="vim /home/u/minecraft-launcher.jar"),
+                  FakeProcess("notepad.exe", cmdline="notepad toolbox.py")):
+        if policy.decide(other) is not None or other.fetched:
+            print(f"❌ Non-interpreter lookups: FAIL - fetched {other.fetched}")
+            return False
+    
+    # ...unless the rule pins the process name, e.g. a browser profile
+    profiles = Policy(["Work Chrome"], {"Work Chrome": [{"name": "chrome\\.exe", "cmdline": "--profile-directory=Work"}]})
+    if (profiles.decide(FakeProcess("chrome.exe", cmdline="chrome.exe --profile-directory=Work")) != "Work Chrome"
+            or profiles.decide(FakeProcess("chrome.exe", cmdline="chrome.exe --profile-directory=Home"))):
+        print("❌ Name-pinned command line rule: FAIL")
+        return False
+    
+    # Absolute script globs match Windows paths as written; bare names match in any folder
+    games = Policy(["Games"], {"Games": [{"script": "C:\\Games\\*.jar"}, {"script": "launcher.py"}]})
+    cases = [
+        (FakeProcess("java.exe", cmdline="java.exe -jar C:\\Games\\mc.jar"), "Games"),
+        (FakeProcess("java.exe", cmdline="java.exe -jar D:\\Games\\mc.jar"), None),
+        (FakeProcess("python.exe", cmdline="python.exe launcher.py"), "Games"),
+        (FakeProcess("python3", cmdline="python3 /opt/tools/launcher.py"), "Games")
+    ]
+    for process, expected in cases:
+        if games.decide(process) != expected:
+            print(f"❌ Script path glob for {process._facts['cmdline']}: FAIL - expected {expected}")
+            return False
+    
+    # Display-name locks also match the script an interpreter runs
+    legacy = Policy(["Minecraft Launcher"])
+    if legacy.decide(FakeProcess("java", cmdline="java -jar /home/a/minecraft.jar")) != "Minecraft Launcher":
+        print("❌ Interpreter display-name match: FAIL")
+        return False
+    
+    # The argv of a process is fetched once per (pid, create_time)
+    class CountingProcess:
+        calls = 0
+        def cmdline(self):
+            CountingProcess.calls += 1
+            return ["python3", "/opt/toolbox.py"]
+    cache, process = {}, CountingProcess()
+    for _ in range(3):
+        policy.decide(ProcessView(process, "python3", 42, (42, 1.0), cache))
+    if CountingProcess.calls != 1:
+        print(f"❌ Command line cache: FAIL - fetched {CountingProcess.calls} times")
+        return False
+    
+    print("✅ Interpreter-hosted apps: PASS")
+    return True
+
+def test_exe_hashing():
+    """Test executable hashing, its cache and hash rules"""
+    print("Testing executable identity...")
+    
+    temp_dir = tempfile.mkdtemp()
+    exe_path = os.path.join(temp_dir, "game.exe")
+    journal = os.path.join(temp_dir, "exe_hashes.jsonl")
+    with open(exe_path, "wb") as file:
+        file.write(os.urandom(3 * 1024 * 1024 + 17))  # Several chunks plus a tail
+    
+    cache = ExeHashCache(journal)
+    first = cache.digest(exe_path)
+    if first != hash_file(exe_path) or cache.digest(exe_path) != first or cache.hashed != 1:
+        print(f"❌ Hash cache: FAIL - hashed {cache.hashed} times")
+        return False
+    
+    # A restart reuses the journal instead of re-reading the binary
+    reloaded = ExeHashCache(journal)
+    if reloaded.digest(exe_path) != first or reloaded.hashed != 0:
+        print("❌ Hash journal: FAIL")
+        return False
+    
+    # A new version of the binary is hashed again
+    with open(exe_path, "ab") as file:
+        file.write(b"patch")
+    if reloaded.digest(exe_path) == first or reloaded.hashed != 1:
+        print("❌ Hash invalidation: FAIL")
+        return False
+    
+    policy = Policy(["Game"], {"Game": [{"hash": first.upper()}]})
+    renamed = FakeProcess("notgame.exe", sha256=first)
+    if policy.decide(renamed) != "Game" or policy.decide(FakeProcess("other.exe", sha256="0" * 64)) is not None:
+        print("❌ Hash rule: FAIL")
+        return False
+    
+    # Out of hashing time, only cached digests are used and the process waits for the next scan
+    fresh_path = os.path.join(temp_dir, "fresh.exe")
+    with open(fresh_path, "wb") as file:
+        file.write(b"fresh")
+    if reloaded.digest(fresh_path, hash_new=False) is not None or reloaded.digest(exe_path, hash_new=False) is None:
+        print("❌ Hash budget: FAIL - cache lookup")
+        return False
+    class Executable:
+        def exe(self):
+            return fresh_path
+    late = ProcessView(Executable(), "fresh.exe", hash_deadline=time.monotonic() - 1)
+    if policy.decide(late) is not None or not late.deferred:
+        print("❌ Hash budget: FAIL - hashed past the deadline")
+        return False
+    
+    # Without hash rules nothing is hashed
+    plain = FakeProcess("other.exe")
+    Policy(["Game"], {"Game": [{"name": "game\\.exe"}]}).decide(plain)
+    if "sha256" in plain.fetched:
+        print("❌ Hash laziness: FAIL")
+        return False
+    
+    print("✅ Executable identity: PASS")
+    return True
+
+@with_temp_audit_log
+def test_suspend_enforcement():
+    """Test suspending a locked app's process tree and resuming it"""
+    print("Testing suspend enforcement...")
+    import subprocess
+    import psutil
+    
+    # A parent with one child, both sleeping
+    child_code = "import time; time.sleep(30)"
+    parent_code = f"import subprocess, sys, time; subprocess.Popen([sys.executable, '-c', {child_code!r}]); time.sleep(30)"
+    parent = subprocess.Popen([sys.executable, "-c", parent_code])
+    try:
+        process = psutil.Process(parent.pid)
+        deadline = time.time() + 5
+        while not process.children() and time.time() < deadline:
+            time.sleep(0.05)
+        tree = [process] + process.children(recursive=True)
+        
+        def all_stopped(expected=True):
+            # Signals are delivered asynchronously; give the kernel a moment
+            deadline = time.time() + 2
+            while time.time() < deadline:
+                stopped = all(member.status() == psutil.STATUS_STOPPED for member in tree)
+                if stopped == expected:
+                    return stopped
+                time.sleep(0.01)
+            return not expected
+        
+        enforcer = Enforcer(mode="suspend", suspend_timeout=60)
+        if enforcer.enforce(process, "Sleeper") != "suspend" or enforcer.enforce(process, "Sleeper") is not None:
+            print("❌ Suspend action: FAIL")
+            return False
+        if enforcer.suspended_counts() != {"Sleeper": len(tree)} or (sys.platform != "win32" and not all_stopped()):
+            print(f"❌ Suspend tree: FAIL - {enforcer.suspended_counts()}")
+            return False
+        
+        start = time.perf_counter()
+        resumed = enforcer.resume("Sleeper")
+        resume_ms = (time.perf_counter() - start) * 1000
+        if resumed != len(tree) or enforcer.suspended_counts() or (sys.platform != "win32" and all_stopped(False)):
+            print("❌ Resume: FAIL")
+            return False
+        
+        # Trees left suspended past the timeout are terminated
+        enforcer.enforce(process, "Sleeper")
+        enforcer.expire(now=time.time() + 61)
+        gone, alive = psutil.wait_procs(tree, timeout=5)
+        if alive:
+            print(f"❌ Suspend timeout: FAIL - {len(alive)} still running")
+            return False
+    finally:
+        try:
+            for member in psutil.Process(parent.pid).children(recursive=True):
+                member.kill()
+        except psutil.NoSuchProcess:
+            pass
+        parent.kill()
+        parent.wait()
+    
+    # A tree suspended later gets its own grace period, not the first tree's
+    enforcer = Enforcer(mode="suspend", suspend_timeout=1, watcher=None)
+    first, second = FakeTarget(4001), FakeTarget(4002)
+    enforcer.enforce(first, "Sleeper")
+    time.sleep(0.5)
+    enforcer.enforce(second, "Sleeper")
+    enforcer.expire(now=time.time() + 0.6)
+    if "terminate" not in first.actions or "terminate" in second.actions or enforcer.suspended_counts() != {"Sleeper": 1}:
+        print(f"❌ Per-tree suspend timeout: FAIL - {first.actions}, {second.actions}")
+        return False
+    
+    print(f"✅ Suspend enforcement: PASS ({len(tree)} processes resumed in {resume_ms:.1f} ms)")
+    return True
+
+def test_throttle_enforcement():
+    """Test throttling a locked app and restoring it"""
+    print("Testing throttle enforcement...")
+    import subprocess
+    import psutil
+    
+    store = LockStore(os.path.join(tempfile.mkdtemp(), "locked_apps.json"))
+    store.set_locked("Game", action="throttle")
+    store.set_locked("Game", schedule=[{"days": ["mon"], "start": "09:00", "end": "10:00"}])
+    if store.actions() != {"Game": "throttle"}:
+        print("❌ Lock action persistence: FAIL")
+        return False
+    try:
+        store.set_locked("Game", action="explode")
+        print("❌ Lock action validation: FAIL")
+        return False
+    except ValueError:
+        pass
+    
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        process = psutil.Process(child.pid)
+        throttler = Throttler(cgroup=None)  # Never touch the real cgroup tree from tests
+        has_affinity = hasattr(process, "cpu_affinity")
+        affinity = process.cpu_affinity() if has_affinity else None
+        
+        if not throttler.throttle(process, "Game") or throttler.throttle(process, "Game"):
+            print("❌ Throttle bookkeeping: FAIL")
+            return False
+        if not sys.platform.startswith("win") and process.nice() != 19:
+            print(f"❌ Throttle priority: FAIL - nice {process.nice()}")
+            return False
+        if has_affinity and len(process.cpu_affinity()) != 1:
+            print(f"❌ Throttle affinity: FAIL - {process.cpu_affinity()}")
+            return False
+        
+        if throttler.release("Game") != 1 or throttler.counts():
+            print("❌ Throttle release: FAIL")
+            return False
+        if has_affinity and process.cpu_affinity() != affinity:
+            print("❌ Affinity restore: FAIL")
+            return False
+    finally:
+        child.kill()
+        child.wait()
+    
+    print("✅ Throttle enforcement: PASS")
+    return True
+
+class FakeTarget:
+    """Stand-in for a psutil.Process in enforcement tests"""
+    
+    def __init__(self, pid, name="app.exe", parent=None):
+        self.pid = pid
+        self._name = name
+        self._parent = parent
+        self._created = time.time()
+        self.actions = []
+    
+    def create_time(self):
+        return self._created
+    
+    def name(self):
+        return self._name
+    
+    def exe(self):
+        return f"/opt/{self._name}"
+    
+    def parent(self):
+        return self._parent
+    
+    def children(self, recursive=False):
+        return []
+    
+    def __getattr__(self, action):
+        if action in ("terminate", "kill", "suspend", "resume"):
+            return lambda: self.actions.append(action)
+        raise AttributeError(action)
+
+@with_temp_audit_log
+def test_respawn_backoff():
+    """Test escalation and rate limits for apps that keep relaunching"""
+    print("Testing respawn backoff...")
+    
+    launcher = FakeTarget(100, "launcher.exe")
+    enforcer = Enforcer(mode="kill", watcher=None)  # Fake pids must never be signalled for real
+    for pid in range(1000, 1008):
+        enforcer.begin_tick()  # Each relaunch is found by a later scan
+        enforcer.enforce(FakeTarget(pid, parent=launcher), "Game")
+        launches = pid - 999
+        if launches == 3 and launcher.actions != ["suspend"]:
+            print(f"❌ Launcher suspend: FAIL - {launcher.actions}")
+            return False
+        if launches == 5 and ("terminate" not in launcher.actions or enforcer.suspended_counts().get("Game")):
+            print(f"❌ Tree kill: FAIL - {launcher.actions}, {enforcer.suspended_counts()}")
+            return False
+    if enforcer.quarantined_app("/opt/app.exe") != "Game":
+        print("❌ Quarantine: FAIL")
+        return False
+    
+    # One launch of a multi-process app is not a relaunch storm
+    ide = FakeTarget(300, "code.exe")
+    browser = FakeTarget(3000, "chrome.exe", parent=ide)
+    enforcer.begin_tick()
+    enforcer.enforce(browser, "Browser")
+    for pid in range(3001, 3013):
+        enforcer.enforce(FakeTarget(pid, "chrome.exe", parent=browser), "Browser")
+    enforcer.begin_tick()  # A helper spawned while the browser was dying
+    enforcer.enforce(FakeTarget(3013, "chrome.exe", parent=browser), "Browser")
+    if ide.actions or enforcer.quarantined_app("/opt/chrome.exe") is not None:
+        print(f"❌ Multi-process launch: FAIL - {ide.actions}")
+        return False
+    
+    # Shells and desktop processes are never treated as launchers
+    shell = FakeTarget(200, "explorer.exe")
+    for pid in range(2000, 2010):
+        enforcer.begin_tick()
+        enforcer.enforce(FakeTarget(pid, "tool.exe", parent=shell), "Tool")
+    if shell.actions:
+        print(f"❌ Protected parent: FAIL - {shell.actions}")
+        return False
+    
+    enforcer.release("Game")
+    if enforcer.quarantined_app("/opt/app.exe") is not None:
+        print("❌ Quarantine release: FAIL")
+        return False
+    
+    bucket = TokenBucket(rate=0, burst=3)
+    if [bucket.take() for _ in range(4)] != [True, True, True, False]:
+        print("❌ Enforcement rate limit: FAIL")
+        return False
+    
+    if enforcer.should_notify("Chat") != (True, 1) or enforcer.should_notify("Chat") != (False, 1):
+        print("❌ Notification throttling: FAIL")
+        return False
+    
+    print("✅ Respawn backoff: PASS")
+    return True
+
+def test_exit_watcher():
+    """Test exit confirmation and SIGKILL of processes that ignore terminate"""
+    print("Testing exit watcher...")
+    import signal
+    import subprocess
+    import psutil
+    
+    stubborn_code = "import signal, sys, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); print('ready', flush=True); time.sleep(30)"
+    modes = [True, False] if pidfd_supported() else [False]
+    for use_pidfd in modes:
+        polite = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+        stubborn = subprocess.Popen([sys.executable, "-c", stubborn_code], stdout=subprocess.PIPE)
+        stubborn.stdout.readline()  # SIGTERM is ignored from here on
+        watcher = ExitWatcher(grace=0.3, use_pidfd=use_pidfd)
+        try:
+            for child in (polite, stubborn):
+                process = psutil.Process(child.pid)
+                process.terminate()
+                watcher.watch(process, "Test")
+            watcher.watch(psutil.Process(stubborn.pid), "Test")  # Signalled twice, tracked once
+            
+            deadline = time.time() + 5
+            while watcher.pending_count() and time.time() < deadline:
+                polite.poll()
+                stubborn.poll()  # Reap, as the owning process would
+                time.sleep(0.02)
+            if (watcher.confirmed, watcher.stragglers, watcher.lost) != (2, 1, 0):
+                print(f"❌ Exit watcher ({'pidfd' if use_pidfd else 'fallback'}): FAIL - "
+                      f"confirmed {watcher.confirmed}, stragglers {watcher.stragglers}, lost {watcher.lost}")
+                return False
+        finally:
+            watcher.stop()
+            for child in (polite, stubborn):
+                child.kill()
+                child.wait()
+    
+    print(f"✅ Exit watcher: PASS ({'pidfd + fallback' if len(modes) == 2 else 'fallback'}, "
+          f"slowest exit {max(watcher.latencies) * 1000:.0f} ms)")
+    return True
+
+def test_monitor_watchdog():
+    """Test tick overrun counting and restarting a wedged monitor"""
+    print("Testing monitor watchdog...")
+    
+    blocker = AppBlocker(show_notifications=False, interval=0.05, tick_budget=0.1, stall_seconds=0.5)
+    release = threading.Event()
+    calls = []
+    
+    def fake_tick(generation):
+        calls.append(threading.current_thread().name)
+        if len(calls) == 1:
+            time.sleep(0.2)  # Over budget
+        elif len(calls) == 2:
+            release.wait(10)  # Wedged, e.g. in a blocking call
+    
+    blocker._tick = fake_tick
+    overruns, restarts = OVERRUNS.value(), RESTARTS.value()
+    blocker.start_monitoring()
+    try:
+        wedged = blocker.monitor_thread
+        deadline = time.time() + 5
+        while RESTARTS.value() == restarts and time.time() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.3)  # Let the new worker tick
+        
+        if OVERRUNS.value() != overruns + 1:
+            print(f"❌ Tick overruns: FAIL - {OVERRUNS.value() - overruns}")
+            return False
+        if RESTARTS.value() != restarts + 1 or blocker.monitor_thread is wedged or len(set(calls)) != 2:
+            print(f"❌ Stall restart: FAIL - {RESTARTS.value() - restarts} restarts, {set(calls)}")
+            return False
+        
+        release.set()
+        wedged.join(timeout=2)
+        if wedged.is_alive():
+            print("❌ Stale worker exit: FAIL")
+            return False
+    finally:
+        release.set()
+        blocker.stop_monitoring()
+    
+    # A scan that outlived its worker must not overwrite the new worker's state
+    blocker = AppBlocker(show_notifications=False)
+    blocker._get_locked_apps = lambda: []
+    blocker._get_policy = lambda: Policy([])
+    blocker._generation = 2
+    blocker._decisions = stale = {"newer": None}
+    blocker._tick(1)
+    if blocker._decisions is not stale:
+        print("❌ Stale scan state: FAIL")
+        return False
+    blocker._tick(2)
+    if blocker._decisions is stale or not blocker._decisions:
+        print("❌ Current scan state: FAIL")
+        return False
+    
+    print(f"✅ Monitor watchdog: PASS ({len(calls)} ticks across 2 workers)")
+    return True
+
+def test_metrics_registry():
+    """Test counters, gauges and fixed-bucket histograms"""
+    print("Testing metrics registry...")
+    
+    registry = MetricsRegistry()
+    actions = registry.counter("monitor_enforcement_actions_total")
+    actions.inc(action="kill")
+    actions.inc(2, action="kill")
+    actions.inc(action="suspend")
+    registry.gauge("monitor_processes").set(250)
+    scan = registry.histogram("monitor_scan_seconds", buckets=(0.01, 0.1, 1))
+    for seconds in (0.005, 0.005, 0.05, 0.5, 5):
+        scan.observe(seconds)
+    
+    if registry.counter("monitor_enforcement_actions_total") is not actions or actions.value(action="kill") != 3:
+        print("❌ Counter labels: FAIL")
+        return False
+    try:
+        registry.gauge("monitor_scan_seconds")
+        print("❌ Metric type conflict: FAIL")
+        return False
+    except ValueError:
+        pass
+    
+    snapshot = registry.snapshot()
+    histogram = snapshot["monitor_scan_seconds"]
+    if histogram["counts"] != [2, 1, 1, 1] or histogram["count"] != 5:
+        print(f"❌ Histogram buckets: FAIL - {histogram['counts']}")
+        return False
+    if histogram_quantile(histogram, 0.5) != 0.1 or histogram_quantile(histogram, 1.0) != float("inf"):
+        print("❌ Histogram quantile: FAIL")
+        return False
+    
+    lines = format_monitor_metrics(snapshot)
+    if "250 running" not in lines[1] or "kill 3, suspend 1" not in lines[2]:
+        print(f"❌ Metrics summary: FAIL - {lines}")
+        return False
+    
+    print("✅ Metrics registry: PASS")
+    return True
+
+def test_metrics_endpoint():
+    """Test the Prometheus endpoint with a plain HTTP client"""
+    print("Testing metrics endpoint...")
+    import urllib.request
+    import urllib.error
+    
+    registry = MetricsRegistry()
+    registry.counter("monitor_enforcement_actions_total", "Actions").inc(action="kill")
+    registry.histogram("monitor_scan_seconds", "Scan time", buckets=(0.01, 0.1)).observe(0.05)
+    registry.add_collector(lambda: {"mail_queue_pending": sample("gauge", "Pending mail", 2)})
+    
+    try:
+        parse_address("0.0.0.0:9464")
+        print("❌ Endpoint bind check: FAIL")
+        return False
+    except ValueError:
+        pass
+    
+    server = MetricsServer("127.0.0.1:0", registry)
+    server.start()
+    try:
+        with urllib.request.urlopen(server.url, timeout=5) as response:
+            content_type = response.headers["Content-Type"]
+            body = response.read().decode("utf-8")
+        expected = [
+            "# TYPE monitor_enforcement_actions_total counter",
+            'monitor_enforcement_actions_total{action="kill"} 1',
+            'monitor_scan_seconds_bucket{le="0.01"} 0',
+            'monitor_scan_seconds_bucket{le="0.1"} 1',
+            'monitor_scan_seconds_bucket{le="+Inf"} 1',
+            "monitor_scan_seconds_count 1",
+            "mail_queue_pending 2"
+        ]
+        missing = [line for line in expected if line not in body.splitlines()]
+        if missing or not content_type.startswith("text/plain"):
+            print(f"❌ Metrics exposition: FAIL - missing {missing}")
+            return False
+        
+        try:
+            urllib.request.urlopen(server.url.replace("/metrics", "/other"), timeout=5)
+            print("❌ Unknown path: FAIL")
+            return False
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                raise
+    finally:
+        server.stop()
+    
+    print("✅ Metrics endpoint: PASS")
+    return True
+
+def test_ipc_roundtrip():
+    """Test a request/response round trip over the local IPC channel"""
+    print("Testing IPC channel...")
+    
+    if sys.platform.startswith("win"):
+        address = rf"\\.\pipe\AppLocker-test-{os.getpid()}"
+    else:
+        address = os.path.join(tempfile.mkdtemp(), "test.sock")
+    
+    def fail():
+        raise ValueError("boom")
+    
+    key_file = os.path.join(tempfile.mkdtemp(), "ipc.key")
+    server = IPCServer({"echo": lambda **args: args, "fail": fail}, address, key_file)
+    server.start()
+    stalled = []
+    try:
+        if not sys.platform.startswith("win"):
+            # Clients that connect and never answer the handshake must not block others
+            import socket
+            for _ in range(3):
+                sock = socket.socket(socket.AF_UNIX)
+                sock.connect(address)
+                stalled.append(sock)
+        started = time.monotonic()
+        if request("echo", address=address, key_file=key_file, app="Chrome", minutes=5) != {"app": "Chrome", "minutes": 5}:
+            print("❌ IPC echo: FAIL")
+            return False
+        if time.monotonic() - started > 1:
+            print("❌ IPC stalled clients: FAIL - blocked the accept loop")
+            return False
+        try:
+            request("fail", address=address, key_file=key_file)
+            print("❌ IPC error reply: FAIL - no error raised")
+            return False
+        except ServiceError:
+            pass
+    finally:
+        for sock in stalled:
+            sock.close()
+        server.stop()
+    
+    if not sys.platform.startswith("win"):
+        # A service that accepts but never answers is bounded by the timeout
+        import socket
+        silent_address = os.path.join(tempfile.mkdtemp(), "silent.sock")
+        silent = socket.socket(socket.AF_UNIX)
+        silent.bind(silent_address)
+        silent.listen(1)
+        started = time.monotonic()
+        try:
+            request("ping", address=silent_address, timeout=0.5, key_file=key_file)
+            print("❌ IPC handshake timeout: FAIL - no error raised")
+            return False
+        except ServiceUnavailable:
+            pass
+        finally:
+            silent.close()
+        if time.monotonic() - started > 2:
+            print("❌ IPC handshake timeout: FAIL - not bounded")
+            return False
+    
+    try:
+        request("echo", address=address, timeout=1, key_file=key_file)
+        print("❌ IPC stopped server: FAIL - still answering")
+        return False
+    except ServiceUnavailable:
+        pass
+    
+    print("✅ IPC channel: PASS")
+    return True
+
+def test_instance_lock():
+    """Test that only one instance can hold the lock at a time"""
+    print("Testing single-instance lock...")
+    
+    path = os.path.join(tempfile.mkdtemp(), "gui.lock")
+    first, second = InstanceLock("gui"), InstanceLock("gui")
+    first.path = second.path = path
+    
+    if not first.acquire() or second.acquire():
+        print("❌ Instance lock exclusivity: FAIL")
+        return False
+    
+    first.release()
+    if not second.acquire():
+        print("❌ Instance lock release: FAIL")
+        return False
+    second.release()
+    
+    print("✅ Single-instance lock: PASS")
+    return True
+
+def test_cli_parser():
+    """Test CLI argument parsing"""
+    print("Testing CLI parser...")
+    
+    parser = build_parser()
+    before = parser.parse_args(["--json", "status"])
+    after = parser.parse_args(["unlock", "Chrome", "--minutes", "5", "--json"])
+    plain = parser.parse_args(["events", "--app", "Chrome", "--since", "24"])
+    
+    if not before.json or not after.json or getattr(plain, "json", False):
+        print("❌ CLI --json flag: FAIL")
+        return False
+    if (after.app, after.minutes, plain.since) != ("Chrome", 5, 24.0):
+        print("❌ CLI arguments: FAIL")
+        return False
+    
+    # File errors in the local fallback are reported, not dumped as a traceback
+    import io
+    import contextlib
+    from app import cli
+    def unreadable(args):
+        raise PermissionError("[Errno 13] Permission denied: 'locked_apps.json'")
+    original, cli.cmd_status = cli.cmd_status, unreadable
+    stderr = io.StringIO()
+    try:
+        with contextlib.redirect_stderr(stderr):
+            code = cli.main(["status"])
+    finally:
+        cli.cmd_status = original
+    if code != 1 or not stderr.getvalue().startswith("Error: [Errno 13]"):
+        print(f"❌ CLI file errors: FAIL - {code}, {stderr.getvalue()!r}")
+        return False
+    
+    print("✅ CLI parser: PASS")
+    return True
+
+def test_startup_profiler():
+    """Test per-module import timing and startup marks"""
+    print("Testing startup profiler...")
+    
+    module_dir = tempfile.mkdtemp()
+    with open(os.path.join(module_dir, "applocker_slow_module.py"), "w", encoding="utf-8") as file:
+        file.write("import time\ntime.sleep(0.05)\n")
+    sys.path.insert(0, module_dir)
+    
+    profiler = StartupProfiler("test")
+    profiler.install()
+    try:
+        import applocker_slow_module
+    finally:
+        profiler.uninstall()
+        sys.path.remove(module_dir)
+    profiler.mark("first_window")
+    report = profiler.report()
+    
+    timing = next((m for m in report["modules"] if m["name"] == "applocker_slow_module"), None)
+    if timing is None or timing["self_ms"] < 50:
+        print(f"❌ Import timing: FAIL - {timing}")
+        return False
+    if report["marks"].get("first_window", 0) < 50:
+        print(f"❌ Startup marks: FAIL - {report['marks']}")
+        return False
+    
+    print(f"✅ Startup profiler: PASS ({timing['self_ms']:.0f} ms import recorded)")
+    return True
+
+def test_monitor_profiler():
+    """Test the opt-in monitor loop profiler and its reports"""
+    print("Testing monitor profiler...")
+    
+    os.environ.pop(MONITOR_PROFILE_ENV_VAR, None)
+    if monitor_profile_seconds() != 0:
+        print("❌ Profiling off by default: FAIL")
+        return False
+    os.environ[MONITOR_PROFILE_ENV_VAR] = "1.5"
+    try:
+        seconds = monitor_profile_seconds()
+    finally:
+        os.environ.pop(MONITOR_PROFILE_ENV_VAR)
+    if seconds != 1.5:
+        print(f"❌ Profile duration: FAIL - {seconds}")
+        return False
+    
+    def applocker_profiled_work():
+        return [bytearray(1024) for _ in range(200)]
+    
+    report_dir = tempfile.mkdtemp()
+    profiler = MonitorProfiler(1, report_dir=report_dir)
+    profiler.start()
+    kept = applocker_profiled_work()
+    report_file = profiler.stop()
+    
+    if not report_file or not os.path.exists(report_file[:-len(".txt")] + ".prof"):
+        print(f"❌ Report files: FAIL - {os.listdir(report_dir)}")
+        return False
+    with open(report_file, encoding="utf-8") as file:
+        report = file.read()
+    if "applocker_profiled_work" not in report or "allocation sites" not in report:
+        print("❌ Report contents: FAIL")
+        return False
+    del kept
+    
+    print(f"✅ Monitor profiler: PASS ({os.path.basename(report_file)})")
+    return True
+
+def test_qr_rendering():
+    """Test in-memory QR rendering and caching"""
+    print("Testing QR rendering...")
+    
+    from io import BytesIO
+    from PIL import Image
+    from app.gui import generate_qr_code
+    from app.config import QR_CODE_FILE
+    
+    secret = pyotp.random_base32()
+    existed = os.path.exists(QR_CODE_FILE)
+    png = generate_qr_code(secret, "test@applocker.com")
+    
+    if not png.startswith(b"\x89PNG") or generate_qr_code(secret, "test@applocker.com") is not png:
+        print("❌ QR bytes cache: FAIL")
+        return False
+    
+    width, height = Image.open(BytesIO(png)).size
+    if width != height or not 200 <= width <= 300:
+        print(f"❌ QR integer scaling: FAIL - {width}x{height}")
+        return False
+    
+    if not existed and os.path.exists(QR_CODE_FILE):
+        print("❌ QR written to disk without export: FAIL")
+        return False
+    
+    print(f"✅ QR rendering: PASS ({width}x{height}, {len(png)} bytes)")
+    return True
+
 def main():
     """Run all tests"""
     print("🔒 AppLocker Test Suite")
@@ -115,9 +1448,36 @@ def main():
     
     tests = [
         test_pin_hashing,
+        test_bcrypt_calibration,
+        test_pin_rehash,
         test_totp,
         test_app_discovery,
-        test_data_persistence
+        test_data_persistence,
+        test_credential_cache,
+        test_mail_queue,
+        test_otp_store,
+        test_logging_queue,
+        test_repeated_events,
+        test_audit_store,
+        test_lock_store,
+        test_lock_authentication,
+        test_lock_schedule,
+        test_policy_rules,
+        test_interpreter_matching,
+        test_exe_hashing,
+        test_suspend_enforcement,
+        test_throttle_enforcement,
+        test_respawn_backoff,
+        test_exit_watcher,
+        test_monitor_watchdog,
+        test_metrics_registry,
+        test_metrics_endpoint,
+        test_ipc_roundtrip,
+        test_instance_lock,
+        test_cli_parser,
+        test_startup_profiler,
+        test_monitor_profiler,
+        test_qr_rendering
     ]
     
     passed = 0